@@ -0,0 +1,85 @@
+"""Micro-benchmark: page ID extraction from the localhost:9222/ listing
+
+Compares the streaming HTMLParser extractor and the /json websocket URL path
+against the previous BeautifulSoup scrape (skipped if bs4 is not installed).
+
+    python benchmarks/bench_page_ids.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from debugger_core import extract_page_ids, page_id_from_ws_url
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+
+def make_listing(count):
+    items = "".join(
+        f'<li value="{i}"><a href="http://localhost:8080/Main.html?ws=localhost:9222/devtools/page/{i}">'
+        f'Page {i} - https://example.com/path/{i}</a></li>\n'
+        for i in range(1, count + 1)
+    )
+    return f"<html><head><title>iOS Devices</title></head><body><ol>\n{items}</ol></body></html>"
+
+
+def make_json(count):
+    return [
+        {
+            "devtoolsFrontendUrl": f"/devtools/inspector.html?ws=localhost:9222/devtools/page/{i}",
+            "title": f"Page {i}",
+            "url": f"https://example.com/path/{i}",
+            "webSocketDebuggerUrl": f"ws://localhost:9222/devtools/page/{i}",
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def bs4_extract(html_content):
+    soup = BeautifulSoup(html_content, 'html.parser')
+    return [item['value'] for item in soup.find_all('li') if 'value' in item.attrs]
+
+
+def streaming_extract(html_content, chunk_size=8192):
+    chunks = (html_content[i:i + chunk_size] for i in range(0, len(html_content), chunk_size))
+    return extract_page_ids(chunks)
+
+
+def json_extract(pages):
+    return [page_id_from_ws_url(page.get('webSocketDebuggerUrl')) for page in pages]
+
+
+def bench(func, arg, repeat=5):
+    number = 1
+    # Scale iterations so each sample runs for at least ~0.1 s
+    while timeit.timeit(lambda: func(arg), number=number) < 0.1:
+        number *= 2
+    best = min(timeit.repeat(lambda: func(arg), number=number, repeat=repeat))
+    return best / number * 1e6
+
+
+def main():
+    print(f"{'pages':>6} {'bs4 (us)':>12} {'streaming (us)':>15} {'/json (us)':>12}")
+    for count in (10, 100, 1000):
+        html_content = make_listing(count)
+        pages = make_json(count)
+        expected = [str(i) for i in range(1, count + 1)]
+        assert streaming_extract(html_content) == expected
+        assert json_extract(pages) == expected
+        
+        bs4_time = "n/a"
+        if BeautifulSoup is not None:
+            assert bs4_extract(html_content) == expected
+            bs4_time = f"{bench(bs4_extract, html_content):.1f}"
+        
+        print(f"{count:>6} {bs4_time:>12} {bench(streaming_extract, html_content):>15.1f} "
+              f"{bench(json_extract, pages):>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Benchmark: ProcessOutputReader ingestion of a chatty child process
+
+Spawns chatty_child.py writing lines at a target rate (50k lines/s by
+default) and drains the reader at the console frame rate, the way
+monitor_process does, reporting throughput, per-frame drain cost and drops.
+
+    python benchmarks/bench_process_output.py [lines_per_second] [seconds]
+"""
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from debugger_core import OUTPUT_FLUSH_INTERVAL_MS, ProcessOutputReader
+
+CHILD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chatty_child.py")
+
+
+def main():
+    rate = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    
+    process = subprocess.Popen(
+        [sys.executable, CHILD, "--phase", f"{rate}:{seconds}"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        bufsize=0
+    )
+    reader = ProcessOutputReader(process.stdout)
+    reader.start()
+    
+    frame = OUTPUT_FLUSH_INTERVAL_MS / 1000.0
+    received = 0
+    dropped = 0
+    frames = 0
+    worst_frame = 0.0
+    start = time.perf_counter()
+    while not reader.done():
+        time.sleep(frame)
+        frame_start = time.perf_counter()
+        lines, frame_dropped = reader.drain()
+        # Stand-in for the single batched console insert per frame
+        "\n".join(line.strip() for line in lines)
+        worst_frame = max(worst_frame, time.perf_counter() - frame_start)
+        received += len(lines)
+        dropped += frame_dropped
+        frames += 1
+    elapsed = time.perf_counter() - start
+    process.wait()
+    sent = int(process.stderr.read().decode().strip() or 0)
+    
+    print(f"target rate:      {rate} lines/s for {seconds:.1f} s")
+    print(f"lines sent:       {sent}")
+    print(f"lines received:   {received} ({dropped} dropped by the bounded queue)")
+    print(f"throughput:       {(received + dropped) / elapsed:,.0f} lines/s")
+    print(f"frames:           {frames} ({OUTPUT_FLUSH_INTERVAL_MS} ms interval)")
+    print(f"worst frame cost: {worst_frame * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Startup timing harness: import-time breakdown and time to first window
+
+Runs each measurement in a fresh interpreter, the way a user launches the app:
+
+    python benchmarks/bench_startup.py [--runs N] [--max-import-ms MS] [--max-window-ms MS]
+
+Exits with status 1 when a median exceeds its limit, so launch latency
+regressions can be caught in CI. Time to first window is skipped when no
+display is available.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_MAIN = "import time; t = time.perf_counter(); import main; print((time.perf_counter() - t) * 1000)"
+
+FIRST_WINDOW = """
+import sys
+import tkinter as tk
+import main
+try:
+    root = tk.Tk()
+except tk.TclError as e:
+    print("NO_DISPLAY", e, flush=True)
+    sys.exit(0)
+app = main.IOSSafariDebuggerApp(root)
+root.update()
+print("READY", flush=True)
+app.shutdown()
+root.destroy()
+"""
+
+
+def run_python(code, *args):
+    return subprocess.run(
+        [sys.executable] + list(args) + ["-c", code],
+        cwd=REPO_DIR,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True
+    )
+
+
+def import_breakdown(top=15):
+    """Modules imported directly by main, by cumulative import time (ms)"""
+    stderr = run_python("import main", "-X", "importtime").stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        try:
+            cumulative = int(cumulative) / 1000.0
+        except ValueError:
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((depth, cumulative, name.strip()))
+    
+    # importtime lists children before their parent, so main's direct imports
+    # are the depth-1 rows between the previous top-level module and main
+    breakdown = []
+    for i, (depth, cumulative, name) in enumerate(rows):
+        if depth == 0 and name == "main":
+            for child_depth, child_cumulative, child_name in reversed(rows[:i]):
+                if child_depth == 0:
+                    break
+                if child_depth == 1:
+                    breakdown.append((child_cumulative, child_name))
+            breakdown.append((cumulative, name))
+    breakdown.sort(reverse=True)
+    return breakdown[:top]
+
+
+def time_import_main(runs):
+    return [float(run_python(IMPORT_MAIN).stdout.strip()) for _ in range(runs)]
+
+
+def time_cli(runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "debugger_cli.py", "--help"], cwd=REPO_DIR,
+                       stdout=subprocess.DEVNULL, check=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def time_first_window(runs):
+    """Wall-clock ms from launching the interpreter until the main window has been drawn"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, "-c", FIRST_WINDOW], cwd=REPO_DIR,
+                                   stdout=subprocess.PIPE, universal_newlines=True)
+        line = process.stdout.readline()
+        elapsed = (time.perf_counter() - start) * 1000
+        process.wait()
+        if not line.startswith("READY"):
+            return None
+        samples.append(elapsed)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-import-ms', type=float, help="fail if 'import main' takes longer")
+    parser.add_argument('--max-window-ms', type=float, help="fail if the first window takes longer")
+    args = parser.parse_args()
+    
+    print("Import breakdown for 'import main' (cumulative ms):")
+    for cumulative, name in import_breakdown():
+        print(f"  {cumulative:8.1f}  {name}")
+    
+    failed = False
+    import_ms = statistics.median(time_import_main(args.runs))
+    print(f"\nimport main:        {import_ms:8.1f} ms (median of {args.runs})")
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"  over the {args.max_import_ms:.0f} ms limit")
+        failed = True
+    
+    print(f"CLI --help:         {statistics.median(time_cli(args.runs)):8.1f} ms")
+    
+    window = time_first_window(args.runs)
+    if window is None:
+        print("first window:       skipped (no display)")
+    else:
+        window_ms = statistics.median(window)
+        print(f"first window:       {window_ms:8.1f} ms")
+        if args.max_window_ms is not None and window_ms > args.max_window_ms:
+            print(f"  over the {args.max_window_ms:.0f} ms limit")
+            failed = True
+    
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
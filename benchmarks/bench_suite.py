@@ -0,0 +1,441 @@
+"""Offline benchmark suite: the app against fake_proxy.py and chatty_child.py
+
+Needs no device. Reports:
+
+  refresh    latency of a page list refresh (DeviceManager.fetch, and
+             refresh_pages through to the updated tree when a display is
+             available) for several page counts, device counts, latencies
+             and churn rates
+  parse      extract_page_ids throughput on the proxy's listing
+  console    log_message ingestion, including the batched Text insert
+  stall      Tk event-loop lateness while pages churn and the child floods
+             monitor_process with output
+  memory     tracemalloc and RSS sampled over a longer run of the same load
+
+    python benchmarks/bench_suite.py [--quick] [--duration S] [--rate LINES] [--json]
+
+Without a display the GUI paths are replaced by the same per-frame work done
+on a plain loop (marked "headless"). The suite runs with a throwaway home
+directory so it never reads or writes your saved settings.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+CHILD = os.path.join(BENCH_DIR, "chatty_child.py")
+TICK = 0.01  # Heartbeat interval used to measure event-loop stalls
+
+sys.path.insert(0, REPO_DIR)
+
+# Keep Settings() away from the real ~/.ios_safari_debugger.ini
+HOME_DIR = tempfile.mkdtemp(prefix="ios_debugger_bench_")
+os.environ['HOME'] = HOME_DIR
+os.environ['USERPROFILE'] = HOME_DIR
+
+from debugger_core import (
+    CONFIG_FILE,
+    OUTPUT_FLUSH_INTERVAL_MS,
+    ConsoleBuffer,
+    DebuggerEngine,
+    DeviceManager,
+    PageIndex,
+    ProcessOutputReader,
+    ServerSupervisor,
+    Settings,
+    extract_page_ids,
+)
+from fake_proxy import FakeDevice, FakeProxy
+
+QUICK_REFRESH = [
+    # devices, pages per device, latency (s), churn (changes/s)
+    (1, 10, 0.0, 0.0),
+    (1, 100, 0.02, 0.0),
+    (1, 100, 0.0, 5.0),
+]
+FULL_REFRESH = [
+    (1, 10, 0.0, 0.0),
+    (1, 100, 0.0, 0.0),
+    (1, 1000, 0.0, 0.0),
+    (1, 100, 0.02, 0.0),
+    (4, 100, 0.02, 0.0),
+    (1, 100, 0.0, 5.0),
+    (4, 1000, 0.02, 5.0),
+]
+
+
+def summarize(samples):
+    """p50/p95/p99/max of samples in seconds, as milliseconds"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    
+    def pick(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+    return {
+        'p50_ms': round(pick(0.5), 3),
+        'p95_ms': round(pick(0.95), 3),
+        'p99_ms': round(pick(0.99), 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def rss_bytes():
+    """Current resident set size, where the platform makes it cheap to read"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def write_settings(proxy, **overrides):
+    settings = Settings(CONFIG_FILE)
+    settings.proxy_host = proxy.host
+    settings.device_list_port = proxy.list_port
+    settings.poll_min_interval = 0.2
+    settings.poll_max_interval = 1.0
+    settings.relay_enabled = False
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    settings.save()
+    return Settings(CONFIG_FILE).load()
+
+
+def make_app():
+    """The real GUI with its window, or (None, reason) without a display"""
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:
+        return None, str(e)
+    import main
+    app = main.IOSSafariDebuggerApp(root)
+    root.update()
+    return app, None
+
+
+def close_app(app):
+    if app is not None:
+        app.shutdown()
+        app.root.destroy()
+
+
+def child_command(rate, seconds):
+    return [sys.executable, CHILD, "--phase", f"{rate}:{seconds}", "--partial"]
+
+
+def bench_refresh(configs, iterations, with_gui):
+    rows = []
+    for devices, pages, latency, churn in configs:
+        with FakeProxy(devices, pages, latency, churn) as proxy:
+            manager = DeviceManager(proxy.host, proxy.list_port)
+            manager.fetch()
+            samples = []
+            unchanged = 0
+            digest = None
+            for _ in range(iterations):
+                start = time.perf_counter()
+                result = manager.fetch(previous_digest=digest)
+                samples.append(time.perf_counter() - start)
+                unchanged += result.unchanged
+                digest = result.digest
+            manager.close()
+            row = {
+                'devices': devices,
+                'pages': pages,
+                'latency_ms': latency * 1000,
+                'churn': churn,
+                'fetch': summarize(samples),
+                'unchanged': unchanged,
+            }
+            
+            if with_gui:
+                write_settings(proxy)
+                app, _ = make_app()
+                gui_samples = []
+                for _ in range(iterations):
+                    start = time.perf_counter()
+                    app.refresh_pages()
+                    while app.refresh_in_progress:
+                        app.root.update()
+                        time.sleep(0.0005)
+                    app.root.update_idletasks()
+                    gui_samples.append(time.perf_counter() - start)
+                close_app(app)
+                row['refresh_pages'] = summarize(gui_samples)
+            rows.append(row)
+    return rows
+
+
+def bench_parse(counts, app):
+    rows = []
+    for count in counts:
+        device = FakeDevice(0, count, 0.0, '127.0.0.1')
+        device.port = 9222
+        html_content = device.render_html()
+        parse = extract_page_ids
+        assert len(parse(html_content)) == count
+        
+        number = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                parse(html_content)
+            elapsed = time.perf_counter() - start
+            if elapsed > 0.2:
+                break
+            number *= 2
+        if app is not None:
+            app.root.update()
+        rows.append({
+            'pages': count,
+            'html_bytes': len(html_content),
+            'us_per_listing': round(elapsed / number * 1e6, 1),
+            'pages_per_s': round(count * number / elapsed),
+        })
+    return rows
+
+
+def bench_console(lines, app):
+    message = "[ios_webkit_debug_proxy] recv 0123456789abcdef frame from device"
+    start = time.perf_counter()
+    if app is not None:
+        for i in range(lines):
+            app.log_message(message)
+            # One idle flush per 1000 messages, as happens between Tk events under load
+            if i % 1000 == 999:
+                app.root.update()
+        app.root.update()
+    else:
+        console = ConsoleBuffer()
+        for i in range(lines):
+            console.append(message)
+            if i % 1000 == 999:
+                "\n".join(console.take_pending())
+    elapsed = time.perf_counter() - start
+    return {'lines': lines, 'lines_per_s': round(lines / elapsed), 'headless': app is None}
+
+
+def run_load_gui(app, seconds, rate, sample_memory):
+    """Drive the GUI with page churn and a chatty server; returns (lateness samples, memory samples)"""
+    root = app.root
+    supervisor = ServerSupervisor(child_command(rate, seconds + 2), REPO_DIR, lambda kind, info: None,
+                                  ready_ports=(), max_restarts=0)
+    supervisor.start()
+    app.supervisor = supervisor
+    app.stop_monitoring = False
+    root.after(OUTPUT_FLUSH_INTERVAL_MS, app.monitor_process)
+    app.page_watcher.start()
+    
+    lateness = []
+    memory = []
+    started = time.perf_counter()
+    expected = [started + TICK]
+    
+    def beat():
+        now = time.perf_counter()
+        lateness.append(max(0.0, now - expected[0]))
+        expected[0] = now + TICK
+        root.after(int(TICK * 1000), beat)
+    
+    def refresh():
+        app.refresh_pages()
+        root.after(500, refresh)
+    
+    def sample():
+        if sample_memory:
+            memory.append((time.perf_counter() - started, tracemalloc.get_traced_memory()[0], rss_bytes()))
+        root.after(1000, sample)
+    
+    root.after(int(TICK * 1000), beat)
+    root.after(500, refresh)
+    root.after(0, sample)
+    root.after(int(seconds * 1000), root.quit)
+    root.mainloop()
+    
+    app.stop_monitoring = True
+    app.page_watcher.stop()
+    supervisor.stop()
+    app.supervisor = None
+    root.update()
+    return lateness, memory
+
+
+def run_load_headless(settings, seconds, rate, sample_memory):
+    """The same load with the UI's per-frame work done on a plain loop"""
+    engine = DebuggerEngine(settings)
+    console = ConsoleBuffer(settings.console_max_lines)
+    index = PageIndex()
+    results = deque()
+    watcher = engine.watcher(results.append)
+    process = subprocess.Popen(child_command(rate, seconds + 2), stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, bufsize=0)
+    reader = ProcessOutputReader(process.stdout)
+    reader.start()
+    watcher.start()
+    
+    lateness = []
+    memory = []
+    started = time.perf_counter()
+    next_flush = started
+    next_sample = started
+    expected = started + TICK
+    while True:
+        delay = expected - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        now = time.perf_counter()
+        if now - started >= seconds:
+            break
+        lateness.append(max(0.0, now - expected))
+        expected = now + TICK
+        
+        if now >= next_flush:
+            next_flush = now + OUTPUT_FLUSH_INTERVAL_MS / 1000.0
+            lines, dropped = reader.drain()
+            if lines:
+                console.append("\n".join(line.strip() for line in lines))
+        while results:
+            result = results.popleft()
+            if not result.connection_failed:
+                index.update(result.entries())
+        "\n".join(console.take_pending())
+        
+        if sample_memory and now >= next_sample:
+            next_sample = now + 1.0
+            memory.append((now - started, tracemalloc.get_traced_memory()[0], rss_bytes()))
+    
+    watcher.stop()
+    process.kill()
+    process.wait()
+    engine.close()
+    console.close()
+    return lateness, memory
+
+
+def run_load(settings, seconds, rate, sample_memory, with_gui):
+    if with_gui:
+        app, _ = make_app()
+        try:
+            return run_load_gui(app, seconds, rate, sample_memory)
+        finally:
+            close_app(app)
+    return run_load_headless(settings, seconds, rate, sample_memory)
+
+
+def summarize_memory(memory):
+    if not memory:
+        return {}
+    first_t, first_traced, first_rss = memory[0]
+    last_t, last_traced, last_rss = memory[-1]
+    # Growth is taken over the second half, after the console ring buffer has filled up
+    middle_t, middle_traced, _ = memory[len(memory) // 2]
+    minutes = max(last_t - middle_t, 1e-9) / 60.0
+    summary = {
+        'samples': len(memory),
+        'traced_start_kb': round(first_traced / 1024),
+        'traced_end_kb': round(last_traced / 1024),
+        'traced_peak_kb': round(max(traced for _, traced, _ in memory) / 1024),
+        'traced_growth_kb_per_min': round((last_traced - middle_traced) / 1024 / minutes, 1),
+    }
+    if first_rss is not None and last_rss is not None:
+        summary['rss_start_mb'] = round(first_rss / 1048576, 1)
+        summary['rss_end_mb'] = round(last_rss / 1048576, 1)
+        summary['rss_peak_mb'] = round(max(rss for _, _, rss in memory) / 1048576, 1)
+    return summary
+
+
+def print_report(report):
+    print(f"GUI: {report['gui'] or 'skipped (' + report['gui_skipped'] + ')'}")
+    
+    print("\nrefresh latency (ms)")
+    print(f"  {'dev':>3} {'pages':>6} {'lat':>5} {'churn':>5}  {'fetch p50':>9} {'p95':>8} {'max':>8}"
+          f"  {'unchg':>5}  {'refresh_pages p50':>17} {'p95':>8}")
+    for row in report['refresh']:
+        gui = row.get('refresh_pages', {})
+        print(f"  {row['devices']:>3} {row['pages']:>6} {row['latency_ms']:>5.0f} {row['churn']:>5.1f}"
+              f"  {row['fetch']['p50_ms']:>9.2f} {row['fetch']['p95_ms']:>8.2f} {row['fetch']['max_ms']:>8.2f}"
+              f"  {row['unchanged']:>5}  {gui.get('p50_ms', float('nan')):>17.2f}"
+              f" {gui.get('p95_ms', float('nan')):>8.2f}")
+    
+    print("\npage ID parsing")
+    for row in report['parse']:
+        print(f"  {row['pages']:>6} pages ({row['html_bytes']:>7} bytes): {row['us_per_listing']:>10.1f} us/listing"
+              f"  {row['pages_per_s']:>12,} pages/s")
+    
+    console = report['console']
+    print(f"\nconsole ingestion{' (headless)' if console['headless'] else ''}: "
+          f"{console['lines_per_s']:,} lines/s over {console['lines']:,} lines")
+    
+    stall = report['stall']
+    print(f"\nevent-loop stall{' (headless)' if stall['headless'] else ''} over {stall['seconds']:.0f} s "
+          f"at {stall['rate']:,} lines/s: p50 {stall['p50_ms']:.2f} ms, p99 {stall['p99_ms']:.2f} ms, "
+          f"max {stall['max_ms']:.2f} ms ({stall['ticks']} ticks)")
+    
+    memory = report['memory']
+    if memory:
+        text = (f"traced {memory['traced_start_kb']} -> {memory['traced_end_kb']} KB "
+                f"(peak {memory['traced_peak_kb']} KB, {memory['traced_growth_kb_per_min']:+.1f} KB/min)")
+        if 'rss_start_mb' in memory:
+            text += f", RSS {memory['rss_start_mb']} -> {memory['rss_end_mb']} MB (peak {memory['rss_peak_mb']} MB)"
+        print(f"\nmemory over {report['memory_seconds']:.0f} s: {text}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help="fewer configurations and shorter runs")
+    parser.add_argument('--duration', type=float, help="seconds for the memory run (default 60, 10 with --quick)")
+    parser.add_argument('--rate', type=int, default=20000, help="child output in lines/s (default %(default)s)")
+    parser.add_argument('--no-gui', action='store_true', help="skip the Tk measurements even with a display")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args()
+    
+    stall_seconds = 3.0 if args.quick else 10.0
+    memory_seconds = args.duration or (10.0 if args.quick else 60.0)
+    report = {'gui': False, 'gui_skipped': "--no-gui"}
+    
+    with_gui = False
+    if not args.no_gui:
+        app, reason = make_app()
+        with_gui = app is not None
+        report['gui_skipped'] = reason
+        close_app(app)
+    report['gui'] = with_gui
+    
+    report['refresh'] = bench_refresh(QUICK_REFRESH if args.quick else FULL_REFRESH,
+                                      20 if args.quick else 50, with_gui)
+    
+    with FakeProxy(devices=2, pages=200, latency=0.005, churn=5.0) as proxy:
+        settings = write_settings(proxy)
+        app = make_app()[0] if with_gui else None
+        report['parse'] = bench_parse((10, 100, 1000), app)
+        report['console'] = bench_console(20000 if args.quick else 100000, app)
+        close_app(app)
+        
+        lateness, _ = run_load(settings, stall_seconds, args.rate, False, with_gui)
+        report['stall'] = dict(summarize(lateness), ticks=len(lateness), seconds=stall_seconds,
+                               rate=args.rate, headless=not with_gui)
+        
+        tracemalloc.start()
+        _, memory = run_load(settings, memory_seconds, args.rate, True, with_gui)
+        tracemalloc.stop()
+        report['memory'] = summarize_memory(memory)
+        report['memory_seconds'] = memory_seconds
+    
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
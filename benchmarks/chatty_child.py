@@ -0,0 +1,73 @@
+"""Scriptable noisy child process, standing in for the debugging server's output
+
+Each --phase RATE:SECONDS writes RATE lines per second for SECONDS (a rate of
+0 is a pause), so bursts and lulls can be combined:
+
+    python benchmarks/chatty_child.py --phase 50000:2 --phase 0:1 --phase 200000:0.5
+
+--partial splits lines across writes and --long-every N emits a very long
+line every N lines, both of which the output reader has to handle. The
+number of lines written is printed to stderr on exit.
+"""
+import argparse
+import os
+import sys
+import time
+
+LINE = "[ios_webkit_debug_proxy] recv 0123456789abcdef frame from device"
+
+
+def parse_phase(text):
+    rate, _, seconds = text.partition(':')
+    return int(rate), float(seconds or 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--phase', type=parse_phase, action='append', metavar='RATE:SECONDS',
+                        help="lines per second and duration (repeatable; default 50000:5)")
+    parser.add_argument('--line-length', type=int, default=len(LINE))
+    parser.add_argument('--partial', action='store_true', help="split lines across writes")
+    parser.add_argument('--long-every', type=int, default=0, metavar='N', help="emit a 64 KB line every N lines")
+    parser.add_argument('--exit-code', type=int, default=0)
+    args = parser.parse_args()
+    
+    line = (LINE * (args.line_length // len(LINE) + 1))[:args.line_length] + "\n"
+    long_line = "x" * 65536 + "\n"
+    fd = sys.stdout.fileno()
+    sent = 0
+    for rate, seconds in args.phase or [(50000, 5.0)]:
+        start = time.perf_counter()
+        if rate <= 0:
+            time.sleep(seconds)
+            continue
+        batch = max(1, rate // 100)
+        phase_sent = 0
+        while time.perf_counter() - start < seconds:
+            chunk = line * batch
+            lines = batch
+            if args.long_every and (sent // args.long_every) != ((sent + batch) // args.long_every):
+                chunk += long_line
+                lines += 1
+            data = chunk.encode('utf-8')
+            try:
+                if args.partial:
+                    middle = len(data) // 2 + 7
+                    os.write(fd, data[:middle])
+                    os.write(fd, data[middle:])
+                else:
+                    os.write(fd, data)
+            except BrokenPipeError:
+                sys.exit(0)
+            phase_sent += batch
+            sent += lines
+            # Pace the output to the requested rate
+            delay = start + phase_sent / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    sys.stderr.write(f"{sent}\n")
+    sys.exit(args.exit_code)
+
+
+if __name__ == "__main__":
+    main()
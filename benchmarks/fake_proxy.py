@@ -0,0 +1,417 @@
+"""Stand-in for ios_webkit_debug_proxy, so the app can be measured without an iPhone
+
+Serves the device list (/json on the list port) and, for every simulated
+device, the HTML listing (/) and page list (/json) the way the real proxy
+does. Page count, response latency and churn (pages opened, closed or
+retitled per second) are configurable. Page WebSockets speak enough of the
+inspector protocol (Target multiplexing, Console and Network events at
+--event-rate) for recording and tracing to be exercised too.
+
+    python benchmarks/fake_proxy.py [--devices N] [--pages N] [--latency-ms MS] [--churn RATE]
+
+With the default ports (9221 for the list, 9222 and up for devices) the GUI
+and CLI talk to it exactly as they would to the real proxy.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from debugger_ws import WEBSOCKET_GUID, WebSocket, WebSocketClosed
+
+LEVELS = ('log', 'info', 'warning', 'error', 'debug')
+
+
+class FakeDevice:
+    """Page table for one simulated device; churn is applied lazily on each request"""
+    def __init__(self, index, pages, churn, host, seed=None):
+        self.index = index
+        self.device_id = f"fake{index:04d}0000000000000000000000000000"
+        self.name = f"Fake iPhone {index + 1}"
+        self.host = host
+        self.port = None
+        self.churn = churn
+        self.random = random.Random(seed)
+        self.next_id = 1
+        self.pages = []  # [page_id, title, url]
+        for _ in range(pages):
+            self._open_page()
+        self.churn_events = 0
+        self._pending_churn = 0.0
+        self._last_churn = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _open_page(self):
+        page_id = self.next_id
+        self.next_id += 1
+        self.pages.append([page_id, f"Page {page_id}", f"https://example.com/{self.index}/path/{page_id}"])
+    
+    def _apply_churn(self):
+        now = time.monotonic()
+        self._pending_churn += self.churn * (now - self._last_churn)
+        self._last_churn = now
+        while self._pending_churn >= 1.0:
+            self._pending_churn -= 1.0
+            self.churn_events += 1
+            action = self.random.random()
+            if action < 0.4 and self.pages:
+                # Navigation: same page, new title and URL
+                page = self.random.choice(self.pages)
+                page[1] = f"Page {page[0]} ({self.churn_events})"
+                page[2] = f"https://example.com/{self.index}/visit/{self.churn_events}"
+            elif action < 0.7 and self.pages:
+                self.pages.pop(self.random.randrange(len(self.pages)))
+            else:
+                self._open_page()
+    
+    def snapshot(self):
+        with self._lock:
+            self._apply_churn()
+            return [list(page) for page in self.pages]
+    
+    def render_json(self, with_ws_urls=True):
+        pages = []
+        for page_id, title, url in self.snapshot():
+            page = {
+                "devtoolsFrontendUrl": f"/devtools/devtools.html?ws={self.host}:{self.port}/devtools/page/{page_id}",
+                "faviconUrl": "",
+                "thumbnailUrl": f"/thumb/{url}",
+                "title": title,
+                "url": url,
+                "appId": "PID:1234",
+            }
+            if with_ws_urls:
+                page["webSocketDebuggerUrl"] = f"ws://{self.host}:{self.port}/devtools/page/{page_id}"
+            pages.append(page)
+        return json.dumps(pages, indent=2)
+    
+    def render_html(self):
+        items = "".join(
+            f'<li value="{page_id}"><a href="http://localhost:8080/Main.html?ws={self.host}:{self.port}'
+            f'/devtools/page/{page_id}">{title} - {url}</a></li>\n'
+            for page_id, title, url in self.snapshot()
+        )
+        return (f"<html><head><title>iOS Devices</title></head><body><h3>Inspectable pages for "
+                f"{self.name}:</h3><ol>\n{items}</ol></body></html>")
+
+
+class FakePageSession:
+    """Inspector protocol on one page WebSocket: Target wrapping, domain enables and events"""
+    def __init__(self, ws, page_id, event_rate, targets=True):
+        self.ws = ws
+        self.page_id = page_id
+        self.event_rate = event_rate
+        self.target_id = f"page-{page_id}-1" if targets else None
+        self.enabled = set()
+        self.sequence = 0
+        self.instruments = set()
+        self._timeline_stop = None
+        self._samples = []
+    
+    def _send(self, message, wrap=True):
+        if wrap and self.target_id is not None:
+            message = {
+                'method': 'Target.dispatchMessageFromTarget',
+                'params': {'targetId': self.target_id, 'message': json.dumps(message)},
+            }
+        self.ws.send(json.dumps(message))
+    
+    def _command(self, message):
+        method = message.get('method', '')
+        domain = method.split('.', 1)[0]
+        params = message.get('params') or {}
+        if method == 'Timeline.setInstruments':
+            self.instruments = set(params.get('instruments') or ())
+        elif method == 'Timeline.start':
+            self._start_timeline()
+        elif method == 'Timeline.stop':
+            self._stop_timeline()
+        elif method.endswith('.enable'):
+            self.enabled.add(domain)
+        elif method.endswith('.disable'):
+            self.enabled.discard(domain)
+        return {'id': message.get('id'), 'result': {}}
+    
+    def _start_timeline(self):
+        if self._timeline_stop is not None:
+            return
+        self._timeline_stop = threading.Event()
+        self._samples = []
+        now = time.monotonic()
+        self._send({'method': 'Timeline.recordingStarted', 'params': {'startTime': now}})
+        if 'ScriptProfiler' in self.instruments:
+            self._send({'method': 'ScriptProfiler.trackingStart', 'params': {'timestamp': now}})
+        thread = threading.Thread(target=self._record_timeline, args=(self._timeline_stop,), name="fake-timeline")
+        thread.daemon = True
+        thread.start()
+    
+    def _stop_timeline(self):
+        if self._timeline_stop is None:
+            return
+        self._timeline_stop.set()
+        self._timeline_stop = None
+        now = time.monotonic()
+        self._send({'method': 'Timeline.recordingStopped', 'params': {'endTime': now}})
+        if 'ScriptProfiler' in self.instruments:
+            self._send({'method': 'ScriptProfiler.trackingComplete',
+                        'params': {'timestamp': now, 'samples': {'stackTraces': self._samples}}})
+    
+    def _record_timeline(self, stop):
+        """A rendering frame every 50 ms, with a timer-driven script every fifth (long every twentieth)"""
+        frame = 0
+        try:
+            while not stop.wait(0.05):
+                frame += 1
+                start = time.monotonic() - 0.02
+                self._send({'method': 'Timeline.eventRecorded', 'params': {'record': {
+                    'type': 'RenderingFrame', 'startTime': start, 'endTime': start + 0.012, 'data': {},
+                    'children': [
+                        {'type': 'RecalculateStyles', 'startTime': start, 'endTime': start + 0.002, 'data': {}},
+                        {'type': 'Layout', 'startTime': start + 0.002, 'endTime': start + 0.006, 'data': {}},
+                        {'type': 'Paint', 'startTime': start + 0.006, 'endTime': start + 0.009, 'data': {}},
+                        {'type': 'Composite', 'startTime': start + 0.009, 'endTime': start + 0.011, 'data': {}},
+                    ]}}})
+                if frame % 5:
+                    continue
+                start = time.monotonic() - 0.1
+                length = 0.08 if frame % 20 == 0 else 0.02
+                self._send({'method': 'Timeline.eventRecorded', 'params': {'record': {
+                    'type': 'TimerFire', 'startTime': start, 'endTime': start + length,
+                    'data': {'timerId': frame // 5},
+                    'children': [{
+                        'type': 'FunctionCall', 'startTime': start, 'endTime': start + length - 0.001,
+                        'data': {'scriptName': 'https://example.com/app.js', 'scriptLine': 10}}]}}})
+                if 'ScriptProfiler' in self.instruments:
+                    self._send({'method': 'ScriptProfiler.trackingUpdate', 'params': {'event': {
+                        'startTime': start, 'endTime': start + length - 0.001, 'type': 'Other'}}})
+                    for i in range(int(length * 1000) - 1):
+                        leaf = 'layoutGrid' if i % 4 == 3 else 'renderRow'
+                        self._samples.append({'timestamp': start + i * 0.001, 'stackFrames': [
+                            {'name': leaf, 'url': 'https://example.com/app.js', 'line': 40, 'column': 5},
+                            {'name': 'tick', 'url': 'https://example.com/app.js', 'line': 10, 'column': 1},
+                        ]})
+        except WebSocketClosed:
+            pass
+    
+    def _read(self):
+        try:
+            self._answer()
+        except WebSocketClosed:
+            pass
+    
+    def _answer(self):
+        while True:
+            message = json.loads(self.ws.recv())
+            if message.get('method') == 'Target.sendMessageToTarget':
+                self.ws.send(json.dumps({'id': message['id'], 'result': {}}))
+                self._send(self._command(json.loads(message['params']['message'])))
+            elif self.target_id is not None:
+                domain = message.get('method', '').split('.', 1)[0]
+                self.ws.send(json.dumps({'id': message.get('id'), 'error': {
+                    'code': -32601, 'message': f"'{domain}' domain was not found"}}))
+            else:
+                self._send(self._command(message))
+    
+    def _event(self):
+        self.sequence += 1
+        n = self.sequence
+        now = time.time()
+        if 'Console' in self.enabled and n % 2:
+            level = LEVELS[n // 2 % len(LEVELS)]
+            return {'method': 'Console.messageAdded', 'params': {'message': {
+                'source': 'console-api', 'level': level, 'text': f"message {n} from page {self.page_id}",
+                'url': 'https://example.com/app.js', 'line': n % 500, 'column': 1, 'timestamp': now}}}
+        if 'Network' in self.enabled:
+            request_id = f"{self.page_id}.{n}"
+            if n % 4 == 0:
+                return {'method': 'Network.requestWillBeSent', 'params': {
+                    'requestId': request_id, 'timestamp': now,
+                    'request': {'url': f"https://example.com/api/{n}", 'method': 'GET', 'headers': {}}}}
+            if n % 12 == 2:
+                return {'method': 'Network.loadingFailed', 'params': {
+                    'requestId': request_id, 'timestamp': now, 'errorText': 'Connection refused'}}
+            return {'method': 'Network.responseReceived', 'params': {
+                'requestId': request_id, 'timestamp': now, 'type': 'XHR',
+                'response': {'url': f"https://example.com/api/{n}", 'status': 404 if n % 10 == 6 else 200,
+                             'mimeType': 'application/json', 'headers': {}}}}
+        return None
+    
+    def run(self):
+        reader = threading.Thread(target=self._read, name="fake-page")
+        reader.daemon = True
+        reader.start()
+        if self.target_id is not None:
+            self._send({'method': 'Target.targetCreated',
+                        'params': {'targetInfo': {'targetId': self.target_id, 'type': 'page'}}}, wrap=False)
+        interval = 1.0 / self.event_rate if self.event_rate > 0 else None
+        next_event = time.monotonic()
+        try:
+            while reader.is_alive():
+                if interval is None:
+                    reader.join(0.5)
+                    continue
+                next_event += interval
+                delay = next_event - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                event = self._event()
+                if event is not None:
+                    self._send(event)
+        except WebSocketClosed:
+            pass
+        finally:
+            if self._timeline_stop is not None:
+                self._timeline_stop.set()
+            self.ws.close()
+
+
+class FakeProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def do_GET(self):
+        proxy = self.server.proxy
+        proxy.requests += 1
+        if proxy.latency:
+            time.sleep(proxy.latency * (1.0 + proxy.jitter * (2 * random.random() - 1)))
+        device = self.server.device
+        path = self.path.split('?', 1)[0]
+        if device is not None and path.startswith('/devtools/page/') and self.headers.get('Sec-WebSocket-Key'):
+            self._websocket(path.rsplit('/', 1)[1])
+            return
+        if device is None and path == '/json':
+            body, kind = proxy.render_device_list(), 'application/json'
+        elif device is not None and path == '/json':
+            body, kind = device.render_json(proxy.ws_urls), 'application/json'
+        elif device is not None and path == '/':
+            body, kind = device.render_html(), 'text/html'
+        else:
+            self.send_error(404)
+            return
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', kind)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def _websocket(self, page_id):
+        key = self.headers['Sec-WebSocket-Key']
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode('ascii')).digest()).decode('ascii')
+        self.send_response(101)
+        self.send_header('Upgrade', 'websocket')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Sec-WebSocket-Accept', accept)
+        self.end_headers()
+        proxy = self.server.proxy
+        FakePageSession(WebSocket(self.connection, mask=False), page_id, proxy.event_rate, proxy.targets).run()
+        self.close_connection = True
+
+
+class FakeProxy:
+    """Device list server on list_port plus one page server per device
+    
+    Port 0 picks free ports; devices get device_port, device_port + 1, ...
+    otherwise. churn is in events per second per device. ws_urls=False leaves
+    webSocketDebuggerUrl out of /json, forcing the app onto the HTML listing.
+    Page WebSockets emit event_rate Console/Network events per second once
+    enabled; targets=False answers commands directly, like iOS 12 and older.
+    """
+    def __init__(self, devices=1, pages=10, latency=0.0, churn=0.0, host='127.0.0.1',
+                 list_port=0, device_port=0, jitter=0.0, ws_urls=True, seed=1, event_rate=10.0, targets=True):
+        self.host = host
+        self.list_port = list_port
+        self.device_port = device_port
+        self.latency = latency
+        self.jitter = jitter
+        self.ws_urls = ws_urls
+        self.event_rate = event_rate
+        self.targets = targets
+        self.requests = 0
+        self.devices = [FakeDevice(i, pages, churn, host, seed=seed + i) for i in range(devices)]
+        self._servers = []
+    
+    def render_device_list(self):
+        return json.dumps([
+            {
+                "deviceId": device.device_id,
+                "deviceName": device.name,
+                "deviceOSVersion": "17.4",
+                "url": f"{self.host}:{device.port}",
+            }
+            for device in self.devices
+        ])
+    
+    def _serve(self, port, device):
+        server = ThreadingHTTPServer((self.host, port), FakeProxyHandler)
+        server.daemon_threads = True
+        server.proxy = self
+        server.device = device
+        thread = threading.Thread(target=server.serve_forever, args=(0.1,), name="fake-proxy")
+        thread.daemon = True
+        thread.start()
+        self._servers.append(server)
+        return server.server_address[1]
+    
+    def start(self):
+        for i, device in enumerate(self.devices):
+            device.port = self._serve(self.device_port + i if self.device_port else 0, device)
+        self.list_port = self._serve(self.list_port, None)
+        return self
+    
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', type=int, default=1)
+    parser.add_argument('--pages', type=int, default=10, help="initial pages per device")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="delay before every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="latency jitter as a fraction (0-1)")
+    parser.add_argument('--churn', type=float, default=0.0, help="page changes per second per device")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--list-port', type=int, default=9221)
+    parser.add_argument('--device-port', type=int, default=9222)
+    parser.add_argument('--html-only', action='store_true', help="leave websocket URLs out of /json")
+    parser.add_argument('--event-rate', type=float, default=10.0, help="page events per second per connection")
+    parser.add_argument('--no-targets', action='store_true', help="answer commands directly, like iOS 12")
+    args = parser.parse_args()
+    
+    proxy = FakeProxy(args.devices, args.pages, args.latency_ms / 1000.0, args.churn, args.host,
+                      args.list_port, args.device_port, args.jitter, not args.html_only,
+                      event_rate=args.event_rate, targets=not args.no_targets)
+    proxy.start()
+    print(f"device list on {args.host}:{proxy.list_port}, devices on "
+          f"{', '.join(str(device.port) for device in proxy.devices)} (Ctrl+C to stop)", flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        proxy.stop()
+
+
+if __name__ == "__main__":
+    main()
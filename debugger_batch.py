@@ -0,0 +1,278 @@
+"""Open many inspectors in one browser launch and keep named sets of them attached across reloads"""
+import fnmatch
+import json
+import os
+import platform
+import shlex
+import shutil
+import subprocess
+from collections import namedtuple
+
+from debugger_metrics import REGISTRY
+
+# Browsers that accept several URLs on one command line, by their freedesktop.org .desktop name
+KNOWN_BROWSERS = {
+    'google-chrome': ('google-chrome', 'google-chrome-stable'),
+    'com.google.chrome': ('google-chrome', 'google-chrome-stable'),
+    'chromium': ('chromium', 'chromium-browser'),
+    'chromium-browser': ('chromium-browser', 'chromium'),
+    'chromium_chromium': ('chromium',),
+    'org.chromium.chromium': ('chromium', 'chromium-browser'),
+    'microsoft-edge': ('microsoft-edge', 'microsoft-edge-stable'),
+    'brave-browser': ('brave-browser',),
+    'firefox': ('firefox',),
+    'firefox_firefox': ('firefox',),
+    'org.mozilla.firefox': ('firefox',),
+}
+# The same on Windows, by the ProgId of the default http handler
+WINDOWS_BROWSERS = {
+    'ChromeHTML': (
+        ('PROGRAMFILES', 'Google', 'Chrome', 'Application', 'chrome.exe'),
+        ('PROGRAMFILES(X86)', 'Google', 'Chrome', 'Application', 'chrome.exe'),
+        ('LOCALAPPDATA', 'Google', 'Chrome', 'Application', 'chrome.exe'),
+    ),
+    'MSEdgeHTM': (
+        ('PROGRAMFILES(X86)', 'Microsoft', 'Edge', 'Application', 'msedge.exe'),
+        ('PROGRAMFILES', 'Microsoft', 'Edge', 'Application', 'msedge.exe'),
+    ),
+}
+WINDOWS_URL_CHOICE = r"Software\Microsoft\Windows\Shell\Associations\UrlAssociations\http\UserChoice"
+DEFAULT_BROWSER_TIMEOUT = 2.0
+MAX_COMMAND_CHARS = 8000  # Well under Windows' 32767 and any POSIX ARG_MAX
+
+BROWSER_LAUNCHES = REGISTRY.counter(
+    'ios_debugger_browser_launches_total', "Browser invocations to open inspectors by method (batched, webbrowser)",
+    ('method',))
+INSPECTORS_OPENED = REGISTRY.counter(
+    'ios_debugger_inspectors_opened_total', "Inspector URLs opened, by why (selected, attached, reattached)", ('reason',))
+
+SessionTarget = namedtuple('SessionTarget', ('device', 'url'))
+
+
+def _linux_default_browser():
+    """The default browser's command if it is one of KNOWN_BROWSERS, else None"""
+    try:
+        desktop = subprocess.run(
+            ['xdg-settings', 'get', 'default-web-browser'],
+            capture_output=True, text=True, timeout=DEFAULT_BROWSER_TIMEOUT
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if desktop.endswith('.desktop'):
+        desktop = desktop[:-len('.desktop')]
+    for name in KNOWN_BROWSERS.get(desktop.lower(), ()):
+        path = shutil.which(name)
+        if path:
+            return [path]
+    return None
+
+
+def _windows_default_browser():
+    """The default browser's executable if it is Chrome or Edge, else None"""
+    try:
+        import winreg
+        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, WINDOWS_URL_CHOICE) as key:
+            prog_id = winreg.QueryValueEx(key, 'ProgId')[0]
+    except (ImportError, OSError):
+        return None
+    for variable, *parts in WINDOWS_BROWSERS.get(prog_id, ()):
+        base = os.environ.get(variable)
+        if base and os.path.isfile(os.path.join(base, *parts)):
+            return [os.path.join(base, *parts)]
+    return None
+
+
+def browser_command(configured=''):
+    """The command that opens every URL appended to it, or None to fall back to webbrowser
+    
+    configured (the browser_command setting) wins; macOS uses `open`, which
+    hands all URLs to the default browser. Elsewhere URLs are batched only
+    when the default browser is one known to take several URLs; any other
+    default browser is left to webbrowser, one URL at a time.
+    """
+    if configured:
+        return shlex.split(configured, posix=platform.system() != "Windows")
+    system = platform.system()
+    if system == "Darwin":
+        return ['open']
+    if system == "Windows":
+        return _windows_default_browser()
+    return _linux_default_browser()
+
+
+def _detach_options():
+    if platform.system() == "Windows":
+        flags = getattr(subprocess, 'DETACHED_PROCESS', 0) | getattr(subprocess, 'CREATE_NEW_PROCESS_GROUP', 0)
+        return {'creationflags': flags}
+    # Closing the debugger (or Ctrl+C in the CLI) must not take the browser with it
+    return {'start_new_session': True}
+
+
+class BrowserLauncher:
+    """Open URLs with as few browser invocations as the command line allows"""
+    def __init__(self, command=None):
+        self.command = command  # None: one webbrowser.open_new_tab() per URL
+    
+    def chunks(self, urls):
+        """Split urls into groups whose command line stays under MAX_COMMAND_CHARS"""
+        base = sum(len(part) + 1 for part in self.command)
+        chunk = []
+        length = base
+        for url in urls:
+            if chunk and length + len(url) + 1 > MAX_COMMAND_CHARS:
+                yield chunk
+                chunk = []
+                length = base
+            chunk.append(url)
+            length += len(url) + 1
+        if chunk:
+            yield chunk
+    
+    def launch(self, urls):
+        """Open every URL (duplicates once); returns the number of browser invocations"""
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return 0
+        if self.command is None:
+            import webbrowser
+            for url in urls:
+                webbrowser.open_new_tab(url)
+            BROWSER_LAUNCHES.inc(len(urls), method='webbrowser')
+            return len(urls)
+        
+        invocations = 0
+        for chunk in self.chunks(urls):
+            subprocess.Popen(
+                self.command + chunk,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                **_detach_options()
+            )
+            invocations += 1
+        BROWSER_LAUNCHES.inc(invocations, method='batched')
+        return invocations
+
+
+def strip_query(url):
+    """url without its query string and fragment, which change on reloads"""
+    return url.split('#', 1)[0].split('?', 1)[0]
+
+
+def target_for(entry):
+    """The SessionTarget that finds entry again: its device and its URL without query or fragment"""
+    return SessionTarget(entry.device.device_id, strip_query(entry.url or ''))
+
+
+def _glob_matches(pattern, text):
+    # Only * is a wildcard: ? and [ are ordinary characters in URLs
+    pattern = pattern.replace('[', '[[]').replace('?', '[?]')
+    return fnmatch.fnmatchcase(text, pattern)
+
+
+def _name_matches(pattern, name):
+    name = str(name).lower()
+    return _glob_matches(pattern, name) if '*' in pattern else name == pattern
+
+
+def target_matches(target, entry):
+    """True if entry is on target's device and its URL matches target's URL pattern
+    
+    The device is an ID, name or label, or a pattern over them where * is a
+    wildcard ('' or '*' for any device). The URL is such a pattern over the
+    whole URL ('*/checkout*'), or a plain URL, which matches that page
+    whatever its query and fragment.
+    """
+    device = (target.device or '').lower()
+    if device and device != '*':
+        names = (entry.device.device_id, entry.device.name, entry.device.label)
+        if not any(_name_matches(device, name) for name in names):
+            return False
+    pattern = (target.url or '*').lower()
+    url = (entry.url or '').lower()
+    if '*' in pattern:
+        return _glob_matches(pattern, url) or _glob_matches(pattern, strip_query(url))
+    return url == pattern or strip_query(url) == strip_query(pattern)
+
+
+class DebugSession:
+    """Pages whose inspectors are opened together, in one browser invocation per batch
+    
+    url_for(entry) gives the inspector URL of a page. A session with targets
+    can be kept attached: reattach() with each new page list returns the
+    matching pages that are not open, including pages that came back under a
+    new key after a reload.
+    """
+    def __init__(self, launcher, url_for, name='', targets=()):
+        self.launcher = launcher
+        self.url_for = url_for
+        self.name = name
+        self.targets = [SessionTarget(*target) for target in targets]
+        self.opened = {}  # PageEntry.key -> device ID, for pages opened and still listed
+    
+    def matches(self, entry):
+        return bool(entry.page_id) and any(target_matches(target, entry) for target in self.targets)
+    
+    def pending(self, entries):
+        """entries with a page ID that are not open yet, each page once"""
+        pending = {}
+        for entry in entries:
+            if entry.page_id and entry.key not in self.opened:
+                pending.setdefault(entry.key, entry)
+        return list(pending.values())
+    
+    def mark_opened(self, entries):
+        for entry in entries:
+            self.opened[entry.key] = entry.device.device_id
+    
+    def open(self, entries, reason='selected'):
+        """Open the inspectors of entries not opened yet; returns (opened entries, invocations)"""
+        pending = self.pending(entries)
+        if not pending:
+            return [], 0
+        invocations = self.launcher.launch([self.url_for(entry) for entry in pending])
+        self.mark_opened(pending)
+        INSPECTORS_OPENED.inc(len(pending), reason=reason)
+        return pending, invocations
+    
+    def reattach(self, entries, listed_devices=None):
+        """Forget pages that left the listing; returns the matching pages that are not open
+        
+        listed_devices is the set of device IDs whose page list was fetched;
+        pages on the other devices are kept, so a timeout doesn't reopen them.
+        None forgets nothing.
+        """
+        if listed_devices is not None:
+            present = {entry.key for entry in entries}
+            for key, device_id in list(self.opened.items()):
+                if key not in present and device_id in listed_devices:
+                    del self.opened[key]
+        return self.pending([entry for entry in entries if self.matches(entry)])
+
+
+def load_saved_sessions(path):
+    """{name: [SessionTarget]} from the saved sessions file (empty if missing or unreadable)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    sessions = {}
+    for name, targets in data.items():
+        try:
+            sessions[name] = [SessionTarget(target.get('device', ''), target.get('url', '*')) for target in targets]
+        except AttributeError:
+            continue
+    return sessions
+
+
+def save_saved_sessions(path, sessions):
+    """Write {name: [SessionTarget]} to path, replacing the file in one step"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    data = {name: [target._asdict() for target in targets] for name, targets in sorted(sessions.items())}
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_path, path)
@@ -0,0 +1,697 @@
+"""Command line interface for the iOS Safari Debugger
+
+    python debugger_cli.py start              # run the debugging server in the foreground
+    python debugger_cli.py list [--json]      # list inspectable pages on every device
+    python debugger_cli.py open <id>...       # open the inspectors of pages in one browser launch
+    python debugger_cli.py watch [--json]     # print page list changes as they happen
+    python debugger_cli.py daemon [--json]    # run the server and watch pages until stopped
+    python debugger_cli.py record <id>        # record a page's console and network events
+    python debugger_cli.py sessions           # list recorded sessions
+    python debugger_cli.py search <session>   # print recorded events matching filters
+    python debugger_cli.py replay <session>   # print recorded events at their original pace
+    python debugger_cli.py trace <id>         # record a performance trace (Chrome trace JSON)
+    python debugger_cli.py metrics            # print a running instance's metrics
+    python debugger_cli.py profile            # sample a running instance's threads
+    python debugger_cli.py preflight          # check tools, ports and the WebKit folder
+    python debugger_cli.py save-session <name> <id>...  # save pages as a named session
+    python debugger_cli.py saved-sessions     # list saved sessions
+    python debugger_cli.py attach <name>      # open a saved session and reopen its pages when they reappear
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+from debugger_core import (
+    CONFIG_FILE,
+    OUTPUT_FLUSH_INTERVAL_MS,
+    DebuggerEngine,
+    PageIndex,
+    PageSearchIndex,
+    Settings,
+)
+from debugger_recorder import LEVELS, RECORDED_DOMAINS, SessionReader, describe_event, list_sessions
+from debugger_trace import TraceError, describe_summary
+from debugger_ws import WebSocketClosed
+
+
+def page_info(engine, entry):
+    """JSON-friendly description of a PageEntry"""
+    return {
+        'device_id': entry.device.device_id,
+        'device': entry.device.label,
+        'page_id': entry.page_id,
+        'title': entry.title,
+        'url': entry.url,
+        'ws_url': entry.page.get('webSocketDebuggerUrl'),
+        'debugger_url': engine.debugger_url(entry),
+    }
+
+
+class Output:
+    """Print human-readable lines or JSON lines, safely from several threads"""
+    def __init__(self, as_json):
+        self.as_json = as_json
+        self._lock = threading.Lock()
+    
+    def emit(self, event, text, **fields):
+        with self._lock:
+            if self.as_json:
+                fields['event'] = event
+                fields['time'] = time.time()
+                print(json.dumps(fields), flush=True)
+            else:
+                print(text, flush=True)
+
+
+def wait_for_signal(stop_event):
+    """Turn SIGTERM into a clean shutdown, then block until stop_event is set or Ctrl+C"""
+    def handle(signum, frame):
+        stop_event.set()
+    signal.signal(signal.SIGTERM, handle)
+    try:
+        while not stop_event.wait(OUTPUT_FLUSH_INTERVAL_MS / 1000.0):
+            yield
+    except KeyboardInterrupt:
+        stop_event.set()
+
+
+def start_server(engine, args, output, stop_event):
+    """Start the supervised server; returns it, or None after reporting the error"""
+    def on_event(supervisor, kind, info):
+        text = f"[server] {kind}"
+        if kind == 'started':
+            text = f"[server] started {' '.join(supervisor.cmd)} (pid {info['pid']})"
+        elif kind == 'ready':
+            text = f"[server] ready in {info['time_to_ready']:.2f} s (restarts: {info['restarts']})"
+        elif kind == 'exited':
+            text = f"[server] exited with code {info['code']}, restarting in {info['delay']:.1f} s"
+        elif kind == 'failed':
+            text = f"[server] stopped, gave up after {info['restarts']} restarts"
+            stop_event.set()
+        output.emit(f"server_{kind}", text, **info)
+    
+    report = engine.preflight(args.webkit_path)
+    for check in report.warnings:
+        output.emit('preflight_warning', f"[preflight] {check.detail}", check=check.name, detail=check.detail)
+    try:
+        supervisor = engine.start_server(on_event, args.webkit_path, report)
+    except (ValueError, OSError) as e:
+        for line in str(e).splitlines():
+            print(f"error: {line}", file=sys.stderr)
+        return None
+    if engine.frontend is not None:
+        output.emit('frontend_started', f"[frontend] serving {engine.frontend.root} on port {engine.frontend.port}",
+                    root=engine.frontend.root, port=engine.frontend.port)
+    return supervisor
+
+
+def start_metrics(engine, output):
+    """Serve /metrics for as long as the command runs; failures are reported, not fatal"""
+    try:
+        metrics = engine.start_metrics()
+    except OSError as e:
+        output.emit('metrics_failed', f"[metrics] could not start: {e}", error=str(e))
+        return
+    if metrics is not None:
+        output.emit('metrics_started', f"[metrics] serving {metrics.url}", url=metrics.url)
+
+
+def flush_server_output(supervisor, output):
+    lines, dropped = supervisor.output.drain()
+    if dropped:
+        output.emit('server_output_dropped', f"... {dropped} lines of server output dropped ...", dropped=dropped)
+    for line in lines:
+        output.emit('server_output', line.strip(), line=line)
+
+
+def print_changes(engine, index, result, output):
+    """Apply a fetch result to index and print what changed"""
+    if result.connection_failed:
+        entries = []
+        output.emit('unreachable', "[pages] could not connect to the debugging server")
+    else:
+        entries = result.entries()
+    old = {entry.key: entry for entry in index}
+    added, removed, changed = index.update(entries)
+    for key in removed:
+        entry = old[key]
+        output.emit('page_removed', f"- [{entry.device.label}] {entry.page_id} {entry.title} {entry.url}",
+                    **page_info(engine, entry))
+    for key in added:
+        entry = index.get(key)
+        output.emit('page_added', f"+ [{entry.device.label}] {entry.page_id} {entry.title} {entry.url}",
+                    **page_info(engine, entry))
+    for key in changed:
+        entry = index.get(key)
+        output.emit('page_changed', f"~ [{entry.device.label}] {entry.page_id} {entry.title} {entry.url}",
+                    **page_info(engine, entry))
+
+
+def cmd_start(engine, args):
+    output = Output(args.json)
+    stop_event = threading.Event()
+    supervisor = start_server(engine, args, output, stop_event)
+    if supervisor is None:
+        return 1
+    start_metrics(engine, output)
+    for _ in wait_for_signal(stop_event):
+        flush_server_output(supervisor, output)
+    flush_server_output(supervisor, output)
+    return 0
+
+
+def cmd_list(engine, args):
+    result = engine.fetch_pages()
+    if result.connection_failed:
+        print("error: could not connect to the debugging server", file=sys.stderr)
+        return 1
+    entries = result.entries()
+    if args.filter:
+        entries = filter_entries(entries, args.filter)
+    pages = [page_info(engine, entry) for entry in entries]
+    if args.json:
+        print(json.dumps(pages, indent=2))
+        return 0
+    for page in pages:
+        print(f"{page['device_id']}\t{page['page_id']}\t{page['title']}\t{page['url']}")
+    return 0
+
+
+def filter_entries(entries, query):
+    """The entries matching a filter box query"""
+    index = PageIndex()
+    index.update(entries)
+    search = PageSearchIndex()
+    search.apply(index)
+    matches = search.search(query)
+    if matches is None:
+        return list(entries)
+    return [entry for entry in entries if entry.key in matches]
+
+
+def match_page(engine, entries, page_id, device_id=None):
+    """The one entry with page_id (on device_id), or None after reporting why not"""
+    matches = engine.find_pages(entries, page_id, device_id)
+    if not matches:
+        print(f"error: no page with ID {page_id}", file=sys.stderr)
+        return None
+    if len(matches) > 1:
+        print(f"error: page ID {page_id} exists on several devices, pick one with --device:",
+              file=sys.stderr)
+        for entry in matches:
+            print(f"  {entry.device.device_id}\t{entry.title}", file=sys.stderr)
+        return None
+    return matches[0]
+
+
+def find_page(engine, args):
+    """The one page matching args.page_id (and --device), or None after reporting why not"""
+    return match_page(engine, engine.fetch_pages().entries(), args.page_id, args.device)
+
+
+def find_pages(engine, args):
+    """Every page in args.page_id plus those matching --filter, or None after reporting a missing one"""
+    entries = engine.fetch_pages().entries()
+    found = {}
+    for page_id in args.page_id:
+        entry = match_page(engine, entries, page_id, args.device)
+        if entry is None:
+            return None
+        found.setdefault(entry.key, entry)
+    if args.filter:
+        for entry in filter_entries(entries, args.filter):
+            if args.device is None or entry.device.device_id == args.device:
+                found.setdefault(entry.key, entry)
+    if not found:
+        print("error: no page matches", file=sys.stderr)
+        return None
+    return list(found.values())
+
+
+def cmd_open(engine, args):
+    if not args.page_id and not args.filter:
+        print("error: give page IDs or --filter", file=sys.stderr)
+        return 1
+    entries = find_pages(engine, args)
+    if entries is None:
+        return 1
+    for entry in entries:
+        print(engine.debugger_url(entry))
+    if not args.no_browser:
+        try:
+            opened, invocations = engine.open_pages(entries)
+        except OSError as e:
+            print(f"error: could not launch the browser: {e}", file=sys.stderr)
+            return 1
+        if len(opened) > 1:
+            print(f"opened {len(opened)} inspectors with {invocations} browser launch(es)", file=sys.stderr)
+    return 0
+
+
+def cmd_watch(engine, args):
+    output = Output(args.json)
+    stop_event = threading.Event()
+    index = PageIndex()
+    changes = []
+    lock = threading.Lock()
+    
+    def on_change(result):
+        with lock:
+            changes.append(result)
+    
+    watcher = engine.watcher(on_change)
+    watcher.start()
+    supervisor = None
+    if getattr(args, 'server', False):
+        try:
+            relay = engine.start_relay()
+            if relay is not None:
+                output.emit('relay_started', f"[relay] listening on {relay.listen_host}:{relay.port}",
+                            host=relay.listen_host, port=relay.port)
+        except OSError as e:
+            output.emit('relay_failed', f"[relay] could not start: {e}", error=str(e))
+        supervisor = start_server(engine, args, output, stop_event)
+        if supervisor is None:
+            watcher.stop()
+            return 1
+        start_metrics(engine, output)
+    
+    for _ in wait_for_signal(stop_event):
+        if supervisor is not None:
+            flush_server_output(supervisor, output)
+        with lock:
+            pending, changes[:] = changes[:], []
+        for result in pending:
+            print_changes(engine, index, result, output)
+    watcher.stop()
+    return 0
+
+
+def cmd_daemon(engine, args):
+    args.server = True
+    return cmd_watch(engine, args)
+
+
+def cmd_record(engine, args):
+    output = Output(args.json)
+    entry = find_page(engine, args)
+    if entry is None:
+        return 1
+    stop_event = threading.Event()
+    try:
+        recorder = engine.start_recording(entry, lambda recorder: stop_event.set())
+    except (OSError, WebSocketClosed) as e:
+        print(f"error: could not connect to page {entry.page_id}: {e}", file=sys.stderr)
+        return 1
+    output.emit('recording_started', f"[record] {entry.title} -> {recorder.path} (Ctrl+C to stop)",
+                path=recorder.path, **page_info(engine, entry))
+    
+    deadline = time.monotonic() + args.duration if args.duration else None
+    for _ in wait_for_signal(stop_event):
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+    engine.stop_recording(entry.key)
+    counts = ", ".join(f"{count} {domain}" for domain, count in sorted(recorder.counts.items())) or "no events"
+    output.emit('recording_finished', f"[record] {recorder.events} events ({counts}) saved in {recorder.path}",
+                path=recorder.path, events=recorder.events, counts=recorder.counts, error=recorder.error)
+    return 0
+
+
+def cmd_trace(engine, args):
+    output = Output(args.json)
+    entry = find_page(engine, args)
+    if entry is None:
+        return 1
+    duration = args.duration if args.duration is not None else engine.settings.trace_seconds
+    output.emit('trace_started', f"[trace] recording {entry.title} for {duration:g} s (Ctrl+C to stop early)",
+                duration=duration, **page_info(engine, entry))
+    
+    stop_event = threading.Event()
+    result = {}
+    
+    def capture():
+        try:
+            result['trace'] = engine.capture_trace(entry, duration, args.output, stop_event)
+        except (OSError, WebSocketClosed, TraceError) as e:
+            result['error'] = e
+        finally:
+            stop_event.set()
+    
+    thread = threading.Thread(target=capture, name="trace")
+    thread.daemon = True
+    thread.start()
+    for _ in wait_for_signal(stop_event):
+        pass
+    # Ctrl+C ends the capture early; what was recorded is still written
+    thread.join()
+    if 'error' in result:
+        print(f"error: could not trace page {entry.page_id}: {result['error']}", file=sys.stderr)
+        return 1
+    path, summary = result['trace']
+    if args.json:
+        output.emit('trace_finished', '', path=path, summary=summary)
+    else:
+        for line in describe_summary(summary):
+            print(f"[trace] {line}")
+        print(f"[trace] saved {path} (open it in https://ui.perfetto.dev or chrome://tracing)")
+    return 0
+
+
+def metrics_url(engine, path):
+    host = 'localhost' if engine.settings.metrics_host in ('', '0.0.0.0') else engine.settings.metrics_host
+    return f"http://{host}:{engine.settings.metrics_port}{path}"
+
+
+def cmd_metrics(engine, args):
+    import requests
+    url = metrics_url(engine, '/metrics')
+    try:
+        response = requests.get(url, timeout=engine.settings.read_timeout)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"error: no metrics at {url} (is the window or daemon running?): {e}", file=sys.stderr)
+        return 1
+    sys.stdout.write(response.text)
+    return 0
+
+
+def cmd_profile(engine, args):
+    import requests
+    url = metrics_url(engine, f'/debug/profile?seconds={args.seconds:g}')
+    try:
+        response = requests.get(url, timeout=args.seconds + engine.settings.read_timeout)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"error: could not profile via {url}: {e}", file=sys.stderr)
+        return 1
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(response.text)
+        print(f"{len(response.text.splitlines())} stacks saved in {args.output}")
+    else:
+        sys.stdout.write(response.text)
+    return 0
+
+
+def cmd_preflight(engine, args):
+    report = engine.preflight(args.webkit_path, use_cache=not args.refresh)
+    if args.json:
+        print(json.dumps(report.as_dict(), indent=2))
+    else:
+        for check in report.checks:
+            print(f"{check.status:<8} {check.detail}")
+        source = "cached tool versions" if report.cached else "probed tool versions"
+        print(f"{len(report.errors)} errors, {len(report.warnings)} warnings ({source}, {report.duration * 1000:.0f} ms)")
+    return 0 if report.ok else 1
+
+
+def cmd_save_session(engine, args):
+    from debugger_batch import SessionTarget, target_for
+    if args.url:
+        targets = [SessionTarget(args.device or '', args.url)]
+    else:
+        if not args.page_id and not args.filter:
+            print("error: give page IDs, --filter or --url", file=sys.stderr)
+            return 1
+        entries = find_pages(engine, args)
+        if entries is None:
+            return 1
+        targets = [target_for(entry) for entry in entries if entry.page_id]
+    try:
+        targets = engine.save_session(args.name, targets)
+    except (ValueError, OSError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print(f"saved session {args.name} in {engine.settings.saved_sessions_file}:")
+    for target in targets:
+        print(f"  {target.device or '*'}\t{target.url}")
+    return 0
+
+
+def cmd_saved_sessions(engine, args):
+    if args.delete:
+        try:
+            deleted = engine.delete_session(args.delete)
+        except OSError as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 1
+        if not deleted:
+            print(f"error: no saved session named {args.delete}", file=sys.stderr)
+            return 1
+        print(f"deleted session {args.delete}")
+        return 0
+    sessions = engine.saved_sessions()
+    if args.json:
+        print(json.dumps({name: [target._asdict() for target in targets] for name, targets in sessions.items()},
+                         indent=2))
+        return 0
+    for name, targets in sorted(sessions.items()):
+        print(name)
+        for target in targets:
+            print(f"  {target.device or '*'}\t{target.url}")
+    return 0
+
+
+def print_opened(engine, output, event, session, entries):
+    for entry in entries:
+        output.emit(event, f"[{session.name}] {event.replace('_', ' ')} {entry.page_id} {entry.title} {entry.url}",
+                    session=session.name, **page_info(engine, entry))
+
+
+def cmd_attach(engine, args):
+    output = Output(args.json)
+    try:
+        session, opened, invocations = engine.attach_session(args.name, engine.fetch_pages().entries())
+    except (ValueError, OSError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print_opened(engine, output, 'page_opened', session, opened)
+    output.emit('session_attached',
+                f"[{session.name}] attached: {len(opened)} pages opened with {invocations} browser launch(es), "
+                f"watching for matching pages (Ctrl+C to stop)",
+                session=session.name, opened=len(opened), invocations=invocations)
+    
+    stop_event = threading.Event()
+    changes = []
+    lock = threading.Lock()
+    
+    def on_change(result):
+        with lock:
+            changes.append(result)
+    
+    watcher = engine.watcher(on_change)
+    watcher.start()
+    for _ in wait_for_signal(stop_event):
+        with lock:
+            pending, changes[:] = changes[:], []
+        for result in pending:
+            try:
+                reopened = engine.sync_sessions(result)
+            except OSError as e:
+                output.emit('launch_failed', f"[{session.name}] could not launch the browser: {e}", error=str(e))
+                continue
+            for reattached, entries in reopened:
+                print_opened(engine, output, 'page_reattached', reattached, entries)
+    watcher.stop()
+    return 0
+
+
+def session_path(engine, name):
+    return name if os.path.isdir(name) else os.path.join(engine.settings.sessions_dir, name)
+
+
+def open_session(engine, name):
+    try:
+        return SessionReader(session_path(engine, name))
+    except OSError:
+        print(f"error: no recorded session {name}", file=sys.stderr)
+        return None
+
+
+def cmd_sessions(engine, args):
+    sessions = []
+    for name, meta in list_sessions(engine.settings.sessions_dir):
+        try:
+            summary = SessionReader(os.path.join(engine.settings.sessions_dir, name)).summary()
+        except OSError:
+            continue
+        sessions.append(dict(summary, name=name, **meta))
+    if args.json:
+        print(json.dumps(sessions, indent=2))
+        return 0
+    for session in sessions:
+        print(f"{session['name']}\t{session['events']} events\t{session['duration']:.0f} s\t"
+              f"{session.get('title', '')}\t{session.get('url', '')}")
+    return 0
+
+
+def event_filters(reader, args):
+    """SessionReader.events_matching() arguments from the shared filter options"""
+    return {
+        'start': reader.started + args.since if args.since is not None else None,
+        'end': reader.started + args.until if args.until is not None else None,
+        'levels': args.level,
+        'domains': args.domain,
+        'text': args.text,
+    }
+
+
+def print_event(reader, record, as_json):
+    if as_json:
+        print(json.dumps(record), flush=True)
+    else:
+        print(f"{record['t'] - reader.started:10.3f}s [{record['level']:>7}] {describe_event(record)}", flush=True)
+
+
+def cmd_search(engine, args):
+    reader = open_session(engine, args.session)
+    if reader is None:
+        return 1
+    shown = 0
+    for record in reader.events_matching(**event_filters(reader, args)):
+        print_event(reader, record, args.json)
+        shown += 1
+        if args.limit and shown >= args.limit:
+            break
+    return 0
+
+
+def cmd_replay(engine, args):
+    reader = open_session(engine, args.session)
+    if reader is None:
+        return 1
+    try:
+        reader.replay(lambda record: print_event(reader, record, args.json), speed=args.speed,
+                      **event_filters(reader, args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def add_event_filters(parser):
+    parser.add_argument('session', help="session name as shown by sessions, or its folder")
+    parser.add_argument('--level', action='append', choices=LEVELS, help="only this level (repeatable)")
+    parser.add_argument('--domain', action='append', choices=RECORDED_DOMAINS, help="only this domain (repeatable)")
+    parser.add_argument('--since', type=float, metavar='SECONDS', help="skip events before this offset")
+    parser.add_argument('--until', type=float, metavar='SECONDS', help="stop at this offset")
+    parser.add_argument('--text', help="only events containing this text (case-insensitive)")
+    parser.add_argument('--json', action='store_true', help="print events as JSON lines")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="ios-safari-debugger", description="iOS Safari remote debugging helper")
+    parser.add_argument('--config', default=CONFIG_FILE, help="config file (default: %(default)s)")
+    parser.add_argument('--webkit-path', help="WebKit folder containing start.sh/start.ps1")
+    parser.add_argument('--host', help="host running ios_webkit_debug_proxy")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    
+    start = subparsers.add_parser('start', help="run the debugging server in the foreground")
+    start.add_argument('--json', action='store_true', help="print events as JSON lines")
+    start.set_defaults(func=cmd_start)
+    
+    list_pages = subparsers.add_parser('list', help="list inspectable pages")
+    list_pages.add_argument('--json', action='store_true', help="print pages as JSON")
+    list_pages.add_argument('--filter', metavar='QUERY',
+                            help="only pages matching QUERY, e.g. 'shop host:^192.168 device:ipad'")
+    list_pages.set_defaults(func=cmd_list)
+    
+    open_page = subparsers.add_parser('open', help="open the inspectors of pages in one browser launch")
+    open_page.add_argument('page_id', nargs='*', help="page IDs as shown by list")
+    open_page.add_argument('--device', help="device ID, when a page ID exists on several devices")
+    open_page.add_argument('--filter', metavar='QUERY', help="also open every page matching QUERY")
+    open_page.add_argument('--no-browser', action='store_true', help="only print the debugger URL")
+    open_page.set_defaults(func=cmd_open)
+    
+    watch = subparsers.add_parser('watch', help="print page list changes until interrupted")
+    watch.add_argument('--json', action='store_true', help="print changes as JSON lines")
+    watch.set_defaults(func=cmd_watch)
+    
+    daemon = subparsers.add_parser('daemon', help="run the server and watch pages until stopped")
+    daemon.add_argument('--json', action='store_true', help="print events as JSON lines")
+    daemon.set_defaults(func=cmd_daemon)
+    
+    record = subparsers.add_parser('record', help="record a page's console and network events")
+    record.add_argument('page_id', help="page ID as shown by list")
+    record.add_argument('--device', help="device ID, when the page ID exists on several devices")
+    record.add_argument('--duration', type=float, metavar='SECONDS', help="stop after this long")
+    record.add_argument('--json', action='store_true', help="print events as JSON lines")
+    record.set_defaults(func=cmd_record)
+    
+    sessions = subparsers.add_parser('sessions', help="list recorded sessions")
+    sessions.add_argument('--json', action='store_true', help="print sessions as JSON")
+    sessions.set_defaults(func=cmd_sessions)
+    
+    search = subparsers.add_parser('search', help="print recorded events matching filters")
+    add_event_filters(search)
+    search.add_argument('--limit', type=int, help="stop after this many events")
+    search.set_defaults(func=cmd_search)
+    
+    replay = subparsers.add_parser('replay', help="print recorded events at their original pace")
+    add_event_filters(replay)
+    replay.add_argument('--speed', type=float, default=1.0, help="playback speed, 0 for no delays (default 1)")
+    replay.set_defaults(func=cmd_replay)
+    
+    trace = subparsers.add_parser('trace', help="record a performance trace of a page")
+    trace.add_argument('page_id', help="page ID as shown by list")
+    trace.add_argument('--device', help="device ID, when the page ID exists on several devices")
+    trace.add_argument('--duration', type=float, metavar='SECONDS',
+                       help="how long to record (default: trace_seconds from the config)")
+    trace.add_argument('--output', metavar='FILE', help="trace file to write (default: in traces_dir)")
+    trace.add_argument('--json', action='store_true', help="print the summary as JSON")
+    trace.set_defaults(func=cmd_trace)
+    
+    metrics = subparsers.add_parser('metrics', help="print the metrics of a running window or daemon")
+    metrics.set_defaults(func=cmd_metrics)
+    
+    profile = subparsers.add_parser('profile', help="sample the threads of a running window or daemon")
+    profile.add_argument('--seconds', type=float, default=5.0, help="how long to sample (default 5)")
+    profile.add_argument('--output', metavar='FILE', help="write the collapsed stacks here instead of stdout")
+    profile.set_defaults(func=cmd_profile)
+    
+    preflight = subparsers.add_parser('preflight', help="check tools, ports and the WebKit folder")
+    preflight.add_argument('--refresh', action='store_true', help="ignore cached tool versions")
+    preflight.add_argument('--json', action='store_true', help="print the checks as JSON")
+    preflight.set_defaults(func=cmd_preflight)
+    
+    save_session = subparsers.add_parser('save-session', help="save pages as a named session for attach")
+    save_session.add_argument('name', help="session name")
+    save_session.add_argument('page_id', nargs='*', help="page IDs as shown by list")
+    save_session.add_argument('--device', help="device ID (with --url: limit the pattern to this device)")
+    save_session.add_argument('--filter', metavar='QUERY', help="also save every page matching QUERY")
+    save_session.add_argument('--url', metavar='PATTERN', help="save this URL pattern instead of listed pages")
+    save_session.set_defaults(func=cmd_save_session)
+    
+    saved_sessions = subparsers.add_parser('saved-sessions', help="list saved sessions")
+    saved_sessions.add_argument('--delete', metavar='NAME', help="delete this saved session")
+    saved_sessions.add_argument('--json', action='store_true', help="print sessions as JSON")
+    saved_sessions.set_defaults(func=cmd_saved_sessions)
+    
+    attach = subparsers.add_parser('attach', help="open a saved session and reopen its pages when they reappear")
+    attach.add_argument('name', help="saved session name")
+    attach.add_argument('--json', action='store_true', help="print events as JSON lines")
+    attach.set_defaults(func=cmd_attach)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    settings = Settings(args.config).load()
+    if args.webkit_path:
+        settings.webkit_path = args.webkit_path
+    if args.host:
+        settings.proxy_host = args.host
+    
+    engine = DebuggerEngine(settings)
+    try:
+        return args.func(engine, args)
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
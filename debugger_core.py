@@ -0,0 +1,1776 @@
+"""UI-free engine behind the iOS Safari Debugger: server control, page discovery and setup
+
+Neither this nor the other debugger_* modules import tkinter, so the GUI in
+main.py and the command line in debugger_cli.py share the same code.
+"""
+import os
+import subprocess
+import json
+import platform
+import threading
+import configparser
+import time
+import hashlib
+import codecs
+import signal
+import socket
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from debugger_metrics import DEFAULT_METRICS_PORT, REGISTRY, SamplingProfiler
+from debugger_ws import DEFAULT_RELAY_PORT, WebSocketRelay, relay_alive, relay_ws_host
+
+# requests, logging and shutil are imported where they are first needed so that
+# opening the window (or running a CLI command that never hits the network)
+# doesn't pay for them; see benchmarks/bench_startup.py.
+
+CONFIG_FILE = os.path.join(os.path.expanduser("~"), ".ios_safari_debugger.ini")
+DEFAULT_CONNECT_TIMEOUT = 2.0
+DEFAULT_READ_TIMEOUT = 5.0
+DEFAULT_POLL_MIN_INTERVAL = 0.5
+DEFAULT_POLL_MAX_INTERVAL = 5.0
+DEFAULT_PROXY_HOST = "localhost"
+DEVICE_LIST_PORT = 9221  # ios_webkit_debug_proxy's device list; devices get 9222 and up
+DEFAULT_DEVICE_PORT = 9222
+LAST_DEVICE_PORT = 9322  # End of ios_webkit_debug_proxy's default device port range
+FRONTEND_PORT = 8080  # WebKit inspector frontend, served in-process or by the start script
+PROXY_BINARY = "ios_webkit_debug_proxy"
+DEFAULT_FRONTEND_CACHE_MB = 128
+DEFAULT_READY_TIMEOUT = 30.0
+DEFAULT_MAX_RESTARTS = 5
+SETUP_REPOSITORY_URL = "https://github.com/HimbeersaftLP/ios-safari-remote-debug-kit"
+SETUP_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".ios_safari_debugger", "cache")
+SYNC_MANIFEST_NAME = ".ios_safari_debugger_manifest.json"
+SESSIONS_DIR = os.path.join(os.path.expanduser("~"), ".ios_safari_debugger", "sessions")
+TRACES_DIR = os.path.join(os.path.expanduser("~"), ".ios_safari_debugger", "traces")
+PROFILES_DIR = os.path.join(os.path.expanduser("~"), ".ios_safari_debugger", "profiles")
+CONSOLE_LOG_FILE = os.path.join(os.path.expanduser("~"), ".ios_safari_debugger", "logs", "console.log")
+SAVED_SESSIONS_FILE = os.path.join(os.path.expanduser("~"), ".ios_safari_debugger", "debug_sessions.json")
+DEFAULT_TRACE_SECONDS = 10.0
+OUTPUT_FLUSH_INTERVAL_MS = 50  # Console refresh rate for process output (20 frames/s)
+OUTPUT_QUEUE_MAX_LINES = 5000
+DEFAULT_CONSOLE_MAX_LINES = 5000
+DEFAULT_CONSOLE_LOG_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_CONSOLE_LOG_BACKUPS = 3
+
+PAGE_REFRESH_SECONDS = REGISTRY.histogram(
+    'ios_debugger_page_refresh_seconds', "Time to fetch the device list and every device's pages")
+PAGE_REFRESHES = REGISTRY.counter(
+    'ios_debugger_page_refreshes_total', "Page list fetches by outcome (changed, unchanged, unreachable)", ('result',))
+DEVICES = REGISTRY.gauge('ios_debugger_devices', "Devices behind the proxy at the last fetch")
+SERVER_STARTS = REGISTRY.counter('ios_debugger_server_starts_total', "Debugging server processes spawned")
+SERVER_RESTARTS = REGISTRY.counter('ios_debugger_server_restarts_total', "Debugging server restarts after a crash")
+SERVER_EXITS = REGISTRY.counter('ios_debugger_server_exits_total', "Debugging server exits that were not requested")
+SERVER_READY_SECONDS = REGISTRY.histogram(
+    'ios_debugger_server_ready_seconds', "Time from spawning the debugging server to its ports answering")
+SERVER_OUTPUT_LINES = REGISTRY.counter('ios_debugger_server_output_lines_total', "Lines of debugging server output")
+SERVER_OUTPUT_BYTES = REGISTRY.counter('ios_debugger_server_output_bytes_total', "Bytes of debugging server output")
+SERVER_OUTPUT_DROPPED = REGISTRY.counter(
+    'ios_debugger_server_output_dropped_lines_total', "Server output lines dropped because the console fell behind")
+WEBKIT_SETUP_SECONDS = REGISTRY.histogram(
+    'ios_debugger_webkit_setup_seconds', "Duration of WebKit auto setup runs by outcome (ok, failed)", ('result',),
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800))
+
+
+class PageIdExtractor(HTMLParser):
+    """Collect the value attribute of <li> elements as the listing is fed in"""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.page_ids = []
+    
+    def handle_starttag(self, tag, attrs):
+        if tag != 'li':
+            return
+        for name, value in attrs:
+            if name == 'value':
+                self.page_ids.append(value or '')
+                break
+
+
+def extract_page_ids(html_chunks):
+    """Extract page IDs from the localhost:9222/ listing, given as a string or an iterable of chunks"""
+    parser = PageIdExtractor()
+    if isinstance(html_chunks, str):
+        html_chunks = (html_chunks,)
+    for chunk in html_chunks:
+        if chunk:
+            parser.feed(chunk)
+    parser.close()
+    return parser.page_ids
+
+
+def page_id_from_ws_url(ws_url):
+    """Return the page ID at the end of a /devtools/page/<id> websocket URL, or None"""
+    if not ws_url:
+        return None
+    _, sep, page_id = ws_url.rpartition('/devtools/page/')
+    if not sep or not page_id:
+        return None
+    return page_id
+
+
+PageEntry = namedtuple('PageEntry', ('key', 'page_id', 'title', 'url', 'page', 'device'))
+
+
+def build_page_entries(pages, html_page_ids=None, device=None):
+    """Turn /json pages into PageEntry rows keyed by device and page ID
+    
+    Not by websocket URL: the proxy leaves it out while a client is attached
+    to the page, so opening an inspector would change the key.
+    """
+    html_page_ids = html_page_ids or []
+    entries = []
+    seen = set()
+    for i, page in enumerate(pages):
+        ws_url = page.get('webSocketDebuggerUrl')
+        # Prefer the ID in the websocket URL, then the HTML listing, then index+1
+        page_id = page_id_from_ws_url(ws_url)
+        if page_id is None:
+            page_id = html_page_ids[i] if i < len(html_page_ids) else str(i+1)
+        key = f"{device.device_id if device else ''}:page:{page_id}"
+        if key in seen:
+            key = f"{key}#{i}"
+        seen.add(key)
+        entries.append(PageEntry(key, page_id, page.get('title', 'Untitled'), page.get('url', ''), page, device))
+    return entries
+
+
+class PageIndex:
+    """Inspectable pages keyed by PageEntry.key, kept in listing order"""
+    def __init__(self):
+        self.entries = {}
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def __iter__(self):
+        return iter(self.entries.values())
+    
+    def get(self, key):
+        return self.entries.get(key)
+    
+    def keys(self):
+        return list(self.entries)
+    
+    def update(self, entries):
+        """Replace the contents with entries and return the (added, removed, changed) keys"""
+        new_entries = {entry.key: entry for entry in entries}
+        removed = [key for key in self.entries if key not in new_entries]
+        added = []
+        changed = []
+        for key, entry in new_entries.items():
+            old = self.entries.get(key)
+            if old is None:
+                added.append(key)
+            elif old[1:4] != entry[1:4]:
+                changed.append(key)
+        self.entries = new_entries
+        return added, removed, changed
+
+
+SEARCH_FIELDS = ('title', 'url', 'host', 'device')
+
+
+def page_search_fields(entry):
+    """Lowercased text of a PageEntry for each of SEARCH_FIELDS"""
+    url = entry.url or ''
+    try:
+        host = urlsplit(url).hostname or ''
+    except ValueError:
+        host = ''
+    device = entry.device
+    device_text = f"{device.label} {device.device_id}" if device is not None else ''
+    return (str(entry.title or '').lower(), url.lower(), host.lower(), device_text.lower())
+
+
+def parse_page_query(query):
+    """Split a filter query into (field, anchored, text) terms that must all match
+    
+    Terms are separated by whitespace. field:text limits a term to one of
+    SEARCH_FIELDS (field is None otherwise) and a leading ^ only matches at the
+    start of the field or of a word in it; plain terms match anywhere.
+    """
+    terms = []
+    for word in query.lower().split():
+        field = None
+        name, sep, rest = word.partition(':')
+        if sep and name in SEARCH_FIELDS:
+            field, word = SEARCH_FIELDS.index(name), rest
+        anchored = word.startswith('^')
+        if anchored:
+            word = word[1:]
+        if word:
+            terms.append((field, anchored, word))
+    return terms
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class PageSearchIndex:
+    """Trigram index over the pages' title, URL, host and device for the filter box
+    
+    Kept in step with a PageIndex through apply(), so a refresh only re-indexes
+    the pages that changed. Typing that extends the previous query filters the
+    previous matches instead of going back to the index.
+    """
+    def __init__(self):
+        self.fields = {}  # key -> page_search_fields()
+        self.postings = {}  # trigram -> set of keys
+        self.generation = 0
+        self._last = None  # (generation, terms, matches) of the previous search
+    
+    def __len__(self):
+        return len(self.fields)
+    
+    def _add(self, key, fields):
+        self.fields[key] = fields
+        # Joined with \0 so no trigram spans two fields
+        for gram in _trigrams('\0'.join(fields)):
+            self.postings.setdefault(gram, set()).add(key)
+    
+    def _remove(self, key):
+        fields = self.fields.pop(key, None)
+        if fields is None:
+            return
+        for gram in _trigrams('\0'.join(fields)):
+            keys = self.postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.postings[gram]
+    
+    def apply(self, pages, added=None, removed=(), changed=()):
+        """Bring the index in line with a PageIndex after PageIndex.update()
+        
+        With added=None every page is compared, which also catches devices
+        that were renamed without any of their pages changing.
+        """
+        for key in removed:
+            self._remove(key)
+        keys = list(added) + list(changed) if added is not None else pages.keys()
+        for key in keys:
+            entry = pages.get(key)
+            fields = page_search_fields(entry)
+            if self.fields.get(key) != fields:
+                self._remove(key)
+                self._add(key, fields)
+                self.generation += 1
+        if removed:
+            self.generation += 1
+    
+    def _candidates(self, text):
+        if len(text) < 3:
+            return None
+        grams = sorted((self.postings.get(gram, ()) for gram in _trigrams(text)), key=len)
+        if not grams[0]:
+            return set()
+        return set(grams[0]).intersection(*grams[1:])
+    
+    def _matches(self, key, field, anchored, text):
+        fields = self.fields[key] if field is None else (self.fields[key][field],)
+        for value in fields:
+            position = value.find(text)
+            while position != -1:
+                if not anchored or position == 0 or not value[position - 1].isalnum():
+                    return True
+                position = value.find(text, position + 1)
+        return False
+    
+    def search(self, query):
+        """Keys of the pages matching query, or None when the query is empty (no filtering)"""
+        terms = parse_page_query(query)
+        if not terms:
+            return None
+        
+        pool = None
+        last = self._last
+        if last is not None and last[0] == self.generation and self._narrows(last[1], terms):
+            pool = last[2]
+        matches = set(self.fields) if pool is None else set(pool)
+        for field, anchored, text in terms:
+            candidates = self._candidates(text)
+            if candidates is not None:
+                matches &= candidates
+            matches = {key for key in matches if self._matches(key, field, anchored, text)}
+        self._last = (self.generation, terms, matches)
+        return matches
+    
+    @staticmethod
+    def _narrows(old, new):
+        """True if every page matching new also matches old"""
+        if not old or len(new) < len(old):
+            return False
+        for (old_field, old_anchored, old_text), (field, anchored, text) in zip(old, new):
+            if old_field != field or old_anchored != anchored or not text.startswith(old_text):
+                return False
+        return True
+
+
+class FetchResult:
+    """Outcome of one page listing fetch from the debugging proxy"""
+    def __init__(self):
+        self.html_page_ids = None
+        self.html_error = None
+        self.pages = None
+        self.json_error = None
+        self.connection_failed = False
+        self.digest = None  # SHA-1 of the /json body
+        self.unchanged = False  # True when the body matched the previous digest and was not parsed
+    
+    @property
+    def state(self):
+        """A value that only differs between two results when the UI needs updating"""
+        if self.connection_failed:
+            return "unreachable"
+        if self.digest is None:
+            return f"error: {self.json_error}"
+        return self.digest
+
+
+class PageFetcher:
+    """Fetch the proxy's HTML listing and /json endpoint off the Tk main thread"""
+    def __init__(self, host=DEFAULT_PROXY_HOST, port=DEFAULT_DEVICE_PORT,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT, executor=None):
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # One keep-alive session per worker thread; requests.Session is not thread-safe
+        self._local = threading.local()
+        # Runs the HTML listing alongside /json; without one the listing is fetched after it
+        self._executor = executor
+        # None until the first /json payload shows whether it carries websocket URLs;
+        # once it does, the HTML listing is no longer needed for page IDs
+        self.json_has_ids = None
+    
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+    
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            import requests
+            session = requests.Session()
+            self._local.session = session
+        return session
+    
+    def _get(self, path, stream=False):
+        return self._session().get(
+            f"{self.base_url}{path}",
+            timeout=(self.connect_timeout, self.read_timeout),
+            stream=stream
+        )
+    
+    def _fetch_html_page_ids(self):
+        with self._get("/", stream=True) as response:
+            if response.status_code != 200:
+                raise Exception(f"status: {response.status_code}")
+            if response.encoding is None:
+                response.encoding = 'utf-8'
+            return extract_page_ids(response.iter_content(chunk_size=8192, decode_unicode=True))
+    
+    def fetch(self, previous_digest=None):
+        """Fetch the JSON page list, plus the HTML listing concurrently when IDs can't come from /json
+        
+        If the /json body hashes to previous_digest it is not parsed and the result is marked unchanged.
+        """
+        import requests
+        result = FetchResult()
+        html_future = None
+        if not self.json_has_ids and self._executor is not None:
+            html_future = self._executor.submit(self._fetch_html_page_ids)
+        json_response = None
+        try:
+            json_response = self._get("/json")
+        except requests.exceptions.ConnectionError:
+            result.connection_failed = True
+        except Exception as e:
+            result.json_error = str(e)
+        
+        if html_future is not None:
+            try:
+                result.html_page_ids = html_future.result()
+            except Exception as e:
+                result.html_error = str(e)
+        
+        if json_response is not None:
+            if json_response.status_code == 200:
+                result.digest = hashlib.sha1(json_response.content).hexdigest()
+                if previous_digest is not None and result.digest == previous_digest:
+                    result.unchanged = True
+                    return result
+                try:
+                    result.pages = json_response.json()
+                except ValueError as e:
+                    result.digest = None
+                    result.json_error = f"invalid JSON: {str(e)}"
+            else:
+                result.json_error = f"server returned: {json_response.status_code}"
+        
+        if result.pages:
+            self.json_has_ids = all(
+                page_id_from_ws_url(page.get('webSocketDebuggerUrl')) for page in result.pages
+            )
+            if not self.json_has_ids and html_future is None:
+                # A client attached since the last fetch; without the listing the IDs (and keys) would shift
+                try:
+                    result.html_page_ids = self._fetch_html_page_ids()
+                except Exception as e:
+                    result.html_error = str(e)
+        return result
+
+
+class Device:
+    """One iOS device exposed by the proxy on its own port"""
+    def __init__(self, device_id, name, host, port, os_version='', fetcher=None):
+        self.device_id = device_id
+        self.name = name
+        self.host = host
+        self.port = port
+        self.os_version = os_version
+        self.fetcher = fetcher
+        self.last_result = None
+    
+    @property
+    def label(self):
+        if self.os_version:
+            return f"{self.name} (iOS {self.os_version})"
+        return self.name
+    
+    @property
+    def ws_host(self):
+        """host:port as used in the inspector's ws= parameter"""
+        return f"{self.host}:{self.port}"
+    
+    def fetch(self):
+        """Fetch this device's pages, reusing the last result when /json is unchanged"""
+        previous = self.last_result.digest if self.last_result else None
+        result = self.fetcher.fetch(previous_digest=previous)
+        if result.unchanged:
+            return self.last_result
+        self.last_result = result
+        return result
+
+
+def parse_device_list(devices, default_host=DEFAULT_PROXY_HOST):
+    """Return (device_id, name, os_version, host, port) tuples from the proxy's device list JSON"""
+    parsed = []
+    for item in devices:
+        host, _, port = (item.get('url') or '').rpartition(':')
+        try:
+            port = int(port)
+        except ValueError:
+            continue
+        device_id = item.get('deviceId') or f"{host or default_host}:{port}"
+        parsed.append((
+            device_id,
+            item.get('deviceName') or device_id,
+            item.get('deviceOSVersion', ''),
+            host or default_host,
+            port,
+        ))
+    return parsed
+
+
+class DeviceFetchResult:
+    """Page listings fetched from every known device in one pass"""
+    def __init__(self):
+        self.device_results = []  # (Device, FetchResult) in device list order
+        self.device_list_error = None
+        self.digest = None
+        self.unchanged = False
+    
+    def entries(self):
+        """PageEntry rows for every device that returned a page list"""
+        entries = []
+        for device, result in self.device_results:
+            if result.pages is not None:
+                entries.extend(build_page_entries(result.pages, result.html_page_ids, device))
+        return entries
+    
+    @property
+    def connection_failed(self):
+        return bool(self.device_results) and all(
+            result.connection_failed for _, result in self.device_results
+        )
+    
+    @property
+    def state(self):
+        """A value that only differs between two results when the UI needs updating"""
+        if self.connection_failed:
+            return "unreachable"
+        return self.digest
+
+
+class DeviceManager:
+    """Track the devices behind the proxy and fetch their page lists in parallel
+    
+    Devices are read from the proxy's device list on port 9221. If that is not
+    reachable a single device on the default port is assumed, which matches a
+    proxy started for one device.
+    """
+    def __init__(self, host=DEFAULT_PROXY_HOST, list_port=DEVICE_LIST_PORT,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 max_workers=8):
+        self.host = host
+        self.list_port = list_port
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.devices = {}  # device_id -> Device, in device list order
+        self._lock = threading.Lock()
+        # Separate pools: fan-out jobs wait on the HTML sub-requests they submit
+        self._fanout_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="device-fetch")
+        self._io_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="page-fetch")
+        # One long-lived thread for fetch_async, so its keep-alive session to the device list is reused
+        self._refresh_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="device-refresh")
+        self._list_fetcher = PageFetcher(host, list_port, connect_timeout, read_timeout, executor=self._io_executor)
+    
+    def _device_list(self):
+        """Return the parsed device list, or None and an error if the list is unavailable"""
+        try:
+            response = self._list_fetcher._get("/json")
+            if response.status_code != 200:
+                return None, f"status: {response.status_code}"
+            return parse_device_list(response.json(), self.host), None
+        except Exception as e:
+            return None, str(e)
+    
+    def refresh_devices(self):
+        """Sync the device table with the proxy's device list; returns the list error, if any"""
+        listed, error = self._device_list()
+        if listed is None:
+            listed = [(f"{self.host}:{DEFAULT_DEVICE_PORT}", f"{self.host}:{DEFAULT_DEVICE_PORT}", '',
+                       self.host, DEFAULT_DEVICE_PORT)]
+        
+        with self._lock:
+            devices = {}
+            for device_id, name, os_version, host, port in listed:
+                device = self.devices.get(device_id)
+                if device is None or (device.host, device.port) != (host, port):
+                    fetcher = PageFetcher(host, port, self.connect_timeout, self.read_timeout,
+                                          executor=self._io_executor)
+                    device = Device(device_id, name, host, port, os_version, fetcher)
+                else:
+                    device.name = name
+                    device.os_version = os_version
+                devices[device_id] = device
+            self.devices = devices
+        return error
+    
+    def get(self, device_id):
+        return self.devices.get(device_id)
+    
+    def fetch(self, previous_digest=None):
+        """Refresh the device list, then fetch every device's pages concurrently"""
+        started = time.perf_counter()
+        result = DeviceFetchResult()
+        result.device_list_error = self.refresh_devices()
+        devices = list(self.devices.values())
+        futures = [(device, self._fanout_executor.submit(device.fetch)) for device in devices]
+        
+        digest = hashlib.sha1()
+        for device, future in futures:
+            try:
+                device_result = future.result()
+            except Exception as e:
+                device_result = FetchResult()
+                device_result.json_error = str(e)
+            result.device_results.append((device, device_result))
+            digest.update(f"{device.device_id}\0{device.label}\0{device_result.state}\n".encode('utf-8'))
+        
+        result.digest = digest.hexdigest()
+        if previous_digest is not None and result.digest == previous_digest:
+            result.unchanged = True
+        PAGE_REFRESH_SECONDS.observe(time.perf_counter() - started)
+        if result.connection_failed:
+            outcome = 'unreachable'
+        else:
+            outcome = 'unchanged' if result.unchanged else 'changed'
+        PAGE_REFRESHES.inc(result=outcome)
+        DEVICES.set(len(devices))
+        return result
+    
+    def fetch_async(self, callback):
+        """Run fetch() on the refresh thread and pass the DeviceFetchResult to callback; refreshes run in turn"""
+        def job():
+            callback(self.fetch())
+        return self._refresh_executor.submit(job)
+    
+    def close(self):
+        self._refresh_executor.shutdown(wait=False)
+        self._fanout_executor.shutdown(wait=False)
+        self._io_executor.shutdown(wait=False)
+
+
+class PageWatcher:
+    """Poll /json on a background thread and report only real changes to the page list
+    
+    The interval drops to min_interval whenever the list changes and backs off
+    towards max_interval while it stays the same.
+    """
+    def __init__(self, fetcher, on_change, min_interval=DEFAULT_POLL_MIN_INTERVAL,
+                 max_interval=DEFAULT_POLL_MAX_INTERVAL, backoff=1.5):
+        self.fetcher = fetcher
+        self.on_change = on_change
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.backoff = backoff
+        self.interval = min_interval
+        self._last_state = None
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        # A fresh event per run so a stopped thread still sleeping can't be revived
+        self._stop_event = threading.Event()
+        self._last_state = None
+        self.interval = self.min_interval
+        self._thread = threading.Thread(target=self._run, args=(self._stop_event,), name="page-watcher")
+        self._thread.daemon = True
+        self._thread.start()
+    
+    def stop(self):
+        self._stop_event.set()
+        self._thread = None
+    
+    def poll(self):
+        """Fetch once; call on_change and return True if the page list changed"""
+        stop_event = self._stop_event
+        last_digest = self._last_state if self._last_state not in (None, "unreachable") else None
+        result = self.fetcher.fetch(previous_digest=last_digest)
+        if result.unchanged or result.state == self._last_state:
+            return False
+        self._last_state = result.state
+        if not stop_event.is_set():
+            self.on_change(result)
+        return True
+    
+    def _run(self, stop_event):
+        # Poll immediately, then adapt the interval to how often the list changes
+        while not stop_event.is_set():
+            try:
+                changed = self.poll()
+            except Exception:
+                changed = False
+            if changed:
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.interval * self.backoff, self.max_interval)
+            stop_event.wait(self.interval)
+
+
+class ProcessOutputReader:
+    """Drain a child process's output in chunks on a background thread
+    
+    Complete lines are queued in a bounded buffer for the UI to collect with
+    drain() at its own pace; when the UI falls behind the oldest lines are
+    dropped and counted rather than blocking the reader.
+    """
+    def __init__(self, stream=None, max_lines=OUTPUT_QUEUE_MAX_LINES, chunk_size=65536, encoding='utf-8'):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.encoding = encoding
+        self.lines = deque(maxlen=max_lines)
+        self.dropped = 0
+        self.total_lines = 0
+        self.total_bytes = 0
+        self.finished = threading.Event()
+        self._lock = threading.Lock()
+    
+    def start(self):
+        self.follow(self.stream)
+    
+    def follow(self, stream):
+        """Read stream into the same queue on a new thread, e.g. after the process was restarted"""
+        self.stream = stream
+        self.finished = threading.Event()
+        thread = threading.Thread(target=self._run, args=(stream.fileno(), self.finished), name="process-output")
+        thread.daemon = True
+        thread.start()
+    
+    def _run(self, fd, finished):
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+        partial = ''
+        try:
+            while True:
+                # Blocks until some output is available, then returns all of it (up to chunk_size)
+                data = os.read(fd, self.chunk_size)
+                if not data:
+                    break
+                self.total_bytes += len(data)
+                SERVER_OUTPUT_BYTES.inc(len(data))
+                partial = self._queue_text(partial, decoder.decode(data))
+            partial = self._queue_text(partial, decoder.decode(b'', final=True))
+            if partial:
+                self._queue_lines([partial])
+        except OSError:
+            pass
+        finally:
+            finished.set()
+    
+    def _queue_text(self, partial, text):
+        """Queue the complete lines in partial + text and return the unterminated remainder"""
+        if not text:
+            return partial
+        lines = (partial + text).split('\n')
+        # The last piece is an unterminated line (or ''); keep it until the rest arrives
+        partial = lines.pop()
+        self._queue_lines([line.rstrip('\r') for line in lines])
+        return partial
+    
+    def _queue_lines(self, lines):
+        if not lines:
+            return
+        with self._lock:
+            overflow = len(self.lines) + len(lines) - self.lines.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+                SERVER_OUTPUT_DROPPED.inc(overflow)
+            self.lines.extend(lines)
+            self.total_lines += len(lines)
+        SERVER_OUTPUT_LINES.inc(len(lines))
+    
+    def drain(self):
+        """Return (lines, dropped) accumulated since the last call"""
+        with self._lock:
+            lines = list(self.lines)
+            self.lines.clear()
+            dropped = self.dropped
+            self.dropped = 0
+        return lines, dropped
+    
+    def done(self):
+        """True once the stream has closed and every line has been drained"""
+        return self.finished.is_set() and not self.lines
+
+
+def warm_up():
+    """Import the HTTP stack on a background thread so the first refresh doesn't wait for it"""
+    thread = threading.Thread(target=__import__, args=("requests",), name="warm-up")
+    thread.daemon = True
+    thread.start()
+
+
+def port_open(host, port, timeout=0.5):
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def reserved_port_conflict(port, device_list_port=DEVICE_LIST_PORT):
+    """What port collides with among the proxy's and frontend's ports, or None"""
+    if port == device_list_port:
+        return "is ios_webkit_debug_proxy's device list port"
+    if DEFAULT_DEVICE_PORT <= port <= LAST_DEVICE_PORT:
+        return f"is inside ios_webkit_debug_proxy's device ports ({DEFAULT_DEVICE_PORT}-{LAST_DEVICE_PORT})"
+    if port == FRONTEND_PORT:
+        return "is the inspector frontend's port"
+    return None
+
+
+def start_script_command(webkit_path):
+    """Return (script_path, cmd) for the platform's start script in webkit_path"""
+    if platform.system() == "Windows":
+        script_path = os.path.join(webkit_path, "start.ps1")
+        return script_path, ["powershell", "-ExecutionPolicy", "Bypass", "-File", script_path]
+    # Assume Linux/macOS
+    script_path = os.path.join(webkit_path, "start.sh")
+    return script_path, ["bash", script_path]
+
+
+def find_proxy_binary(webkit_path):
+    """Path of ios_webkit_debug_proxy on PATH or bundled in webkit_path (as the Windows kit does), or None"""
+    import shutil
+    found = shutil.which(PROXY_BINARY)
+    if found:
+        return found
+    name = PROXY_BINARY + (".exe" if platform.system() == "Windows" else "")
+    for dirpath, dirnames, filenames in os.walk(webkit_path):
+        if name in filenames:
+            return os.path.join(dirpath, name)
+        # The WebKit sources are large and never contain the proxy
+        dirnames[:] = [d for d in dirnames if d not in ('WebKit', '.git')]
+    return None
+
+
+def script_proxy_args(script_path):
+    """Arguments the start script passes to ios_webkit_debug_proxy, or None if they can't be read safely
+    
+    Only a plain `ios_webkit_debug_proxy ARGS [&]` line is understood; shell
+    variables, pipes or more than one proxy line give None, so the caller
+    runs the script itself rather than dropping the user's flags.
+    """
+    import shlex
+    try:
+        with open(script_path, 'r', encoding='utf-8', errors='replace') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    found = None
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#') or PROXY_BINARY not in line:
+            continue
+        try:
+            words = shlex.split(line, comments=True)
+        except ValueError:
+            return None
+        while words and words[0] in ('&', 'exec', 'start', 'Start-Process'):
+            words = words[1:]
+        if not words or os.path.splitext(os.path.basename(words[0]))[0] != PROXY_BINARY:
+            return None
+        args = words[1:]
+        if args and args[-1] == '&':
+            args = args[:-1]
+        if found is not None or any(('$' in arg or arg in ('|', '||', '&&', ';', '>', '<', '&')) for arg in args):
+            return None
+        found = args
+    return found
+
+
+class ServerSupervisor:
+    """Run the start.sh/start.ps1 debugging server, probe readiness and restart it on crash
+    
+    on_event(kind, info) is called from the supervisor thread with kind one of
+    'started', 'ready', 'not_ready', 'exited', 'failed' or 'stopped'.
+    Readiness means every group in ready_ports has at least one port accepting
+    connections. Restarts back off exponentially; the delay and the failure
+    count reset once the server has stayed up for stable_after seconds.
+    """
+    def __init__(self, cmd, cwd, on_event, host=DEFAULT_PROXY_HOST,
+                 ready_ports=((DEVICE_LIST_PORT, DEFAULT_DEVICE_PORT), (FRONTEND_PORT,)),
+                 ready_timeout=DEFAULT_READY_TIMEOUT, max_restarts=DEFAULT_MAX_RESTARTS,
+                 backoff_initial=1.0, backoff_max=30.0, stable_after=30.0):
+        self.cmd = cmd
+        self.cwd = cwd
+        self.on_event = on_event
+        self.host = host
+        self.ready_ports = ready_ports
+        self.ready_timeout = ready_timeout
+        self.max_restarts = max_restarts
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.process = None
+        self.output = ProcessOutputReader()
+        self.restart_count = 0
+        self.ready = False
+        self.last_time_to_ready = None
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def _spawn(self):
+        options = {}
+        if platform.system() != "Windows":
+            # Own process group, so stopping also takes down the proxy start.sh launched
+            options['start_new_session'] = True
+        # Output is read unbuffered and decoded by ProcessOutputReader
+        self.process = subprocess.Popen(
+            self.cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=0,
+            cwd=self.cwd,
+            **options
+        )
+        SERVER_STARTS.inc()
+        self.output.follow(self.process.stdout)
+    
+    def _kill(self, process):
+        if platform.system() == "Windows":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            return
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except OSError:
+            process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                process.kill()
+    
+    def is_ready(self):
+        return all(any(port_open(self.host, port) for port in group) for group in self.ready_ports)
+    
+    def _wait_ready(self, stop_event, started):
+        """Poll the ready ports until they all answer; returns seconds to ready or None"""
+        while not stop_event.is_set() and self.process.poll() is None:
+            if self.is_ready():
+                return time.monotonic() - started
+            if time.monotonic() - started > self.ready_timeout:
+                return None
+            stop_event.wait(0.1)
+        return None
+    
+    def start(self):
+        self._stop_event = threading.Event()
+        self._spawn()
+        self._thread = threading.Thread(target=self._run, args=(self._stop_event,), name="server-supervisor")
+        self._thread.daemon = True
+        self._thread.start()
+    
+    def _run(self, stop_event):
+        backoff = self.backoff_initial
+        failures = 0
+        while True:
+            started = time.monotonic()
+            self.ready = False
+            self.on_event('started', {'pid': self.process.pid, 'restarts': self.restart_count})
+            
+            time_to_ready = self._wait_ready(stop_event, started)
+            if time_to_ready is not None:
+                self.ready = True
+                self.last_time_to_ready = time_to_ready
+                SERVER_READY_SECONDS.observe(time_to_ready)
+                self.on_event('ready', {'time_to_ready': time_to_ready, 'restarts': self.restart_count})
+            elif not stop_event.is_set() and self.process.poll() is None:
+                self.on_event('not_ready', {'timeout': self.ready_timeout})
+            
+            code = self.process.wait()
+            self.ready = False
+            if stop_event.is_set():
+                break
+            
+            SERVER_EXITS.inc()
+            uptime = time.monotonic() - started
+            if uptime >= self.stable_after:
+                backoff = self.backoff_initial
+                failures = 0
+            failures += 1
+            if failures > self.max_restarts:
+                self.on_event('failed', {'code': code, 'restarts': self.restart_count})
+                return
+            
+            self.on_event('exited', {'code': code, 'uptime': uptime, 'delay': backoff})
+            if stop_event.wait(backoff):
+                break
+            backoff = min(backoff * 2, self.backoff_max)
+            self.restart_count += 1
+            SERVER_RESTARTS.inc()
+            try:
+                self._spawn()
+            except Exception as e:
+                self.on_event('failed', {'error': str(e), 'restarts': self.restart_count})
+                return
+            if stop_event.is_set():
+                # stop() raced with the respawn
+                self._kill(self.process)
+                break
+        self.on_event('stopped', {'restarts': self.restart_count})
+    
+    def stop(self):
+        self._stop_event.set()
+        if self.process and self.process.poll() is None:
+            self._kill(self.process)
+
+
+class ConsoleBuffer:
+    """Lines waiting for the console widget, which keeps the last max_lines itself
+    
+    Lines are collected until the UI takes them in one batch. When log_file is
+    set every line is also written to size-rotated log files by a background
+    thread, so output trimmed from the widget is still kept on disk.
+    """
+    def __init__(self, max_lines=DEFAULT_CONSOLE_MAX_LINES, log_file=None,
+                 log_max_bytes=DEFAULT_CONSOLE_LOG_MAX_BYTES, log_backups=DEFAULT_CONSOLE_LOG_BACKUPS):
+        self.max_lines = max(1, max_lines)
+        self.pending = deque(maxlen=self.max_lines)
+        self._lock = threading.Lock()
+        self._log_queue = None
+        self._listener = None
+        if log_file:
+            import logging
+            import logging.handlers
+            import queue
+            os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=log_max_bytes, backupCount=log_backups, encoding='utf-8'
+            )
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self._make_record = logging.makeLogRecord
+            self._log_queue = queue.SimpleQueue()
+            self._listener = logging.handlers.QueueListener(self._log_queue, handler)
+            self._listener.start()
+    
+    def append(self, message):
+        lines = message.split('\n')
+        with self._lock:
+            self.pending.extend(lines)
+        if self._log_queue is not None:
+            # Stamped here, written to disk by the listener thread
+            for line in lines:
+                self._log_queue.put(self._make_record({'msg': line}))
+    
+    def take_pending(self):
+        """Return the lines added since the last call (at most max_lines)"""
+        with self._lock:
+            lines = list(self.pending)
+            self.pending.clear()
+        return lines
+    
+    def close(self):
+        """Write out the queued log lines and close the log file"""
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            self._log_queue = None
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_manifest(root, previous=None):
+    """Map each file under root to [size, mtime_ns, sha1], reusing hashes from previous when unchanged"""
+    previous = previous or {}
+    manifest = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d != '.git']
+        for name in filenames:
+            if name == SYNC_MANIFEST_NAME:
+                continue
+            path = os.path.join(dirpath, name)
+            rel_path = os.path.relpath(path, root).replace(os.sep, '/')
+            st = os.stat(path)
+            old = previous.get(rel_path)
+            if old and old[0] == st.st_size and old[1] == st.st_mtime_ns:
+                manifest[rel_path] = old
+            else:
+                manifest[rel_path] = [st.st_size, st.st_mtime_ns, file_sha1(path)]
+    return manifest
+
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    with open(path, 'w') as f:
+        json.dump(manifest, f)
+
+
+class WebKitSetup:
+    """Clone, generate and install the WebKit inspector kit, reusing a persistent cache
+    
+    The repository is shallow-cloned once into cache_dir and only fetched on later
+    runs; the generate step is skipped when upstream hasn't moved, and files are
+    synced into the target by content hash so unchanged files are not copied.
+    """
+    def __init__(self, target_dir, log, repository_url=SETUP_REPOSITORY_URL, cache_dir=SETUP_CACHE_DIR):
+        self.target_dir = target_dir
+        self.log = log
+        self.repository_url = repository_url
+        name = repository_url.rstrip('/').rsplit('/', 1)[-1]
+        url_hash = hashlib.sha1(repository_url.encode('utf-8')).hexdigest()[:8]
+        self.repo_dir = os.path.join(cache_dir, f"{name}-{url_hash}")
+        self.src_dir = os.path.join(self.repo_dir, "src")
+        self.marker_file = os.path.join(self.repo_dir, ".git", "ios_safari_debugger_generated")
+        self.manifest_file = os.path.join(self.repo_dir, ".git", "ios_safari_debugger_manifest.json")
+    
+    def _run(self, cmd, cwd=None, error="Command failed"):
+        process = subprocess.Popen(
+            cmd,
+            cwd=cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True
+        )
+        for output in process.stdout:
+            output = output.strip()
+            if output:
+                self.log(output)
+        if process.wait() != 0:
+            raise Exception(error)
+    
+    def _git_output(self, *args):
+        return subprocess.check_output(
+            ["git"] + list(args), cwd=self.repo_dir, universal_newlines=True, stderr=subprocess.DEVNULL
+        ).strip()
+    
+    def restore_if_modified(self):
+        """Reset the cached checkout if its files no longer match the last sync (e.g. edited through a hardlink)"""
+        recorded = load_manifest(self.manifest_file)
+        if not recorded or not os.path.isdir(self.src_dir):
+            return False
+        current = build_manifest(self.src_dir, recorded)
+        if {k: v[2] for k, v in current.items()} == {k: v[2] for k, v in recorded.items()}:
+            return False
+        self.log("Cached files were modified, restoring checkout...")
+        self._run(["git", "reset", "--hard", "HEAD"], self.repo_dir, "Git reset failed")
+        self._run(["git", "clean", "-fdx"], self.repo_dir, "Git clean failed")
+        if os.path.exists(self.marker_file):
+            os.remove(self.marker_file)
+        return True
+    
+    def update_repository(self):
+        """Clone or fast-forward the cached checkout and return its commit"""
+        if os.path.isdir(os.path.join(self.repo_dir, ".git")):
+            self.log("Fetching repository updates...")
+            try:
+                self._run(["git", "fetch", "--depth", "1", "origin", "HEAD"], self.repo_dir, "Git fetch failed")
+                if self._git_output("rev-parse", "HEAD") != self._git_output("rev-parse", "FETCH_HEAD"):
+                    self.log("Upstream changed, updating cached checkout...")
+                    self._run(["git", "reset", "--hard", "FETCH_HEAD"], self.repo_dir, "Git reset failed")
+                    self._run(["git", "clean", "-fdx"], self.repo_dir, "Git clean failed")
+            except Exception as e:
+                # Offline or a flaky remote; the cached checkout is still usable
+                self.log(f"Could not update cached repository ({str(e)}), using cached copy")
+        else:
+            if os.path.exists(self.repo_dir):
+                import shutil
+                shutil.rmtree(self.repo_dir)
+            os.makedirs(os.path.dirname(self.repo_dir), exist_ok=True)
+            self.log("Cloning repository...")
+            self._run(["git", "clone", "--depth", "1", self.repository_url, self.repo_dir],
+                      error="Git clone failed")
+        return self._git_output("rev-parse", "HEAD")
+    
+    def generate(self, commit):
+        """Run the generate script unless it already ran for this commit on this platform"""
+        stamp = f"{commit} {platform.system()}"
+        try:
+            with open(self.marker_file) as f:
+                if f.read().strip() == stamp:
+                    self.log("WebKit files are up to date, skipping generate step")
+                    return False
+        except OSError:
+            pass
+        
+        self.log("Generating WebKit files...")
+        if platform.system() == "Windows":
+            generate_script = os.path.join(self.src_dir, "generate.ps1")
+            generate_cmd = ["powershell", "-ExecutionPolicy", "Bypass", "-File", "generate.ps1"]
+        else:  # Linux/macOS
+            generate_script = os.path.join(self.src_dir, "generate.sh")
+            generate_cmd = ["bash", "generate.sh"]
+        if not os.path.exists(generate_script):
+            raise Exception(f"Generate script not found: {generate_script}")
+        
+        self._run(generate_cmd, self.src_dir, "Generate script failed")
+        with open(self.marker_file, 'w') as f:
+            f.write(stamp)
+        return True
+    
+    @staticmethod
+    def _files_not_installed(root, rel_dir, installed):
+        """Paths under rel_dir (relative to root) that are not in the installed manifest"""
+        foreign = []
+        for dirpath, _, filenames in os.walk(os.path.join(root, *rel_dir.split('/'))):
+            for filename in filenames:
+                rel_path = os.path.relpath(os.path.join(dirpath, filename), root).replace(os.sep, '/')
+                if rel_path not in installed:
+                    foreign.append(rel_path)
+        return foreign
+    
+    def sync(self):
+        """Copy (or hardlink) changed files into target/src and remove files the last sync installed"""
+        import shutil
+        target_src_dir = os.path.join(self.target_dir, "src")
+        os.makedirs(target_src_dir, exist_ok=True)
+        target_manifest_file = os.path.join(target_src_dir, SYNC_MANIFEST_NAME)
+        
+        source = build_manifest(self.src_dir, load_manifest(self.manifest_file))
+        save_manifest(self.manifest_file, source)
+        installed = load_manifest(target_manifest_file)
+        # Re-stat the target so files edited since the last sync are detected and replaced
+        current = build_manifest(target_src_dir, installed)
+        same_device = os.stat(self.src_dir).st_dev == os.stat(target_src_dir).st_dev
+        
+        copied = linked = 0
+        for rel_path, (size, mtime_ns, sha1) in source.items():
+            existing = current.get(rel_path)
+            if existing and existing[2] == sha1:
+                continue
+            src_path = os.path.join(self.src_dir, *rel_path.split('/'))
+            dest_path = os.path.join(target_src_dir, *rel_path.split('/'))
+            if os.path.isdir(dest_path) and not os.path.islink(dest_path):
+                # The kit turned a folder into a file; only replace the folder if the sync put everything in it
+                foreign = self._files_not_installed(target_src_dir, rel_path, installed)
+                if foreign:
+                    raise Exception(
+                        f"Cannot replace folder {dest_path} with a file from the kit: it holds files that "
+                        f"Auto Setup did not install ({', '.join(foreign[:3])}). Move them away and run setup again."
+                    )
+                shutil.rmtree(dest_path)
+            elif os.path.lexists(dest_path):
+                os.remove(dest_path)
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            if same_device:
+                try:
+                    os.link(src_path, dest_path)
+                    linked += 1
+                    continue
+                except OSError:
+                    pass
+            shutil.copy2(src_path, dest_path)
+            if rel_path.endswith(".sh"):
+                os.chmod(dest_path, 0o755)
+            copied += 1
+        
+        removed = 0
+        for rel_path in installed:
+            if rel_path not in source:
+                dest_path = os.path.join(target_src_dir, *rel_path.split('/'))
+                if os.path.isfile(dest_path):
+                    os.remove(dest_path)
+                    removed += 1
+        
+        # Only files installed from the cache are recorded, so user files are never removed
+        synced = build_manifest(target_src_dir, source)
+        save_manifest(target_manifest_file, {
+            rel_path: synced[rel_path] for rel_path in source if rel_path in synced
+        })
+        self.log(f"Synced files: {copied} copied, {linked} linked, {removed} removed, "
+                 f"{len(source) - copied - linked} unchanged")
+        return target_src_dir
+    
+    def run(self):
+        """Bring target/src up to date and return its path"""
+        started = time.perf_counter()
+        try:
+            self.restore_if_modified()
+            commit = self.update_repository()
+            self.log(f"Repository at commit {commit[:12]}")
+            self.generate(commit)
+            src_dir = self.sync()
+        except Exception:
+            WEBKIT_SETUP_SECONDS.observe(time.perf_counter() - started, result='failed')
+            raise
+        WEBKIT_SETUP_SECONDS.observe(time.perf_counter() - started, result='ok')
+        return src_dir
+
+
+class Settings:
+    """The [Settings] section of the config file, with a default for every key"""
+    FIELDS = (
+        ('webkit_path', str, ''),
+        ('repository_url', str, "https://github.com/google/ios-webkit-debug-proxy"),
+        ('connect_timeout', float, DEFAULT_CONNECT_TIMEOUT),
+        ('read_timeout', float, DEFAULT_READ_TIMEOUT),
+        ('poll_min_interval', float, DEFAULT_POLL_MIN_INTERVAL),
+        ('poll_max_interval', float, DEFAULT_POLL_MAX_INTERVAL),
+        ('console_max_lines', int, DEFAULT_CONSOLE_MAX_LINES),
+        ('console_log_enabled', bool, True),
+        ('console_log_file', str, ''),  # '' for CONSOLE_LOG_FILE
+        ('proxy_host', str, DEFAULT_PROXY_HOST),
+        ('device_list_port', int, DEVICE_LIST_PORT),
+        ('ready_timeout', float, DEFAULT_READY_TIMEOUT),
+        ('max_restarts', int, DEFAULT_MAX_RESTARTS),
+        ('relay_enabled', bool, True),
+        ('relay_host', str, '127.0.0.1'),
+        ('relay_port', int, DEFAULT_RELAY_PORT),
+        ('builtin_frontend', bool, True),
+        ('frontend_cache_mb', int, DEFAULT_FRONTEND_CACHE_MB),
+        ('sessions_dir', str, SESSIONS_DIR),
+        ('traces_dir', str, TRACES_DIR),
+        ('trace_seconds', float, DEFAULT_TRACE_SECONDS),
+        ('metrics_enabled', bool, True),
+        ('metrics_host', str, '127.0.0.1'),
+        ('metrics_port', int, DEFAULT_METRICS_PORT),
+        ('browser_command', str, ''),
+        ('saved_sessions_file', str, SAVED_SESSIONS_FILE),
+    )
+    def __init__(self, config_file=CONFIG_FILE):
+        self.config_file = config_file
+        self.config = configparser.ConfigParser()
+        self._write_lock = threading.Lock()
+        for name, _, default in self.FIELDS:
+            setattr(self, name, default)
+    
+    def load(self):
+        if os.path.exists(self.config_file):
+            self.config.read(self.config_file)
+        if 'Settings' not in self.config:
+            self.config['Settings'] = {}
+        section = self.config['Settings']
+        for name, kind, default in self.FIELDS:
+            if name in section:
+                try:
+                    if kind is bool:
+                        setattr(self, name, section.getboolean(name))
+                    else:
+                        setattr(self, name, kind(section[name]))
+                except ValueError:
+                    setattr(self, name, default)
+        return self
+    
+    def read_cache(self, section):
+        """A cache section of the config file as a dict (empty if absent)"""
+        return dict(self.config[section]) if section in self.config else {}
+    
+    def write_cache(self, section, values):
+        """Replace one cache section in the config file, leaving the rest of the file as it is on disk"""
+        with self._write_lock:
+            config = configparser.ConfigParser()
+            config.read(self.config_file)
+            config[section] = values
+            with open(self.config_file, 'w') as f:
+                config.write(f)
+            self.config[section] = values
+    
+    def save(self):
+        # Background threads write cache sections; one writer at a time keeps the file whole
+        with self._write_lock:
+            if 'Settings' not in self.config:
+                self.config['Settings'] = {}
+            section = self.config['Settings']
+            for name, _, default in self.FIELDS:
+                # Untouched defaults stay out of the file, so a later release can change them
+                value = getattr(self, name)
+                if name in section or value != default:
+                    section[name] = str(value)
+            with open(self.config_file, 'w') as f:
+                self.config.write(f)
+
+
+def debugger_url(ws_host, page_id, frontend_host=DEFAULT_PROXY_HOST, frontend_port=FRONTEND_PORT):
+    """URL of the WebKit inspector frontend attached to one page"""
+    return f"http://{frontend_host}:{frontend_port}/Main.html?ws={ws_host}/devtools/page/{page_id}"
+
+
+class DebuggerEngine:
+    """Server control, page discovery and debugger URLs, shared by the GUI and the CLI"""
+    def __init__(self, settings):
+        self.settings = settings
+        self.device_manager = DeviceManager(
+            settings.proxy_host,
+            settings.device_list_port,
+            connect_timeout=settings.connect_timeout,
+            read_timeout=settings.read_timeout
+        )
+        self.supervisor = None
+        self.relay = None
+        self.frontend = None
+        self.recorders = {}  # PageEntry.key -> PageRecorder
+        self.metrics = None
+        self.profiler = None
+        self.last_preflight = None
+        self.launcher = None
+        self.attached_sessions = {}  # name -> DebugSession reopening its pages after reloads
+    
+    def server_command(self, webkit_path=None):
+        """Return (script_path, cmd) for the start script; raises ValueError if it can't be used"""
+        webkit_path = webkit_path or self.settings.webkit_path
+        if not webkit_path or not os.path.exists(webkit_path):
+            raise ValueError("Please select a valid WebKit folder or use Auto Setup")
+        script_path, cmd = start_script_command(webkit_path)
+        if not os.path.exists(script_path):
+            raise ValueError(f"Script not found: {script_path}")
+        return script_path, cmd
+    
+    def frontend_command(self, webkit_path=None):
+        """Return (frontend_root, cmd) to run the proxy alone and serve the frontend in-process
+        
+        None when the built-in frontend is disabled, the kit doesn't have the
+        expected layout or the start script's proxy arguments can't be read, in
+        which case the start script serves it instead.
+        """
+        if not self.settings.builtin_frontend:
+            return None
+        from debugger_http import find_frontend_root
+        webkit_path = webkit_path or self.settings.webkit_path
+        frontend_root = find_frontend_root(webkit_path)
+        if frontend_root is None:
+            return None
+        proxy = find_proxy_binary(webkit_path)
+        if proxy is None:
+            return None
+        args = script_proxy_args(start_script_command(webkit_path)[0])
+        if args is None:
+            return None
+        return frontend_root, [proxy] + args
+    
+    def start_frontend(self, frontend_root):
+        """Serve the inspector frontend on FRONTEND_PORT; raises OSError if the port is taken"""
+        if self.frontend is not None:
+            if self.frontend.root == frontend_root:
+                return self.frontend
+            self.stop_frontend()
+        from debugger_http import FrontendServer
+        # All interfaces, like the http server the start script runs
+        frontend = FrontendServer(frontend_root, '', FRONTEND_PORT,
+                                  cache_bytes=self.settings.frontend_cache_mb * 1024 * 1024)
+        frontend.start()
+        self.frontend = frontend
+        return frontend
+    
+    def stop_frontend(self):
+        if self.frontend is not None:
+            self.frontend.stop()
+            self.frontend = None
+    
+    def preflight(self, webkit_path=None, use_cache=True):
+        """Check tools, ports and the WebKit folder; returns a PreflightReport (cached tool results are reused)"""
+        from debugger_preflight import run_preflight
+        serving = [server.port for server in (self.relay, self.metrics) if server is not None]
+        report = run_preflight(self.settings, webkit_path or self.settings.webkit_path, use_cache, serving=serving)
+        self.last_preflight = report
+        return report
+    
+    def start_server(self, on_event, webkit_path=None, report=None):
+        """Start the debugging server under a ServerSupervisor
+        
+        With the built-in frontend the supervisor only runs ios_webkit_debug_proxy
+        and the frontend is served from this process; otherwise it runs the start
+        script. The preflight checks run first (unless the caller passes the
+        report it just took) and a failure raises ValueError before anything is
+        spawned. on_event(supervisor, kind, info) is called from the supervisor
+        thread.
+        """
+        webkit_path = webkit_path or self.settings.webkit_path
+        if report is None:
+            report = self.preflight(webkit_path)
+        if not report.ok:
+            raise ValueError("\n".join(check.detail for check in report.errors))
+        _, cmd = self.server_command(webkit_path)
+        ready_ports = ((self.settings.device_list_port, DEFAULT_DEVICE_PORT), (FRONTEND_PORT,))
+        builtin = self.frontend_command(webkit_path)
+        if builtin is not None:
+            frontend_root, cmd = builtin
+            self.start_frontend(frontend_root)
+            ready_ports = ready_ports[:1]
+        supervisor = ServerSupervisor(
+            cmd,
+            webkit_path,
+            lambda kind, info: on_event(supervisor, kind, info),
+            host=self.settings.proxy_host,
+            ready_ports=ready_ports,
+            ready_timeout=self.settings.ready_timeout,
+            max_restarts=self.settings.max_restarts
+        )
+        supervisor.start()
+        self.supervisor = supervisor
+        return supervisor
+    
+    def stop_server(self):
+        if self.supervisor:
+            self.supervisor.stop()
+            self.supervisor = None
+        self.stop_frontend()
+    
+    def fetch_pages(self):
+        """Fetch every device's page list once (blocking) and return the DeviceFetchResult"""
+        return self.device_manager.fetch()
+    
+    def watcher(self, on_change):
+        """A PageWatcher over all devices, using the configured poll intervals"""
+        return PageWatcher(
+            self.device_manager,
+            on_change,
+            min_interval=self.settings.poll_min_interval,
+            max_interval=self.settings.poll_max_interval
+        )
+    
+    def _check_service_port(self, setting):
+        """Raise OSError naming the setting to change if its port is one the proxy or frontend needs"""
+        port = getattr(self.settings, setting)
+        conflict = reserved_port_conflict(port, self.settings.device_list_port)
+        if conflict:
+            raise OSError(f"{setting} {port} {conflict}; set {setting} in {self.settings.config_file} to another port")
+    
+    def _bind(self, server, setting):
+        try:
+            server.start()
+        except OSError as e:
+            raise OSError(f"{e.strerror or e}; set {setting} in {self.settings.config_file} to a free port") from e
+    
+    def _device_ports(self):
+        """Ports the relay may connect to: the proxy's default device ports and those of listed devices"""
+        ports = set(range(DEFAULT_DEVICE_PORT, LAST_DEVICE_PORT + 1))
+        ports.update(device.port for device in self.device_manager.devices.values())
+        return ports
+    
+    def start_relay(self):
+        """Start the local WebSocket relay if enabled; returns it, or None when disabled"""
+        if not self.settings.relay_enabled:
+            return None
+        if self.relay is None:
+            self._check_service_port('relay_port')
+            relay = WebSocketRelay(
+                self.settings.proxy_host,
+                self.settings.relay_host,
+                self.settings.relay_port,
+                connect_timeout=self.settings.connect_timeout,
+                allowed_ports=self._device_ports
+            )
+            self._bind(relay, 'relay_port')
+            self.relay = relay
+        return self.relay
+    
+    def start_metrics(self):
+        """Serve the metrics endpoint if enabled; returns the MetricsServer, or None when disabled
+        
+        Raises OSError with the setting to change when the port is taken or is
+        one of ios_webkit_debug_proxy's ports.
+        """
+        if not self.settings.metrics_enabled:
+            return None
+        if self.metrics is None:
+            from debugger_http import MetricsServer
+            self._check_service_port('metrics_port')
+            metrics = MetricsServer(REGISTRY, self.settings.metrics_host, self.settings.metrics_port)
+            self._bind(metrics, 'metrics_port')
+            self.metrics = metrics
+        return self.metrics
+    
+    def start_profiler(self):
+        """Start sampling every thread's stack; returns the SamplingProfiler"""
+        if self.profiler is None:
+            self.profiler = SamplingProfiler().start()
+        return self.profiler
+    
+    def stop_profiler(self, path=None):
+        """Stop the profiler and write its collapsed stacks; returns (path, profiler) or None"""
+        profiler, self.profiler = self.profiler, None
+        if profiler is None:
+            return None
+        profiler.stop()
+        if path is None:
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(profiler.started))
+            path = os.path.join(PROFILES_DIR, f"profile-{stamp}.txt")
+        return profiler.dump(path), profiler
+    
+    def relay_available(self):
+        """True if a relay runs in this process or another one (e.g. the daemon) answers on its port
+        
+        The port is asked for the relay's health path rather than just
+        connected to, since a device listener could hold it.
+        """
+        if not self.settings.relay_enabled:
+            return False
+        if self.relay is not None:
+            return True
+        host = 'localhost' if self.settings.relay_host in ('', '0.0.0.0') else self.settings.relay_host
+        return relay_alive(host, self.settings.relay_port)
+    
+    def page_ws_host(self, entry, use_relay=None):
+        """host:port[/device port] of a page's WebSocket, through the relay when one is available"""
+        if use_relay is None:
+            use_relay = self.relay_available()
+        if use_relay:
+            if self.relay is not None:
+                return self.relay.ws_host(entry.device.port)
+            return relay_ws_host(self.settings.relay_host, self.settings.relay_port, entry.device.port)
+        return entry.device.ws_host
+    
+    def debugger_url(self, entry, use_relay=None):
+        """Inspector URL for a page, going through the relay when one is available"""
+        return debugger_url(self.page_ws_host(entry, use_relay), entry.page_id)
+    
+    def _page_capture(self, entry):
+        """(WebSocket URL, meta) for recording or tracing a page, through the relay when it can run
+        
+        Going through the relay lets the capture share the page connection
+        with any inspector open on it.
+        """
+        try:
+            self.start_relay()
+        except OSError:
+            pass
+        meta = {
+            'device_id': entry.device.device_id,
+            'device': entry.device.label,
+            'page_id': entry.page_id,
+            'title': entry.title,
+            'url': entry.url,
+        }
+        return f"ws://{self.page_ws_host(entry)}/devtools/page/{entry.page_id}", meta
+    
+    def start_recording(self, entry, on_finished=None):
+        """Record a page's Console and Network events to a new folder in sessions_dir
+        
+        Returns the PageRecorder (the running one if the page is already being
+        recorded); raises OSError or WebSocketClosed if the page can't be
+        reached. on_finished(recorder) is called from the recorder thread.
+        """
+        from debugger_recorder import PageRecorder, session_name
+        recorder = self.recorders.get(entry.key)
+        if recorder is not None:
+            return recorder
+        ws_url, meta = self._page_capture(entry)
+        
+        def finished(recorder):
+            if self.recorders.get(entry.key) is recorder:
+                del self.recorders[entry.key]
+            if on_finished:
+                on_finished(recorder)
+        
+        recorder = PageRecorder(
+            ws_url,
+            os.path.join(self.settings.sessions_dir, session_name(entry)),
+            meta,
+            finished,
+            connect_timeout=self.settings.connect_timeout
+        )
+        self.recorders[entry.key] = recorder
+        try:
+            recorder.start()
+        except Exception:
+            self.recorders.pop(entry.key, None)
+            raise
+        return recorder
+    
+    def stop_recording(self, key=None):
+        """Stop recording one page (by PageEntry.key), or every page"""
+        keys = [key] if key is not None else list(self.recorders)
+        for key in keys:
+            recorder = self.recorders.pop(key, None)
+            if recorder is not None:
+                recorder.stop()
+    
+    def capture_trace(self, entry, duration=None, path=None, stop_event=None):
+        """Record a performance trace of a page and write it as Chrome trace JSON
+        
+        Blocks for duration seconds (trace_seconds by default) or until
+        stop_event is set. Returns (path, summary); raises OSError,
+        WebSocketClosed or TraceError if the page can't be traced.
+        """
+        from debugger_recorder import session_name
+        from debugger_trace import capture_trace, write_trace
+        ws_url, meta = self._page_capture(entry)
+        if duration is None:
+            duration = self.settings.trace_seconds
+        if path is None:
+            os.makedirs(self.settings.traces_dir, exist_ok=True)
+            path = os.path.join(self.settings.traces_dir, session_name(entry) + ".json")
+        capture = capture_trace(
+            ws_url,
+            duration,
+            meta,
+            connect_timeout=self.settings.connect_timeout,
+            stop_event=stop_event
+        )
+        return path, write_trace(capture, path)
+    
+    def debug_session(self, name='', targets=()):
+        """A DebugSession that opens inspectors through the configured browser in batches"""
+        from debugger_batch import BrowserLauncher, DebugSession, browser_command
+        if self.launcher is None:
+            self.launcher = BrowserLauncher(browser_command(self.settings.browser_command))
+        return DebugSession(self.launcher, self.debugger_url, name, targets)
+    
+    def open_pages(self, entries):
+        """Open the inspectors of several pages with one browser invocation; returns (opened, invocations)"""
+        return self.debug_session().open(entries)
+    
+    def saved_sessions(self):
+        """Saved sessions as {name: [SessionTarget]}"""
+        from debugger_batch import load_saved_sessions
+        return load_saved_sessions(self.settings.saved_sessions_file)
+    
+    def save_session(self, name, targets):
+        """Save (or replace) a named session of (device, URL pattern) targets"""
+        from debugger_batch import SessionTarget, save_saved_sessions
+        name = name.strip()
+        if not name:
+            raise ValueError("A saved session needs a name")
+        targets = [SessionTarget(*target) for target in targets]
+        if not targets:
+            raise ValueError("A saved session needs at least one page")
+        sessions = self.saved_sessions()
+        sessions[name] = targets
+        save_saved_sessions(self.settings.saved_sessions_file, sessions)
+        if name in self.attached_sessions:
+            self.attached_sessions[name].targets = targets
+        return targets
+    
+    def delete_session(self, name):
+        """Remove a saved session (detaching it); returns False if there was none"""
+        from debugger_batch import save_saved_sessions
+        self.detach_session(name)
+        sessions = self.saved_sessions()
+        if sessions.pop(name, None) is None:
+            return False
+        save_saved_sessions(self.settings.saved_sessions_file, sessions)
+        return True
+    
+    def attach_session(self, name, entries=()):
+        """Open a saved session's pages among entries and keep reopening them as they reappear
+        
+        Returns (session, opened entries, invocations); raises ValueError for
+        an unknown name. Call sync_sessions() with every page list fetched.
+        """
+        targets = self.saved_sessions().get(name)
+        if targets is None:
+            raise ValueError(f"No saved session named {name}")
+        session = self.attached_sessions.get(name)
+        if session is None:
+            session = self.attached_sessions[name] = self.debug_session(name, targets)
+        opened, invocations = session.open(session.reattach(entries), reason='attached')
+        return session, opened, invocations
+    
+    def detach_session(self, name=None):
+        """Stop reattaching one saved session, or all of them"""
+        names = [name] if name is not None else list(self.attached_sessions)
+        for name in names:
+            self.attached_sessions.pop(name, None)
+    
+    def sync_sessions(self, result):
+        """Bring attached sessions up to date with a DeviceFetchResult
+        
+        Returns (session, opened entries) for every session that opened
+        inspectors; all of them go to the browser in one invocation.
+        """
+        if not self.attached_sessions or result.connection_failed:
+            return []
+        entries = result.entries()
+        listed = {device.device_id for device, device_result in result.device_results
+                  if device_result.pages is not None}
+        reopened = []
+        for session in list(self.attached_sessions.values()):
+            pending = session.reattach(entries, listed)
+            if pending:
+                reopened.append((session, pending))
+        if reopened:
+            # A page matched by two sessions still gets a single inspector
+            self.debug_session().open([entry for _, pending in reopened for entry in pending], reason='reattached')
+            for session, pending in reopened:
+                session.mark_opened(pending)
+        return reopened
+    
+    def find_pages(self, entries, page_id, device_id=None):
+        """Entries whose page ID (or key, or websocket URL) matches, optionally limited to one device"""
+        page_id = str(page_id)
+        return [
+            entry for entry in entries
+            if (str(entry.page_id) == page_id or entry.key == page_id
+                or entry.page.get('webSocketDebuggerUrl') == page_id)
+            and (device_id is None or entry.device.device_id == device_id)
+        ]
+    
+    def close(self):
+        self.stop_recording()
+        self.stop_server()
+        if self.relay is not None:
+            self.relay.stop()
+            self.relay = None
+        if self.metrics is not None:
+            self.metrics.stop()
+            self.metrics = None
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler = None
+        self.device_manager.close()
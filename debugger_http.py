@@ -0,0 +1,348 @@
+"""In-process HTTP servers: the WebKit inspector frontend from an in-memory cache, and the metrics endpoint"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from debugger_metrics import DEFAULT_METRICS_PORT, PROMETHEUS_CONTENT_TYPE, REGISTRY, SamplingProfiler
+
+DEFAULT_FRONTEND_PORT = 8080
+DEFAULT_CACHE_BYTES = 128 * 1024 * 1024
+FRONTEND_INDEX = "Main.html"
+FRONTEND_SUBDIR = ("WebKit", "Source", "WebInspectorUI", "UserInterface")
+GZIP_MIN_SIZE = 512
+GZIP_LEVEL = 6
+MAX_PROFILE_SECONDS = 60.0
+
+# mimetypes reads the registry on Windows, which often maps .js to text/plain
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.mjs': 'application/javascript; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.json': 'application/json; charset=utf-8',
+    '.map': 'application/json; charset=utf-8',
+    '.svg': 'image/svg+xml',
+    '.txt': 'text/plain; charset=utf-8',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.ico': 'image/x-icon',
+    '.woff': 'font/woff',
+    '.woff2': 'font/woff2',
+    '.ttf': 'font/ttf',
+    '.otf': 'font/otf',
+}
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+
+def find_frontend_root(webkit_path):
+    """Folder holding the inspector's Main.html inside a WebKit kit folder, or None"""
+    for base in (webkit_path, os.path.join(webkit_path, "src")):
+        root = os.path.join(base, *FRONTEND_SUBDIR)
+        if os.path.isfile(os.path.join(root, FRONTEND_INDEX)):
+            return root
+    return None
+
+
+def content_type(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in CONTENT_TYPES:
+        return CONTENT_TYPES[ext]
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+class CachedFile:
+    """One file's bytes, its gzip variant (if worth having) and their ETags"""
+    __slots__ = ('stamp', 'content_type', 'data', 'gzip_data', 'etag', 'gzip_etag')
+    
+    def __init__(self, path, stamp):
+        self.stamp = stamp
+        self.content_type = content_type(path)
+        with open(path, 'rb') as f:
+            self.data = f.read()
+        digest = hashlib.sha1(self.data).hexdigest()[:20]
+        self.etag = f'"{digest}"'
+        self.gzip_data = None
+        self.gzip_etag = None
+        if len(self.data) >= GZIP_MIN_SIZE and self.content_type.startswith(COMPRESSIBLE_TYPES):
+            # mtime=0 keeps the output (and so the ETag) identical across restarts
+            compressed = gzip.compress(self.data, GZIP_LEVEL, mtime=0)
+            if len(compressed) < len(self.data):
+                self.gzip_data = compressed
+                self.gzip_etag = f'"{digest}-gz"'
+    
+    @property
+    def size(self):
+        return len(self.data) + len(self.gzip_data or b'')
+
+
+class FileCache:
+    """LRU cache of CachedFile keyed by path, revalidated against the file's mtime and size"""
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+    
+    def get(self, path):
+        """CachedFile for path; raises OSError if it can't be read"""
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry.stamp == stamp:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                return entry
+        # Read and compress outside the lock; two threads may race to load the same file, which is harmless
+        entry = CachedFile(path, stamp)
+        with self._lock:
+            self.misses += 1
+            old = self.entries.pop(path, None)
+            if old is not None:
+                self.total_bytes -= old.size
+            if entry.size <= self.max_bytes:
+                self.entries[path] = entry
+                self.total_bytes += entry.size
+                while self.total_bytes > self.max_bytes:
+                    _, evicted = self.entries.popitem(last=False)
+                    self.total_bytes -= evicted.size
+        return entry
+    
+    def preload(self, root, stop_event=None):
+        """Load every file under root until the cache is full"""
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                if stop_event is not None and stop_event.is_set():
+                    return
+                if self.total_bytes >= self.max_bytes:
+                    return
+                try:
+                    self.get(os.path.join(dirpath, name))
+                except OSError:
+                    pass
+    
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+
+def _etag_matches(header, etag):
+    """If-None-Match uses the weak comparison, so W/ prefixes are ignored"""
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class FrontendRequestHandler(BaseHTTPRequestHandler):
+    server_version = "iOSSafariDebugger"
+    # Keep-alive: the inspector pulls a few hundred files on first load
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this Nagle and delayed ACKs add ~40 ms per file
+    disable_nagle_algorithm = True
+    
+    def do_GET(self):
+        self._serve(send_body=True)
+    
+    def do_HEAD(self):
+        self._serve(send_body=False)
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _resolve(self):
+        """Filesystem path for the request, or None if it falls outside the frontend root"""
+        path = unquote(urlsplit(self.path).path)
+        path = posixpath.normpath('/' + path).lstrip('/')
+        if not path or path == '.':
+            path = FRONTEND_INDEX
+        # Backslashes and drive letters would let os.path.join escape the root on Windows
+        if any(part in ('..', '') for part in path.split('/')) or '\\' in path or ':' in path:
+            return None
+        return os.path.join(self.server.root, *path.split('/'))
+    
+    def _send_error(self, code, message):
+        body = message.encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+    
+    def _serve(self, send_body):
+        path = self._resolve()
+        if path is None or not os.path.isfile(path):
+            self._send_error(404, "Not found")
+            return
+        try:
+            entry = self.server.cache.get(path)
+        except OSError as e:
+            self._send_error(500, str(e))
+            return
+        
+        use_gzip = entry.gzip_data is not None and 'gzip' in self.headers.get('Accept-Encoding', '')
+        etag = entry.gzip_etag if use_gzip else entry.etag
+        body = entry.gzip_data if use_gzip else entry.data
+        # The asset URLs carry no version, so every file is revalidated by ETag and a kit update is picked up whole
+        cache_control = 'no-cache'
+        
+        if _etag_matches(self.headers.get('If-None-Match', ''), etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', cache_control)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-Type', entry.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', cache_control)
+        self.send_header('Vary', 'Accept-Encoding')
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+
+class FrontendServer:
+    """Serve the inspector frontend from root on host:port with an in-memory cache
+    
+    preload=True fills the cache on a background thread right after start, so
+    even the first open is served from memory.
+    """
+    def __init__(self, root, host='127.0.0.1', port=DEFAULT_FRONTEND_PORT,
+                 cache_bytes=DEFAULT_CACHE_BYTES, preload=True):
+        self.root = root
+        self.host = host
+        self.port = port
+        self.cache = FileCache(cache_bytes)
+        self.preload = preload
+        self._httpd = None
+        self._stop_event = threading.Event()
+    
+    @property
+    def running(self):
+        return self._httpd is not None
+    
+    def start(self):
+        httpd = ThreadingHTTPServer((self.host, self.port), FrontendRequestHandler)
+        httpd.daemon_threads = True
+        httpd.root = self.root
+        httpd.cache = self.cache
+        self.port = httpd.server_address[1]
+        self._httpd = httpd
+        self._stop_event = threading.Event()
+        thread = threading.Thread(target=httpd.serve_forever, args=(0.25,), name="frontend-server")
+        thread.daemon = True
+        thread.start()
+        if self.preload:
+            thread = threading.Thread(target=self.cache.preload, args=(self.root, self._stop_event),
+                                      name="frontend-preload")
+            thread.daemon = True
+            thread.start()
+    
+    def stop(self):
+        httpd, self._httpd = self._httpd, None
+        self._stop_event.set()
+        if httpd is not None:
+            httpd.shutdown()
+            httpd.server_close()
+    
+    def stats(self):
+        cache = self.cache
+        return {
+            'files': len(cache.entries),
+            'bytes': cache.total_bytes,
+            'hits': cache.hits,
+            'misses': cache.misses,
+        }
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    server_version = "iOSSafariDebugger"
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send(self, code, body, content_type='text/plain; charset=utf-8'):
+        data = body.encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/metrics':
+            self._send(200, self.server.registry.render(), PROMETHEUS_CONTENT_TYPE)
+        elif url.path == '/debug/profile':
+            try:
+                seconds = float(parse_qs(url.query).get('seconds', ['5'])[0])
+            except ValueError:
+                self._send(400, "seconds must be a number\n")
+                return
+            profiler = SamplingProfiler().start()
+            time.sleep(min(max(seconds, 0.0), MAX_PROFILE_SECONDS))
+            self._send(200, profiler.stop().collapsed())
+        elif url.path == '/':
+            self._send(200, "/metrics             Prometheus metrics\n"
+                            "/debug/profile?seconds=N  sample every thread for N seconds (collapsed stacks)\n")
+        else:
+            self._send(404, "Not found\n")
+
+
+class MetricsServer:
+    """Serve a MetricsRegistry on host:port (/metrics and /debug/profile)"""
+    def __init__(self, registry=REGISTRY, host='127.0.0.1', port=DEFAULT_METRICS_PORT):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._httpd = None
+    
+    @property
+    def running(self):
+        return self._httpd is not None
+    
+    @property
+    def url(self):
+        host = 'localhost' if self.host in ('', '0.0.0.0') else self.host
+        return f"http://{host}:{self.port}/metrics"
+    
+    def start(self):
+        httpd = ThreadingHTTPServer((self.host, self.port), MetricsRequestHandler)
+        httpd.daemon_threads = True
+        httpd.registry = self.registry
+        self.port = httpd.server_address[1]
+        self._httpd = httpd
+        thread = threading.Thread(target=httpd.serve_forever, args=(0.25,), name="metrics-server")
+        thread.daemon = True
+        thread.start()
+    
+    def stop(self):
+        httpd, self._httpd = self._httpd, None
+        if httpd is not None:
+            httpd.shutdown()
+            httpd.server_close()
@@ -0,0 +1,318 @@
+"""Counters, latency histograms and an on-demand sampling profiler for the debugger itself"""
+import contextlib
+import os
+import sys
+import threading
+import time
+
+DEFAULT_METRICS_PORT = 9401  # Next to the relay, above ios_webkit_debug_proxy's default device ports (9222-9322)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PROFILE_INTERVAL = 0.005
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        f'{name}="' + str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') + '"'
+        for name, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class Metric:
+    """A named metric with optional labels; each label combination is its own series"""
+    kind = 'untyped'
+    
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}  # label values tuple -> series state
+        self._lock = threading.Lock()
+    
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+    
+    def series(self):
+        """(labels dict, state) for every label combination seen so far"""
+        with self._lock:
+            items = list(self._series.items())
+        return [(dict(zip(self.labelnames, key)), state) for key, state in sorted(items)]
+    
+    def samples(self):
+        """(suffix, labels as (name, value) pairs, value) for the text format"""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """A value that only goes up"""
+    kind = 'counter'
+    
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+    
+    def value(self, **labels):
+        with self._lock:
+            return self._series.get(self._key(labels), 0)
+    
+    def samples(self):
+        for labels, value in self.series():
+            yield '', tuple(labels.items()), value
+
+
+class Gauge(Metric):
+    """A value that can go up and down, or is read from function when rendered"""
+    kind = 'gauge'
+    
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+    
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+    
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+    
+    def value(self, **labels):
+        if self.function is not None:
+            return self.function()
+        with self._lock:
+            return self._series.get(self._key(labels), 0)
+    
+    def samples(self):
+        if self.function is not None:
+            yield '', (), self.function()
+            return
+        for labels, value in self.series():
+            yield '', tuple(labels.items()), value
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets, with their sum and count"""
+    kind = 'histogram'
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+    
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._series.get(key)
+            if state is None:
+                state = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+    
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe how long the with block (or decorated function) takes"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+    
+    def count(self, **labels):
+        with self._lock:
+            state = self._series.get(self._key(labels))
+            return state['count'] if state else 0
+    
+    def quantile(self, q, **labels):
+        """Estimate of the q quantile, interpolated within its bucket like Prometheus does"""
+        with self._lock:
+            state = self._series.get(self._key(labels))
+            if state is None or not state['count']:
+                return None
+            counts = list(state['counts'])
+            total = state['count']
+        rank = q * total
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, counts):
+            if count and seen + count >= rank:
+                if bound == float('inf'):
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return lower
+    
+    def samples(self):
+        for labels, state in self.series():
+            pairs = tuple(labels.items())
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['counts']):
+                cumulative += count
+                yield '_bucket', pairs + (('le', _format_value(bound)),), cumulative
+            yield '_sum', pairs, state['sum']
+            yield '_count', pairs, state['count']
+
+
+class MetricsRegistry:
+    """Every metric of the process, by name; registering a name twice returns the first metric"""
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+    
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name} is already registered as a {metric.kind}")
+            return metric
+    
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+    
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self._register(Gauge, name, documentation, labelnames, function)
+    
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+    
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+PROCESS_START = time.time()
+REGISTRY.gauge('ios_debugger_start_time_seconds', "Unix time the debugger started", function=lambda: PROCESS_START)
+REGISTRY.gauge('ios_debugger_threads', "Live Python threads", function=lambda: threading.active_count())
+
+
+# Leaf functions that mean a thread is parked rather than working
+IDLE_FUNCTIONS = frozenset((
+    'wait', 'select', 'poll', 'recv', 'recv_into', 'accept', 'read', 'readinto', 'sleep', '_wait_for_tstate_lock',
+    'serve_forever', 'mainloop', 'get', 'acquire', '_recv_exact', '_worker',
+))
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Sample every thread's Python stack at a fixed interval into collapsed stacks
+    
+    Collapsed stacks are one line per distinct stack, outermost frame first,
+    prefixed with the thread name: "MainThread;main (main.py:600);... 42".
+    """
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = {}  # collapsed stack -> samples
+        self.samples = 0
+        self.started = None
+        self.stopped = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+    
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self):
+        if self.running:
+            return self
+        self._stop_event = threading.Event()
+        self.started = time.time()
+        self.stopped = None
+        self._thread = threading.Thread(target=self._run, args=(self._stop_event,), name="sampling-profiler")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.stopped = time.time()
+        return self
+    
+    def _run(self, stop_event):
+        own = threading.get_ident()
+        labels = {}  # code object -> label; codes live as long as their functions
+        while not stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            sampled = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _frame_label(code)
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                sampled.append(';'.join(reversed(stack)))
+            with self._lock:
+                for stack in sampled:
+                    self.stacks[stack] = self.stacks.get(stack, 0) + 1
+                self.samples += 1
+    
+    def collapsed(self):
+        """The samples as collapsed-stack text, heaviest stacks first"""
+        with self._lock:
+            stacks = sorted(self.stacks.items(), key=lambda item: -item[1])
+        return ''.join(f"{stack} {count}\n" for stack, count in stacks)
+    
+    def top(self, count=10, include_idle=False):
+        """(function, samples) with the most samples at the top of a stack
+        
+        Threads blocked in wait/select/recv are idle rather than busy; they
+        are left out unless include_idle is set.
+        """
+        functions = {}
+        with self._lock:
+            stacks = list(self.stacks.items())
+        for stack, samples in stacks:
+            leaf = stack.rsplit(';', 1)[-1]
+            if not include_idle and leaf.split(' (', 1)[0] in IDLE_FUNCTIONS:
+                continue
+            functions[leaf] = functions.get(leaf, 0) + samples
+        return sorted(functions.items(), key=lambda item: -item[1])[:count]
+    
+    def dump(self, path):
+        """Write the collapsed stacks to path"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.collapsed())
+        return path
@@ -0,0 +1,276 @@
+"""Preflight checks run before the debugging server is spawned, with tool versions cached in the config file"""
+import hashlib
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from debugger_core import (
+    DEFAULT_DEVICE_PORT,
+    FRONTEND_PORT,
+    PROXY_BINARY,
+    find_proxy_binary,
+    reserved_port_conflict,
+    start_script_command,
+)
+
+CACHE_SECTION = "Preflight"
+VERSION_TIMEOUT = 5.0
+MAX_VERSION_LENGTH = 80
+
+OK = 'ok'
+WARNING = 'warning'
+ERROR = 'error'
+
+Check = namedtuple('Check', ('name', 'status', 'detail'))
+
+
+class PreflightReport:
+    """Outcome of one preflight run"""
+    def __init__(self, checks, cached, duration):
+        self.checks = checks
+        self.cached = cached  # True when no tool had to be run for its version
+        self.duration = duration
+    
+    @property
+    def errors(self):
+        return [check for check in self.checks if check.status == ERROR]
+    
+    @property
+    def warnings(self):
+        return [check for check in self.checks if check.status == WARNING]
+    
+    @property
+    def ok(self):
+        return not self.errors
+    
+    def describe(self):
+        """One line per check that needs attention, or a single line when all passed"""
+        lines = [f"{check.status}: {check.detail}" for check in self.checks if check.status != OK]
+        if not lines:
+            source = "cached" if self.cached else "probed"
+            lines.append(f"Preflight passed ({len(self.checks)} checks, {source}, {self.duration * 1000:.0f} ms)")
+        return lines
+    
+    def as_dict(self):
+        return {
+            'ok': self.ok,
+            'cached': self.cached,
+            'duration': self.duration,
+            'checks': [check._asdict() for check in self.checks],
+        }
+
+
+def cache_key(webkit_path):
+    """Changes whenever a tool could have been added, removed or upgraded"""
+    digest = hashlib.sha1()
+    path = os.environ.get('PATH', '')
+    digest.update(path.encode('utf-8', 'replace'))
+    folders = path.split(os.pathsep)
+    if webkit_path:
+        folders += [webkit_path, os.path.join(webkit_path, "src")]
+    for folder in folders:
+        try:
+            stamp = os.stat(folder).st_mtime_ns
+        except OSError:
+            stamp = -1
+        digest.update(f"\0{folder}\0{stamp}".encode('utf-8', 'replace'))
+    return digest.hexdigest()
+
+
+def required_tools():
+    """(name, status if missing, why it is needed) for every tool worth checking"""
+    tools = [
+        (PROXY_BINARY, ERROR, "runs the connection to the device"),
+        ('git', WARNING, "needed by Auto Setup"),
+    ]
+    if platform.system() == "Windows":
+        tools.append(('powershell', ERROR, "runs start.ps1"))
+    else:
+        tools.append(('bash', ERROR, "runs start.sh"))
+    return tools
+
+
+def locate_tool(name, webkit_path):
+    if name == PROXY_BINARY:
+        return find_proxy_binary(webkit_path) if webkit_path and os.path.isdir(webkit_path) else shutil.which(name)
+    return shutil.which(name)
+
+
+def tool_version(path):
+    """First line of `path --version`, or '' if it doesn't say"""
+    options = {}
+    if platform.system() == "Windows":
+        options['creationflags'] = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+    try:
+        completed = subprocess.run(
+            [path, "--version"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            timeout=VERSION_TIMEOUT,
+            universal_newlines=True,
+            errors='replace',
+            **options
+        )
+    except (OSError, subprocess.SubprocessError):
+        return ''
+    for line in completed.stdout.splitlines():
+        if line.strip():
+            return line.strip()[:MAX_VERSION_LENGTH]
+    return ''
+
+
+def probe_tool(name, webkit_path, cached=None):
+    """{'path', 'mtime', 'version'} for a tool, reusing cached when the binary hasn't changed"""
+    path = locate_tool(name, webkit_path)
+    if path is None:
+        return {'path': None, 'mtime': None, 'version': ''}, True
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+    if cached and cached.get('path') == path and cached.get('mtime') == mtime:
+        return cached, True
+    return {'path': path, 'mtime': mtime, 'version': tool_version(path)}, False
+
+
+def port_available(port, host=''):
+    """True if nothing is listening on port, tested by binding it the way the servers will"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        if platform.system() != "Windows":
+            # As the servers do; otherwise a recently closed connection makes the port look busy
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def check_ports(ports):
+    checks = []
+    for port, role in ports:
+        if port_available(port):
+            checks.append(Check(f"port:{port}", OK, f"port {port} is free for the {role}"))
+        else:
+            checks.append(Check(
+                f"port:{port}", ERROR,
+                f"port {port} ({role}) is already in use; is another debugging server still running?"
+            ))
+    return checks
+
+
+def check_service_ports(settings, serving=()):
+    """Warn about the relay and metrics ports; serving lists the ports this process already listens on"""
+    checks = []
+    services = (
+        ('relay_port', settings.relay_enabled, "WebSocket relay"),
+        ('metrics_port', settings.metrics_enabled, "metrics endpoint"),
+    )
+    for setting, enabled, role in services:
+        port = getattr(settings, setting)
+        if not enabled:
+            continue
+        conflict = reserved_port_conflict(port, settings.device_list_port)
+        if conflict:
+            checks.append(Check(
+                f"port:{port}", WARNING,
+                f"port {port} ({role}) {conflict}; set {setting} in {settings.config_file} to another port"
+            ))
+        elif port in serving:
+            checks.append(Check(f"port:{port}", OK, f"port {port} is serving the {role}"))
+        elif not port_available(port):
+            checks.append(Check(
+                f"port:{port}", WARNING,
+                f"port {port} ({role}) is already in use; set {setting} in {settings.config_file} to a free port"
+            ))
+        else:
+            checks.append(Check(f"port:{port}", OK, f"port {port} is free for the {role}"))
+    return checks
+
+
+def check_webkit_folder(webkit_path, builtin_frontend=True):
+    from debugger_http import FRONTEND_SUBDIR, find_frontend_root
+    if not webkit_path or not os.path.isdir(webkit_path):
+        return [Check('webkit', ERROR, "Please select a valid WebKit folder or use Auto Setup")]
+    checks = []
+    script_path, _ = start_script_command(webkit_path)
+    if os.path.isfile(script_path):
+        checks.append(Check('webkit:script', OK, f"start script {script_path}"))
+    else:
+        checks.append(Check('webkit:script', ERROR, f"Script not found: {script_path}"))
+    if find_frontend_root(webkit_path) is not None:
+        checks.append(Check('webkit:frontend', OK, "inspector frontend found"))
+    else:
+        status = WARNING if builtin_frontend else OK
+        checks.append(Check(
+            'webkit:frontend', status,
+            f"no {os.path.join(*FRONTEND_SUBDIR)} in {webkit_path}; run Auto Setup to get the inspector frontend"
+        ))
+    return checks
+
+
+def run_preflight(settings, webkit_path=None, use_cache=True, ports=None, serving=()):
+    """Check everything the debugging server needs; returns a PreflightReport
+    
+    Results for tools are read from and written back to settings' config
+    file. ports defaults to the device list, first device and frontend ports;
+    the relay and metrics ports are checked too unless serving lists them.
+    """
+    started = time.perf_counter()
+    webkit_path = webkit_path if webkit_path is not None else settings.webkit_path
+    if ports is None:
+        ports = (
+            (settings.device_list_port, "device list"),
+            (DEFAULT_DEVICE_PORT, "first device"),
+            (FRONTEND_PORT, "inspector frontend"),
+        )
+    key = cache_key(webkit_path)
+    cache = settings.read_cache(CACHE_SECTION) if use_cache else {}
+    cached_tools = {}
+    if cache.get('key') == key:
+        try:
+            cached_tools = json.loads(cache.get('tools', '{}'))
+        except ValueError:
+            cached_tools = {}
+    
+    tools = required_tools()
+    with ThreadPoolExecutor(max_workers=len(tools) + 3, thread_name_prefix="preflight") as executor:
+        tool_futures = [
+            (name, status, reason, executor.submit(probe_tool, name, webkit_path, cached_tools.get(name)))
+            for name, status, reason in tools
+        ]
+        port_future = executor.submit(check_ports, ports)
+        service_future = executor.submit(check_service_ports, settings, serving)
+        folder_future = executor.submit(check_webkit_folder, webkit_path, settings.builtin_frontend)
+        
+        checks = []
+        results = {}
+        all_cached = True
+        for name, status, reason, future in tool_futures:
+            result, from_cache = future.result()
+            results[name] = result
+            all_cached = all_cached and from_cache
+            if result['path'] is None:
+                checks.append(Check(f"tool:{name}", status, f"{name} not found on PATH ({reason})"))
+            else:
+                version = f" ({result['version']})" if result['version'] else ""
+                checks.append(Check(f"tool:{name}", OK, f"{result['path']}{version}"))
+        checks.extend(folder_future.result())
+        checks.extend(port_future.result())
+        checks.extend(service_future.result())
+    
+    if results != cached_tools:
+        try:
+            settings.write_cache(CACHE_SECTION, {'key': key, 'tools': json.dumps(results, sort_keys=True)})
+        except OSError:
+            pass  # A read-only config only costs the next launch a re-probe
+    return PreflightReport(checks, all_cached, time.perf_counter() - started)
@@ -0,0 +1,414 @@
+"""Record a page's Console and Network events to compressed, block-indexed session files"""
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+
+from debugger_ws import WebSocketClosed, connect
+
+DEFAULT_SEGMENT_BYTES = 16 * 1024 * 1024  # Compressed size at which a new segment is started
+BLOCK_BYTES = 256 * 1024  # Uncompressed events per gzip member
+BLOCK_SECONDS = 1.0  # ... or whatever arrived in this long, so a crash loses at most a second
+META_FILE = "meta.json"
+INDEX_FILE = "index.jsonl"
+RECORDED_DOMAINS = ('Console', 'Network')
+LEVELS = ('debug', 'log', 'info', 'warning', 'error')
+
+
+def event_level(method, params):
+    """Severity of a protocol event, one of LEVELS"""
+    if method == 'Console.messageAdded':
+        level = ((params or {}).get('message') or {}).get('level', 'log')
+        return level if level in LEVELS else 'log'
+    if method == 'Network.loadingFailed':
+        return 'error'
+    if method == 'Network.responseReceived':
+        status = ((params or {}).get('response') or {}).get('status') or 0
+        return 'warning' if status >= 400 else 'info'
+    return 'info'
+
+
+def _text_values(value):
+    """Every string and number inside a decoded event, lowercased; dict keys are left out"""
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from _text_values(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _text_values(item)
+    elif isinstance(value, str):
+        yield value.lower()
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield str(value)
+
+
+def text_matches(record, text):
+    """True if lowercased text is part of the event's method or of any value in its params"""
+    if text in record['method'].lower():
+        return True
+    return any(text in value for value in _text_values(record.get('params')))
+
+
+def _raw_prefilter(text):
+    # A plain ASCII term is written byte for byte in the JSON line, so missing from the line means no match;
+    # quotes, backslashes, control and non-ASCII characters may be escaped there (older sessions escape non-ASCII)
+    return text.isascii() and text.isprintable() and '"' not in text and '\\' not in text
+
+
+def session_name(entry, started=None):
+    """Folder name for a new session: start time, device and page ID"""
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(started or time.time()))
+    device = ''.join(c if c.isalnum() else '-' for c in entry.device.device_id)[:24] if entry.device else 'device'
+    return f"{stamp}-{device}-page{entry.page_id}"
+
+
+class SessionWriter:
+    """Append events to a session folder in gzip blocks, indexing each block"""
+    def __init__(self, path, meta=None, segment_bytes=DEFAULT_SEGMENT_BYTES,
+                 block_bytes=BLOCK_BYTES, block_seconds=BLOCK_SECONDS):
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.block_bytes = block_bytes
+        self.block_seconds = block_seconds
+        os.makedirs(path, exist_ok=True)
+        if meta is not None:
+            with open(os.path.join(path, META_FILE), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, indent=2)
+        self.events = 0
+        self.bytes_written = 0
+        self._segment_number = 0
+        self._segment = None
+        self._segment_name = None
+        self._index = open(os.path.join(path, INDEX_FILE), 'a', encoding='utf-8')
+        self._block = []
+        self._block_bytes = 0
+        self._block_started = None
+        self._block_info = None
+        self._lock = threading.Lock()
+    
+    def _open_segment(self):
+        self._segment_number += 1
+        self._segment_name = f"segment-{self._segment_number:05d}.jsonl.gz"
+        self._segment = open(os.path.join(self.path, self._segment_name), 'ab')
+    
+    def write(self, record):
+        """Queue one event (a dict with at least t, method and level)"""
+        # Unescaped, so the text search's raw-line prefilter sees non-ASCII characters as they are
+        line = json.dumps(record, separators=(',', ':'), ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._block_info is None:
+                self._block_info = {
+                    'start': record['t'], 'end': record['t'], 'count': 0, 'first_seq': self.events,
+                    'levels': {}, 'domains': {},
+                }
+                self._block_started = time.monotonic()
+            info = self._block_info
+            info['end'] = record['t']
+            info['count'] += 1
+            info['levels'][record['level']] = info['levels'].get(record['level'], 0) + 1
+            domain = record['method'].split('.', 1)[0]
+            info['domains'][domain] = info['domains'].get(domain, 0) + 1
+            self._block.append(line)
+            self._block_bytes += len(line)
+            self.events += 1
+            if self._block_bytes >= self.block_bytes:
+                self._flush_block()
+    
+    def flush_if_due(self):
+        with self._lock:
+            if self._block and time.monotonic() - self._block_started >= self.block_seconds:
+                self._flush_block()
+    
+    def _flush_block(self):
+        if not self._block:
+            return
+        if self._segment is None or self._segment.tell() >= self.segment_bytes:
+            if self._segment is not None:
+                self._segment.close()
+            self._open_segment()
+        data = zlib.compress(''.join(self._block).encode('utf-8'), 6, 31)  # wbits 31: a complete gzip member
+        offset = self._segment.tell()
+        self._segment.write(data)
+        self._segment.flush()
+        info = self._block_info
+        info.update(segment=self._segment_name, offset=offset, length=len(data))
+        # The index line only goes out once its block is on disk
+        self._index.write(json.dumps(info, separators=(',', ':')) + '\n')
+        self._index.flush()
+        self.bytes_written += len(data)
+        self._block = []
+        self._block_bytes = 0
+        self._block_info = None
+    
+    def close(self):
+        with self._lock:
+            self._flush_block()
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+            self._index.close()
+
+
+class PageRecorder:
+    """Subscribe to a page's Console and Network domains and stream their events to a SessionWriter
+    
+    Works both with pages that take commands directly and with the Target
+    multiplexing newer iOS versions use, where every page target (including
+    the new one after a cross-origin navigation) has to be enabled separately.
+    on_finished(recorder) is called from the recorder thread when the page
+    connection ends.
+    """
+    def __init__(self, ws_url, path, meta=None, on_finished=None, connect_timeout=5.0,
+                 segment_bytes=DEFAULT_SEGMENT_BYTES):
+        self.ws_url = ws_url
+        self.path = path
+        self.meta = meta
+        self.on_finished = on_finished
+        self.connect_timeout = connect_timeout
+        self.segment_bytes = segment_bytes
+        self.writer = None
+        self.counts = {}  # domain -> events recorded
+        self.error = None
+        self._ws = None
+        self._thread = None
+        self._next_id = 1
+        self._stop_event = threading.Event()
+    
+    @property
+    def events(self):
+        return self.writer.events if self.writer else 0
+    
+    def start(self):
+        """Connect to the page and start recording; raises OSError or WebSocketClosed if it can't"""
+        self._ws = connect(self.ws_url, timeout=self.connect_timeout)
+        meta = dict(self.meta or {}, ws_url=self.ws_url, started=time.time())
+        self.writer = SessionWriter(self.path, meta, self.segment_bytes)
+        self._enable(None)
+        self._thread = threading.Thread(target=self._run, name="recorder")
+        self._thread.daemon = True
+        self._thread.start()
+        thread = threading.Thread(target=self._flush_loop, name="recorder-flush")
+        thread.daemon = True
+        thread.start()
+    
+    def stop(self, timeout=5.0):
+        """Disconnect and wait for the last block to be written"""
+        self._stop_event.set()
+        if self._ws is not None:
+            self._ws.close()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+    
+    def _send(self, method, target_id=None):
+        message = {'id': self._next_id, 'method': method}
+        self._next_id += 1
+        if target_id is not None:
+            message = {
+                'id': self._next_id,
+                'method': 'Target.sendMessageToTarget',
+                'params': {'targetId': target_id, 'message': json.dumps(message)},
+            }
+            self._next_id += 1
+        self._ws.send(json.dumps(message))
+    
+    def _enable(self, target_id):
+        for domain in RECORDED_DOMAINS:
+            self._send(f"{domain}.enable", target_id)
+    
+    def _handle(self, message, target_id=None):
+        method = message.get('method')
+        if not method:
+            return
+        params = message.get('params') or {}
+        if method == 'Target.dispatchMessageFromTarget':
+            try:
+                inner = json.loads(params.get('message', ''))
+            except ValueError:
+                return
+            if isinstance(inner, dict):
+                self._handle(inner, params.get('targetId'))
+            return
+        if method == 'Target.targetCreated':
+            info = params.get('targetInfo') or {}
+            if info.get('type', 'page') == 'page' and info.get('targetId'):
+                self._enable(info['targetId'])
+            return
+        if method == 'Target.didCommitProvisionalTarget':
+            if params.get('newTargetId'):
+                self._enable(params['newTargetId'])
+            return
+        
+        domain = method.split('.', 1)[0]
+        if domain not in RECORDED_DOMAINS:
+            return
+        self.counts[domain] = self.counts.get(domain, 0) + 1
+        self.writer.write({
+            't': time.time(),
+            'method': method,
+            'level': event_level(method, params),
+            'target': target_id,
+            'params': params,
+        })
+    
+    def _run(self):
+        try:
+            while True:
+                raw = self._ws.recv()
+                try:
+                    message = json.loads(raw)
+                except ValueError:
+                    continue
+                if isinstance(message, dict):
+                    self._handle(message)
+        except WebSocketClosed as e:
+            if not self._stop_event.is_set():
+                self.error = str(e)
+        finally:
+            self._stop_event.set()
+            self.writer.close()
+            if self.on_finished:
+                self.on_finished(self)
+    
+    def _flush_loop(self):
+        while not self._stop_event.wait(BLOCK_SECONDS / 2):
+            self.writer.flush_if_due()
+
+
+def list_sessions(sessions_dir):
+    """(name, meta) of the recorded sessions in sessions_dir, oldest first"""
+    sessions = []
+    try:
+        names = sorted(os.listdir(sessions_dir))
+    except OSError:
+        return sessions
+    for name in names:
+        try:
+            with open(os.path.join(sessions_dir, name, META_FILE), encoding='utf-8') as f:
+                sessions.append((name, json.load(f)))
+        except (OSError, ValueError):
+            continue
+    return sessions
+
+
+class SessionReader:
+    """Search and replay a recorded session, decompressing only the blocks a query can match"""
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+                self.meta = json.load(f)
+        except (OSError, ValueError):
+            self.meta = {}
+        self.index = []
+        with open(os.path.join(path, INDEX_FILE), encoding='utf-8') as f:
+            for line in f:
+                try:
+                    self.index.append(json.loads(line))
+                except ValueError:
+                    break  # Partly written last line of a session that is still recording
+        self.started = self.meta.get('started') or (self.index[0]['start'] if self.index else 0.0)
+    
+    @property
+    def events(self):
+        return sum(block['count'] for block in self.index)
+    
+    def summary(self):
+        """Event counts per level and domain, from the index alone"""
+        levels = {}
+        domains = {}
+        for block in self.index:
+            for name, count in block['levels'].items():
+                levels[name] = levels.get(name, 0) + count
+            for name, count in block['domains'].items():
+                domains[name] = domains.get(name, 0) + count
+        end = self.index[-1]['end'] if self.index else self.started
+        return {'events': self.events, 'duration': end - self.started, 'levels': levels, 'domains': domains}
+    
+    def blocks(self, start=None, end=None, levels=None, domains=None):
+        """Index entries that may hold events matching the filters"""
+        for block in self.index:
+            if start is not None and block['end'] < start:
+                continue
+            if end is not None and block['start'] > end:
+                continue
+            if levels and not any(level in block['levels'] for level in levels):
+                continue
+            if domains and not any(domain in block['domains'] for domain in domains):
+                continue
+            yield block
+    
+    def _read_block(self, block):
+        with open(os.path.join(self.path, block['segment']), 'rb') as f:
+            f.seek(block['offset'])
+            data = f.read(block['length'])
+        return gzip.decompress(data).decode('utf-8')
+    
+    def events_matching(self, start=None, end=None, levels=None, domains=None, text=None):
+        """Yield recorded events in order; start/end are epoch seconds, text a case-insensitive substring"""
+        text = text.lower() if text else None
+        prefilter = bool(text) and _raw_prefilter(text)
+        for block in self.blocks(start, end, levels, domains):
+            # Not splitlines(): unescaped text may hold U+2028 and other characters it breaks lines at
+            for line in self._read_block(block).split('\n'):
+                if not line:
+                    continue
+                # Cheap substring test on the raw line before parsing it
+                if prefilter and text not in line.lower():
+                    continue
+                record = json.loads(line)
+                if start is not None and record['t'] < start:
+                    continue
+                if end is not None and record['t'] > end:
+                    return
+                if levels and record['level'] not in levels:
+                    continue
+                if domains and record['method'].split('.', 1)[0] not in domains:
+                    continue
+                if text and not text_matches(record, text):
+                    continue
+                yield record
+    
+    def replay(self, callback, speed=1.0, stop_event=None, **filters):
+        """Call callback(record) for each matching event, paced like the original (speed > 1 is faster)"""
+        first_time = None
+        first_clock = None
+        for record in self.events_matching(**filters):
+            if first_time is None:
+                first_time = record['t']
+                first_clock = time.monotonic()
+            elif speed > 0:
+                delay = (record['t'] - first_time) / speed - (time.monotonic() - first_clock)
+                if delay > 0:
+                    if stop_event is not None:
+                        if stop_event.wait(delay):
+                            return
+                    else:
+                        time.sleep(delay)
+            if stop_event is not None and stop_event.is_set():
+                return
+            callback(record)
+
+
+def describe_event(record):
+    """One line of text for a recorded event"""
+    params = record.get('params') or {}
+    method = record['method']
+    if method == 'Console.messageAdded':
+        message = params.get('message') or {}
+        where = message.get('url') or ''
+        if where and message.get('line'):
+            where = f" ({where}:{message['line']})"
+        elif where:
+            where = f" ({where})"
+        return f"console.{message.get('level', 'log')}: {message.get('text', '')}{where}"
+    if method == 'Network.requestWillBeSent':
+        request = params.get('request') or {}
+        return f"{request.get('method', 'GET')} {request.get('url', '')}"
+    if method == 'Network.responseReceived':
+        response = params.get('response') or {}
+        return f"{response.get('status', '')} {response.get('url', '')}"
+    if method == 'Network.loadingFailed':
+        return f"failed {params.get('requestId', '')}: {params.get('errorText', '')}"
+    return method
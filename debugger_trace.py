@@ -0,0 +1,498 @@
+"""Capture a page's Timeline and ScriptProfiler data as a Chrome trace"""
+import json
+import threading
+import time
+
+from debugger_ws import WebSocketClosed, connect
+
+DEFAULT_TRACE_SECONDS = 10.0
+TRACE_INSTRUMENTS = ('ScriptProfiler', 'Timeline')
+MAX_CALL_STACK_DEPTH = 5
+TARGET_WAIT = 1.0  # Newer iOS announces the page target as soon as the socket opens
+STOP_WAIT = 5.0  # For the last records and the profiler samples after Timeline.stop
+COMMAND_TIMEOUT = 5.0
+LONG_TASK_SECONDS = 0.05
+TOP_TASKS = 10
+TOP_FUNCTIONS = 10
+SAMPLE_SECONDS = 0.001  # ScriptProfiler's sampling interval, used for the last sample of a run
+MAX_SAMPLE_GAP = 0.01  # Samples further apart than this are separate runs in the flame chart
+
+# Timeline record type -> summary category; anything else is 'other'
+CATEGORIES = {
+    'Layout': 'layout',
+    'InvalidateLayout': 'layout',
+    'RecalculateStyles': 'style',
+    'ScheduleStyleRecalculation': 'style',
+    'Paint': 'paint',
+    'Composite': 'paint',
+    'Screenshot': 'paint',
+    'RenderingFrame': 'rendering',
+    'EvaluateScript': 'script',
+    'FunctionCall': 'script',
+    'TimerFire': 'script',
+    'EventDispatch': 'script',
+    'FireAnimationFrame': 'script',
+    'ObserverCallback': 'script',
+    'ProbeSample': 'script',
+    'ConsoleProfile': 'script',
+}
+SUMMARY_CATEGORIES = ('script', 'layout', 'style', 'paint', 'rendering', 'other')
+
+PID = 1
+MAIN_TID = 1
+SCRIPT_TID = 2
+SAMPLES_TID = 3
+
+
+class TraceError(Exception):
+    """The page refused a command or went away before the trace could be taken"""
+
+
+class InspectorClient:
+    """Commands with responses over a page WebSocket
+    
+    When the page announces a target (newer iOS), commands are wrapped in
+    Target.sendMessageToTarget and its events unwrapped again; older pages
+    take them directly. on_event(method, params) is called from the reader
+    thread for every event.
+    """
+    def __init__(self, ws, on_event):
+        self.ws = ws
+        self.on_event = on_event
+        self.target_id = None
+        self.closed = threading.Event()
+        self._target_ready = threading.Event()
+        self._pending = {}  # id -> waiter, a [threading.Event, response] pair
+        self._next_id = 1
+        self._lock = threading.Lock()
+        thread = threading.Thread(target=self._run, name="trace-client")
+        thread.daemon = True
+        thread.start()
+    
+    def wait_for_target(self, timeout):
+        return self._target_ready.wait(timeout)
+    
+    def _message(self, method, params, waiter):
+        with self._lock:
+            message_id = self._next_id
+            self._next_id += 1
+            if waiter is not None:
+                self._pending[message_id] = waiter
+        message = {'id': message_id, 'method': method}
+        if params:
+            message['params'] = params
+        if self.target_id is None:
+            return message
+        with self._lock:
+            outer_id = self._next_id
+            self._next_id += 1
+            if waiter is not None:
+                # Only an error on the wrapper matters; its success says nothing about the command
+                self._pending[outer_id] = waiter
+        return {
+            'id': outer_id,
+            'method': 'Target.sendMessageToTarget',
+            'params': {'targetId': self.target_id, 'message': json.dumps(message)},
+        }
+    
+    def send(self, method, params=None):
+        """Send a command without waiting for its response (safe from on_event)"""
+        self.ws.send(json.dumps(self._message(method, params, None)))
+    
+    def call(self, method, params=None, timeout=COMMAND_TIMEOUT):
+        """Send a command and return its result; raises TraceError"""
+        waiter = [threading.Event(), None]
+        try:
+            self.ws.send(json.dumps(self._message(method, params, waiter)))
+        except WebSocketClosed as e:
+            raise TraceError(f"{method}: {e}")
+        if not waiter[0].wait(timeout):
+            raise TraceError(f"{method}: no response")
+        error = waiter[1].get('error')
+        if error:
+            raise TraceError(f"{method}: {error.get('message', error)}")
+        return waiter[1].get('result') or {}
+    
+    def _resolve(self, message, wrapper):
+        with self._lock:
+            waiter = self._pending.pop(message['id'], None)
+        # A successful Target.sendMessageToTarget only means the message was passed on
+        if waiter is not None and not (wrapper and 'error' not in message):
+            waiter[1] = message
+            waiter[0].set()
+    
+    def _handle(self, message, target_id=None):
+        if 'id' in message:
+            self._resolve(message, target_id is None and self.target_id is not None)
+            return
+        method = message.get('method')
+        params = message.get('params') or {}
+        if method == 'Target.dispatchMessageFromTarget':
+            try:
+                inner = json.loads(params.get('message', ''))
+            except ValueError:
+                return
+            if isinstance(inner, dict):
+                self._handle(inner, params.get('targetId'))
+            return
+        if method == 'Target.targetCreated':
+            info = params.get('targetInfo') or {}
+            if info.get('type', 'page') == 'page' and info.get('targetId') and self.target_id is None:
+                self.target_id = info['targetId']
+                self._target_ready.set()
+        elif method == 'Target.didCommitProvisionalTarget':
+            if params.get('newTargetId'):
+                self.target_id = params['newTargetId']
+        if method:
+            self.on_event(method, params)
+    
+    def _run(self):
+        try:
+            while True:
+                try:
+                    message = json.loads(self.ws.recv())
+                except ValueError:
+                    continue
+                if isinstance(message, dict):
+                    self._handle(message)
+        except WebSocketClosed:
+            pass
+        finally:
+            self.closed.set()
+            with self._lock:
+                waiters = list(self._pending.values())
+                self._pending.clear()
+            for waiter in waiters:
+                waiter[1] = {'error': {'message': "connection closed"}}
+                waiter[0].set()
+
+
+class TraceCapture:
+    """Everything one capture collected, with timestamps on the page's own clock (seconds)"""
+    def __init__(self, meta=None):
+        self.meta = dict(meta or {})
+        self.records = []  # Top-level Timeline records, children nested
+        self.script_events = []  # ScriptProfiler.trackingUpdate events
+        self.stack_traces = []  # ScriptProfiler samples
+        self.started = None
+        self.stopped = None
+        self.profiling = False
+        self.navigations = 0
+        self.error = None
+        self.finished = threading.Event()
+        self._recording_stopped = False
+        self._profile_complete = False
+        self._client = None
+    
+    def handle(self, method, params):
+        if method == 'Timeline.eventRecorded':
+            record = params.get('record')
+            if isinstance(record, dict):
+                self.records.append(record)
+        elif method == 'ScriptProfiler.trackingUpdate':
+            event = params.get('event')
+            if isinstance(event, dict):
+                self.script_events.append(event)
+        elif method == 'Timeline.recordingStarted':
+            if self.started is None:
+                self.started = params.get('startTime')
+        elif method == 'ScriptProfiler.trackingStart':
+            self.profiling = True
+            if self.started is None:
+                self.started = params.get('timestamp')
+        elif method == 'Timeline.recordingStopped':
+            self.stopped = params.get('endTime', self.stopped)
+            self._recording_stopped = True
+        elif method == 'ScriptProfiler.trackingComplete':
+            samples = params.get('samples') or {}
+            self.stack_traces.extend(samples.get('stackTraces') or ())
+            self._profile_complete = True
+        elif method == 'Target.didCommitProvisionalTarget' and self._client is not None:
+            # A cross-origin navigation swaps the page target; keep recording on the new one
+            self.navigations += 1
+            try:
+                self._client.send('Timeline.setInstruments', {'instruments': list(TRACE_INSTRUMENTS)})
+                self._client.send('Timeline.start', {'maxCallStackDepth': MAX_CALL_STACK_DEPTH})
+            except WebSocketClosed:
+                pass
+        if self._recording_stopped and (self._profile_complete or not self.profiling):
+            self.finished.set()
+    
+    @property
+    def origin(self):
+        """Time zero of the trace: when recording started, or the first timestamp seen"""
+        if self.started is not None:
+            return self.started
+        times = [record.get('startTime') for record in self.records]
+        times += [event.get('startTime') for event in self.script_events]
+        times += [trace.get('timestamp') for trace in self.stack_traces]
+        times = [t for t in times if isinstance(t, (int, float))]
+        return min(times) if times else 0.0
+
+
+def capture_trace(ws_url, duration=DEFAULT_TRACE_SECONDS, meta=None, connect_timeout=5.0, stop_event=None):
+    """Record a page for duration seconds (or until stop_event is set) and return a TraceCapture
+    
+    Raises OSError or WebSocketClosed if the page can't be reached and
+    TraceError if it won't record. If the page goes away part way, what was
+    captured is returned with error set.
+    """
+    capture = TraceCapture(meta)
+    ws = connect(ws_url, timeout=connect_timeout)
+    try:
+        client = InspectorClient(ws, capture.handle)
+        capture._client = client
+        client.wait_for_target(TARGET_WAIT)
+        try:
+            client.call('Timeline.enable')
+        except TraceError:
+            pass  # Older WebKit has no enable; Timeline.start is enough
+        try:
+            client.call('Timeline.setInstruments', {'instruments': list(TRACE_INSTRUMENTS)})
+            instruments = True
+        except TraceError:
+            instruments = False
+        client.call('Timeline.start', {'maxCallStackDepth': MAX_CALL_STACK_DEPTH})
+        if not instruments:
+            # Before instruments existed the profiler was started on its own
+            try:
+                client.call('ScriptProfiler.startTracking', {'includeSamples': True})
+            except TraceError:
+                pass
+        capture.meta.update(started=time.time(), duration=duration)
+        
+        deadline = time.monotonic() + duration
+        while not client.closed.is_set() and not (stop_event is not None and stop_event.is_set()):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            client.closed.wait(min(remaining, 0.25))
+        if client.closed.is_set():
+            capture.error = "page connection closed during the trace"
+            return capture
+        
+        capture.meta['duration'] = time.time() - capture.meta['started']
+        client.call('Timeline.stop')
+        if not instruments:
+            try:
+                client.call('ScriptProfiler.stopTracking')
+            except TraceError:
+                pass
+        capture.finished.wait(STOP_WAIT)
+        try:
+            client.call('Timeline.disable')
+        except TraceError:
+            pass
+    finally:
+        ws.close()
+    return capture
+
+
+def _number(value):
+    return value if isinstance(value, (int, float)) else None
+
+
+def record_name(record):
+    """Display name of a Timeline record: its type plus the most telling detail"""
+    kind = record.get('type') or 'Unknown'
+    data = record.get('data') or {}
+    if kind == 'TimerFire' and 'timerId' in data:
+        return f"TimerFire ({data['timerId']})"
+    detail = data.get('type') or data.get('url') or data.get('scriptName') or data.get('message') or ''
+    return f"{kind} ({detail})" if detail else kind
+
+
+def _walk(records, depth=0):
+    """(record, depth, self seconds or None) for each record, parents before children"""
+    for record in records:
+        start = _number(record.get('startTime'))
+        end = _number(record.get('endTime'))
+        children = [child for child in record.get('children') or () if isinstance(child, dict)]
+        self_time = None
+        if start is not None and end is not None:
+            self_time = end - start
+            for child in children:
+                child_start = _number(child.get('startTime'))
+                child_end = _number(child.get('endTime'))
+                if child_start is not None and child_end is not None:
+                    self_time -= child_end - child_start
+            self_time = max(self_time, 0.0)
+        yield record, depth, self_time
+        yield from _walk(children, depth + 1)
+
+
+def _sample_slices(stack_traces):
+    """Merge consecutive ScriptProfiler samples into (name, frame, start, end, depth) flame-chart slices"""
+    traces = sorted(
+        (trace for trace in stack_traces if _number(trace.get('timestamp')) is not None),
+        key=lambda trace: trace['timestamp']
+    )
+    slices = []
+    open_frames = []  # (key, frame, start) from the outermost call in
+    last_end = None
+    
+    def close(count, at):
+        while len(open_frames) > count:
+            key, frame, start = open_frames.pop()
+            slices.append((key[0], frame, start, at, len(open_frames)))
+    
+    for i, trace in enumerate(traces):
+        t = trace['timestamp']
+        end = traces[i + 1]['timestamp'] if i + 1 < len(traces) else t + SAMPLE_SECONDS
+        end = min(end, t + MAX_SAMPLE_GAP)
+        if last_end is not None and t > last_end:
+            close(0, last_end)
+        # Frames come innermost first
+        frames = list(reversed(trace.get('stackFrames') or ()))
+        keys = [(frame.get('name') or '(anonymous function)', frame.get('url'), frame.get('line')) for frame in frames]
+        common = 0
+        while common < len(open_frames) and common < len(keys) and open_frames[common][0] == keys[common]:
+            common += 1
+        close(common, t)
+        for key, frame in zip(keys[common:], frames[common:]):
+            open_frames.append((key, frame, t))
+        last_end = end
+    if last_end is not None:
+        close(0, last_end)
+    return slices
+
+
+def chrome_trace(capture, summary=None):
+    """The capture as a Trace Event Format document (a dict ready for json.dump)"""
+    origin = capture.origin
+    
+    def us(t):
+        return round((t - origin) * 1e6, 3)
+    
+    title = capture.meta.get('title') or capture.meta.get('url') or 'Safari page'
+    device = capture.meta.get('device')
+    events = [
+        {'ph': 'M', 'name': 'process_name', 'pid': PID, 'tid': 0,
+         'args': {'name': f"{title} ({device})" if device else title}},
+        {'ph': 'M', 'name': 'thread_name', 'pid': PID, 'tid': MAIN_TID, 'args': {'name': 'Main Thread (Timeline)'}},
+        {'ph': 'M', 'name': 'thread_name', 'pid': PID, 'tid': SCRIPT_TID, 'args': {'name': 'JavaScript'}},
+        {'ph': 'M', 'name': 'thread_name', 'pid': PID, 'tid': SAMPLES_TID, 'args': {'name': 'JavaScript samples'}},
+    ]
+    timed = []
+    for record, _, _ in _walk(capture.records):
+        start = _number(record.get('startTime'))
+        if start is None:
+            continue
+        end = _number(record.get('endTime'))
+        event = {
+            'name': record_name(record),
+            'cat': CATEGORIES.get(record.get('type'), 'other'),
+            'pid': PID,
+            'tid': MAIN_TID,
+            'ts': us(start),
+            'args': record.get('data') or {},
+        }
+        if end is None or (end <= start and not record.get('children')):
+            event.update(ph='i', s='t')
+        else:
+            event.update(ph='X', dur=round(max(end - start, 0.0) * 1e6, 3))
+        timed.append(event)
+    for script in capture.script_events:
+        start = _number(script.get('startTime'))
+        end = _number(script.get('endTime'))
+        if start is None or end is None:
+            continue
+        timed.append({
+            'name': f"Script ({script.get('type', 'Other')})", 'cat': 'script', 'ph': 'X',
+            'pid': PID, 'tid': SCRIPT_TID, 'ts': us(start), 'dur': round((end - start) * 1e6, 3),
+        })
+    for name, frame, start, end, _ in _sample_slices(capture.stack_traces):
+        args = {key: frame[key] for key in ('url', 'line', 'column') if frame.get(key) not in (None, '')}
+        timed.append({
+            'name': name, 'cat': 'samples', 'ph': 'X', 'pid': PID, 'tid': SAMPLES_TID,
+            'ts': us(start), 'dur': round((end - start) * 1e6, 3), 'args': args,
+        })
+    # Viewers need a parent before the children that start with it, so longer first on ties
+    timed.sort(key=lambda event: (event['ts'], -event.get('dur', 0)))
+    metadata = dict(capture.meta, origin=origin)
+    if summary is not None:
+        metadata['summary'] = summary
+    return {'traceEvents': events + timed, 'displayTimeUnit': 'ms', 'metadata': metadata}
+
+
+def summarize(capture):
+    """Longest tasks, long-task count and per-category totals (milliseconds) of a capture"""
+    origin = capture.origin
+    totals = dict.fromkeys(SUMMARY_CATEGORIES, 0.0)
+    counts = dict.fromkeys(SUMMARY_CATEGORIES, 0)
+    tasks = []
+    records = 0
+    for record, depth, self_time in _walk(capture.records):
+        records += 1
+        category = CATEGORIES.get(record.get('type'), 'other')
+        counts[category] += 1
+        if self_time is None:
+            continue
+        totals[category] += self_time * 1000
+        if depth == 0:
+            start = record['startTime']
+            tasks.append((record['endTime'] - start, start, record_name(record)))
+    tasks.sort(reverse=True)
+    
+    functions = {}
+    for trace in capture.stack_traces:
+        frames = trace.get('stackFrames') or ()
+        if frames:
+            frame = frames[0]
+            key = (frame.get('name') or '(anonymous function)', frame.get('url') or '', frame.get('line'))
+            functions[key] = functions.get(key, 0) + 1
+    script_time = sum(
+        event['endTime'] - event['startTime'] for event in capture.script_events
+        if _number(event.get('startTime')) is not None and _number(event.get('endTime')) is not None
+    )
+    return {
+        'duration': capture.meta.get('duration'),
+        'records': records,
+        'totals': {name: round(value, 3) for name, value in totals.items()},
+        'counts': counts,
+        'long_tasks': sum(1 for duration, _, _ in tasks if duration >= LONG_TASK_SECONDS),
+        'longest_tasks': [
+            {'name': name, 'start': round((start - origin) * 1000, 3), 'duration': round(duration * 1000, 3)}
+            for duration, start, name in tasks[:TOP_TASKS]
+        ],
+        'script_time': round(script_time * 1000, 3),
+        'samples': len(capture.stack_traces),
+        'top_functions': [
+            {'name': name, 'url': url, 'line': line, 'samples': samples}
+            for (name, url, line), samples in sorted(functions.items(), key=lambda item: -item[1])[:TOP_FUNCTIONS]
+        ],
+        'navigations': capture.navigations,
+        'error': capture.error,
+    }
+
+
+def write_trace(capture, path):
+    """Write the capture to path as Chrome trace JSON and return its summary"""
+    summary = summarize(capture)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(chrome_trace(capture, summary), f, separators=(',', ':'))
+    return summary
+
+
+def describe_summary(summary):
+    """Lines of text for a trace summary"""
+    totals = summary['totals']
+    duration = summary.get('duration')
+    lines = [
+        f"{summary['records']} timeline records"
+        + (f" in {duration:.1f} s" if duration else "")
+        + f", {summary['long_tasks']} long tasks (>= {LONG_TASK_SECONDS * 1000:.0f} ms)",
+        "Script {script:.1f} ms, layout {layout:.1f} ms ({layouts}), style {style:.1f} ms, "
+        "paint {paint:.1f} ms ({paints})".format(
+            layouts=summary['counts']['layout'], paints=summary['counts']['paint'], **totals),
+    ]
+    for task in summary['longest_tasks'][:5]:
+        lines.append(f"  {task['duration']:8.1f} ms at {task['start'] / 1000:7.3f} s  {task['name']}")
+    if summary['top_functions']:
+        lines.append(f"{summary['samples']} JavaScript samples; hottest functions:")
+        for function in summary['top_functions'][:5]:
+            where = f" ({function['url']}:{function['line']})" if function['url'] else ""
+            lines.append(f"  {function['samples']:8d}  {function['name']}{where}")
+    if summary.get('error'):
+        lines.append(f"Trace ended early: {summary['error']}")
+    return lines
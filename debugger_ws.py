@@ -0,0 +1,606 @@
+"""Minimal WebSocket client/server (only what the inspector protocol needs) and a relay that shares one page connection"""
+import base64
+import hashlib
+import json
+import os
+import queue
+import socket
+import struct
+import threading
+from urllib.parse import urlsplit
+
+DEFAULT_RELAY_PORT = 9400  # Above ios_webkit_debug_proxy's default device ports (9222-9322)
+RELAY_HEALTH_PATH = '/relay'
+RELAY_HEALTH_BODY = b'{"service": "ios-safari-debugger-relay"}'
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_HEADER_BYTES = 65536
+MAX_QUEUED_MESSAGES = 4096  # Per frontend; one that falls this far behind is disconnected
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+class WebSocketClosed(Exception):
+    """The peer closed the connection (or it dropped)"""
+
+
+def _accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode('ascii')).digest()).decode('ascii')
+
+
+def _apply_mask(data, mask_key):
+    """XOR data with the 4-byte mask, a whole message at a time rather than byte by byte"""
+    length = len(data)
+    if not length:
+        return b''
+    repeated = (mask_key * (length // 4 + 1))[:length]
+    return (int.from_bytes(data, 'big') ^ int.from_bytes(repeated, 'big')).to_bytes(length, 'big')
+
+
+def _read_headers(sock):
+    """Read an HTTP header block; returns (header lines, bytes received after it)"""
+    data = b''
+    while b'\r\n\r\n' not in data:
+        chunk = sock.recv(4096)
+        if not chunk:
+            raise WebSocketClosed("connection closed during handshake")
+        data += chunk
+        if len(data) > MAX_HEADER_BYTES:
+            raise WebSocketClosed("handshake headers too large")
+    head, rest = data.split(b'\r\n\r\n', 1)
+    return head.decode('latin-1').split('\r\n'), rest
+
+
+def _parse_headers(lines):
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+class WebSocket:
+    """A connected WebSocket; clients mask outgoing frames, servers don't"""
+    def __init__(self, sock, mask, buffered=b''):
+        self.sock = sock
+        self.mask = mask
+        self._buffer = bytearray(buffered)
+        self._send_lock = threading.Lock()
+        self.closed = False
+    
+    def _recv_exact(self, count):
+        while len(self._buffer) < count:
+            try:
+                chunk = self.sock.recv(max(65536, count - len(self._buffer)))
+            except OSError as e:
+                raise WebSocketClosed(str(e))
+            if not chunk:
+                raise WebSocketClosed("connection closed")
+            self._buffer.extend(chunk)
+        data = bytes(self._buffer[:count])
+        del self._buffer[:count]
+        return data
+    
+    def _send_frame(self, opcode, payload):
+        length = len(payload)
+        header = bytearray([0x80 | opcode])
+        mask_bit = 0x80 if self.mask else 0
+        if length < 126:
+            header.append(mask_bit | length)
+        elif length < 65536:
+            header.append(mask_bit | 126)
+            header.extend(struct.pack('!H', length))
+        else:
+            header.append(mask_bit | 127)
+            header.extend(struct.pack('!Q', length))
+        if self.mask:
+            mask_key = os.urandom(4)
+            header.extend(mask_key)
+            payload = _apply_mask(payload, mask_key)
+        with self._send_lock:
+            try:
+                self.sock.sendall(bytes(header) + payload)
+            except OSError as e:
+                self.closed = True
+                raise WebSocketClosed(str(e))
+    
+    def send(self, message):
+        """Send a text message, or a binary one when message is bytes (as recv returns them)"""
+        if isinstance(message, bytes):
+            self._send_frame(OP_BINARY, message)
+        else:
+            self._send_frame(OP_TEXT, message.encode('utf-8'))
+    
+    def recv(self):
+        """Return the next text message, answering pings along the way; raises WebSocketClosed"""
+        fragments = []
+        message_opcode = None
+        while True:
+            first, second = self._recv_exact(2)
+            fin = first & 0x80
+            opcode = first & 0x0F
+            length = second & 0x7F
+            if length == 126:
+                length = struct.unpack('!H', self._recv_exact(2))[0]
+            elif length == 127:
+                length = struct.unpack('!Q', self._recv_exact(8))[0]
+            mask_key = self._recv_exact(4) if second & 0x80 else None
+            payload = self._recv_exact(length)
+            if mask_key:
+                payload = _apply_mask(payload, mask_key)
+            
+            if opcode == OP_CLOSE:
+                self.close()
+                raise WebSocketClosed("closed by peer")
+            if opcode == OP_PING:
+                self._send_frame(OP_PONG, payload)
+                continue
+            if opcode == OP_PONG:
+                continue
+            if opcode in (OP_TEXT, OP_BINARY):
+                message_opcode = opcode
+                fragments = [payload]
+            else:
+                fragments.append(payload)
+            if fin:
+                data = b''.join(fragments)
+                if message_opcode == OP_BINARY:
+                    return data
+                return data.decode('utf-8', errors='replace')
+    
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._send_frame(OP_CLOSE, b'')
+        except WebSocketClosed:
+            pass
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def connect(url, timeout=5.0):
+    """Open a client WebSocket to a ws:// URL"""
+    parts = urlsplit(url)
+    if parts.scheme != 'ws':
+        raise ValueError(f"Unsupported WebSocket URL: {url}")
+    host = parts.hostname
+    port = parts.port or 80
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    
+    sock = socket.create_connection((host, port), timeout=timeout)
+    try:
+        key = base64.b64encode(os.urandom(16)).decode('ascii')
+        sock.sendall((
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {host}:{port}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n"
+            "\r\n"
+        ).encode('ascii'))
+        lines, rest = _read_headers(sock)
+        status = lines[0].split(' ', 2)
+        if len(status) < 2 or status[1] != '101':
+            raise WebSocketClosed(f"handshake refused: {lines[0]}")
+        if _parse_headers(lines).get('sec-websocket-accept') != _accept_key(key):
+            raise WebSocketClosed("handshake failed: bad Sec-WebSocket-Accept")
+    except Exception:
+        sock.close()
+        raise
+    sock.settimeout(None)
+    return WebSocket(sock, mask=True, buffered=rest)
+
+
+def accept(sock, head=None):
+    """Complete the server side of the handshake; returns (WebSocket, request path)
+    
+    head is the (header lines, rest) already read with _read_headers, if any.
+    """
+    lines, rest = head if head is not None else _read_headers(sock)
+    request = lines[0].split(' ')
+    headers = _parse_headers(lines)
+    key = headers.get('sec-websocket-key')
+    if len(request) < 2 or request[0] != 'GET' or not key or 'websocket' not in headers.get('upgrade', '').lower():
+        sock.sendall(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        raise WebSocketClosed("not a WebSocket request")
+    sock.sendall((
+        "HTTP/1.1 101 Switching Protocols\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Accept: {_accept_key(key)}\r\n"
+        "\r\n"
+    ).encode('ascii'))
+    return WebSocket(sock, mask=False, buffered=rest), request[1]
+
+
+class QueuedSender:
+    """A server-side WebSocket whose sends are queued and written by its own thread
+    
+    A frontend that stops reading only holds up its own writer; once
+    MAX_QUEUED_MESSAGES are waiting it is disconnected.
+    """
+    def __init__(self, ws, max_queued=MAX_QUEUED_MESSAGES):
+        self.ws = ws
+        self.closed = False
+        self._queue = queue.Queue(max_queued)
+        thread = threading.Thread(target=self._write, name="relay-send")
+        thread.daemon = True
+        thread.start()
+    
+    def send(self, message):
+        if self.closed:
+            raise WebSocketClosed("closed")
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self.abort()
+            raise WebSocketClosed("send queue overflowed")
+    
+    def recv(self):
+        return self.ws.recv()
+    
+    def close(self):
+        """Close once everything queued has been sent"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            self.abort()
+    
+    def abort(self):
+        """Drop the connection now, even if the writer is stuck in a send to a peer that stopped reading"""
+        self.closed = True
+        try:
+            self.ws.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+    
+    def _write(self):
+        try:
+            while True:
+                message = self._queue.get()
+                if message is None:
+                    break
+                self.ws.send(message)
+        except WebSocketClosed:
+            pass
+        finally:
+            self.closed = True
+            self.ws.close()
+
+
+class PageChannel:
+    """One upstream connection to a page, shared by any number of frontends
+    
+    Request IDs (including those inside Target.sendMessageToTarget) are
+    rewritten to be unique upstream, so each response goes back only to the
+    frontend that asked, with its own ID restored. Events go to everyone.
+    The page only announces its targets once per connection, so the live
+    Target.targetCreated events are kept and replayed to frontends that join
+    later.
+    """
+    def __init__(self, key, upstream, on_empty):
+        self.key = key
+        self.upstream = upstream
+        self.on_empty = on_empty
+        self.clients = set()
+        self.messages_up = 0
+        self.messages_down = 0
+        self._pending = {}  # upstream id -> (client, original id)
+        self._pending_inner = {}  # upstream inner id -> (client, original inner id)
+        self._targets = {}  # targetId -> raw Target.targetCreated event
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self.closed = False
+        thread = threading.Thread(target=self._read_upstream, name=f"relay-{key}")
+        thread.daemon = True
+        thread.start()
+    
+    def add(self, client):
+        with self._lock:
+            if self.closed:
+                return False
+            self.clients.add(client)
+            announcements = list(self._targets.values())
+        for raw in announcements:
+            try:
+                client.send(raw)
+            except WebSocketClosed:
+                break
+        return True
+    
+    def remove(self, client):
+        with self._lock:
+            self.clients.discard(client)
+            empty = not self.clients
+        if empty:
+            self.close()
+    
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            clients = list(self.clients)
+            self.clients.clear()
+        self.upstream.close()
+        for client in clients:
+            client.close()
+        self.on_empty(self)
+    
+    def _rewrite_id(self, message, pending, client):
+        with self._lock:
+            upstream_id = self._next_id
+            self._next_id += 1
+            pending[upstream_id] = (client, message['id'])
+        message['id'] = upstream_id
+    
+    def send_from(self, client, raw):
+        """Forward a frontend message upstream; binary frames are passed through untouched"""
+        if isinstance(raw, bytes):
+            self.messages_up += 1
+            self.upstream.send(raw)
+            return
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            message = None
+        if isinstance(message, dict) and 'id' in message:
+            self._rewrite_id(message, self._pending, client)
+            params = message.get('params')
+            if message.get('method') == 'Target.sendMessageToTarget' and isinstance(params, dict):
+                try:
+                    inner = json.loads(params.get('message', ''))
+                except ValueError:
+                    inner = None
+                if isinstance(inner, dict) and 'id' in inner:
+                    self._rewrite_id(inner, self._pending_inner, client)
+                    params['message'] = json.dumps(inner)
+            raw = json.dumps(message)
+        self.messages_up += 1
+        self.upstream.send(raw)
+    
+    def _route(self, raw):
+        """Return (client or None for everyone, message to deliver)"""
+        if isinstance(raw, bytes):
+            return None, raw
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            return None, raw
+        if not isinstance(message, dict):
+            return None, raw
+        if 'id' in message:
+            with self._lock:
+                owner = self._pending.pop(message['id'], None)
+            if owner is None:
+                return False, raw
+            message['id'] = owner[1]
+            return owner[0], json.dumps(message)
+        params = message.get('params')
+        if message.get('method') == 'Target.dispatchMessageFromTarget' and isinstance(params, dict):
+            try:
+                inner = json.loads(params.get('message', ''))
+            except ValueError:
+                inner = None
+            if isinstance(inner, dict) and 'id' in inner:
+                with self._lock:
+                    owner = self._pending_inner.pop(inner['id'], None)
+                if owner is None:
+                    return False, raw
+                inner['id'] = owner[1]
+                params['message'] = json.dumps(inner)
+                return owner[0], json.dumps(message)
+        if isinstance(params, dict):
+            self._track_target(message.get('method'), params, raw)
+        return None, raw
+    
+    def _track_target(self, method, params, raw):
+        with self._lock:
+            if method == 'Target.targetCreated':
+                target_id = (params.get('targetInfo') or {}).get('targetId')
+                if target_id:
+                    self._targets[target_id] = raw
+            elif method == 'Target.targetDestroyed':
+                self._targets.pop(params.get('targetId'), None)
+            elif method == 'Target.didCommitProvisionalTarget':
+                self._targets.pop(params.get('oldTargetId'), None)
+    
+    def _read_upstream(self):
+        try:
+            while True:
+                raw = self.upstream.recv()
+                self.messages_down += 1
+                client, message = self._route(raw)
+                if client is False:
+                    continue  # Response for a frontend that has gone away
+                if client is not None:
+                    targets = [client]
+                else:
+                    with self._lock:
+                        targets = list(self.clients)
+                for target in targets:
+                    try:
+                        target.send(message)
+                    except WebSocketClosed:
+                        pass
+        except WebSocketClosed:
+            pass
+        finally:
+            self.close()
+
+
+def relay_alive(host, port, timeout=0.5):
+    """True if what listens on host:port is a relay, not just any open port (such as a device's)"""
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            sock.sendall(f"GET {RELAY_HEALTH_PATH} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+                         f"Connection: close\r\n\r\n".encode('ascii'))
+            data = b''
+            while len(data) < MAX_HEADER_BYTES:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+    except OSError:
+        return False
+    return data.startswith(b'HTTP/1.1 200') and data.endswith(RELAY_HEALTH_BODY)
+
+
+def relay_ws_host(listen_host, port, device_port):
+    """What to put in the inspector's ws= parameter to reach a device through the relay"""
+    host = 'localhost' if listen_host in ('', '0.0.0.0', '127.0.0.1') else listen_host
+    return f"{host}:{port}/{device_port}"
+
+
+class WebSocketRelay:
+    """Local relay serving ws://<listen_host>:<port>/<device port>/devtools/page/<id>
+    
+    All frontends attached to the same device page share one upstream
+    connection to the proxy on upstream_host. allowed_ports() returns the
+    device ports frontends may reach; a request for any other port is closed,
+    so the relay can't be used to reach arbitrary ports on upstream_host.
+    """
+    def __init__(self, upstream_host, listen_host='127.0.0.1', port=DEFAULT_RELAY_PORT, connect_timeout=5.0,
+                 allowed_ports=tuple):
+        self.upstream_host = upstream_host
+        self.allowed_ports = allowed_ports
+        self.listen_host = listen_host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.channels = {}  # (device port, page id) -> PageChannel
+        self._lock = threading.Lock()
+        self._server = None
+    
+    @property
+    def running(self):
+        return self._server is not None
+    
+    def ws_host(self, device_port):
+        return relay_ws_host(self.listen_host, self.port, device_port)
+    
+    def start(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((self.listen_host, self.port))
+        server.listen(16)
+        self.port = server.getsockname()[1]
+        self._server = server
+        thread = threading.Thread(target=self._accept_loop, args=(server,), name="relay-accept")
+        thread.daemon = True
+        thread.start()
+    
+    def stop(self):
+        server, self._server = self._server, None
+        if server is not None:
+            server.close()
+        with self._lock:
+            channels = list(self.channels.values())
+        for channel in channels:
+            channel.close()
+    
+    def _accept_loop(self, server):
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            thread = threading.Thread(target=self._handle, args=(conn,), name="relay-client")
+            thread.daemon = True
+            thread.start()
+    
+    def _channel(self, device_port, page_id):
+        key = (device_port, page_id)
+        with self._lock:
+            channel = self.channels.get(key)
+            if channel is not None and not channel.closed:
+                return channel
+        # Connect outside the lock so an unreachable page doesn't hold up every other frontend
+        upstream = connect(
+            f"ws://{self.upstream_host}:{device_port}/devtools/page/{page_id}", timeout=self.connect_timeout
+        )
+        with self._lock:
+            channel = self.channels.get(key)
+            if channel is not None and not channel.closed:
+                # Another frontend for the same page connected meanwhile; share its connection
+                upstream.close()
+                return channel
+            channel = PageChannel(key, upstream, self._forget)
+            self.channels[key] = channel
+            return channel
+    
+    def _forget(self, channel):
+        with self._lock:
+            if self.channels.get(channel.key) is channel:
+                del self.channels[channel.key]
+    
+    def _handle(self, conn):
+        try:
+            head = _read_headers(conn)
+            request = head[0][0].split(' ')
+            if len(request) >= 2 and request[0] == 'GET' and request[1] == RELAY_HEALTH_PATH:
+                # Lets other processes tell this relay apart from any listener on the port
+                conn.sendall((
+                    "HTTP/1.1 200 OK\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(RELAY_HEALTH_BODY)}\r\n"
+                    "Connection: close\r\n"
+                    "\r\n"
+                ).encode('ascii') + RELAY_HEALTH_BODY)
+                conn.close()
+                return
+            ws, path = accept(conn, head)
+        except (WebSocketClosed, OSError):
+            conn.close()
+            return
+        
+        # /<device port>/devtools/page/<id>
+        parts = path.split('?', 1)[0].strip('/').split('/')
+        if (len(parts) != 4 or parts[1:3] != ['devtools', 'page'] or not parts[0].isdigit()
+                or int(parts[0]) not in self.allowed_ports()):
+            ws.close()
+            return
+        
+        client = QueuedSender(ws)
+        channel = None
+        try:
+            channel = self._channel(int(parts[0]), parts[3])
+            if not channel.add(client):
+                client.close()
+                return
+            while True:
+                channel.send_from(client, client.recv())
+        except (WebSocketClosed, OSError):
+            pass
+        finally:
+            if channel is not None:
+                channel.remove(client)
+            client.close()
+    
+    def stats(self):
+        with self._lock:
+            channels = list(self.channels.values())
+        return {
+            'pages': len(channels),
+            'frontends': sum(len(channel.clients) for channel in channels),
+            'messages_up': sum(channel.messages_up for channel in channels),
+            'messages_down': sum(channel.messages_down for channel in channels),
+        }
@@ -1,19 +1,44 @@
 import os
 import sys
-import subprocess
-import webbrowser
-import json
+
+if __name__ == "__main__" and len(sys.argv) > 1:
+    # Any arguments select the command line interface; dispatched before
+    # tkinter is imported so it also runs on hosts without Tk
+    import debugger_cli
+    sys.exit(debugger_cli.main())
+
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
-import requests
-import platform
+from tkinter import ttk, filedialog, messagebox, simpledialog
 import threading
-import configparser
 import time
-import re
-from bs4 import BeautifulSoup
-import shutil
-import tempfile
+
+from debugger_core import (
+    OUTPUT_FLUSH_INTERVAL_MS,
+    CONSOLE_LOG_FILE,
+    ConsoleBuffer,
+    DebuggerEngine,
+    PageIndex,
+    PageSearchIndex,
+    Settings,
+    WebKitSetup,
+    warm_up,
+)
+from debugger_metrics import REGISTRY, Histogram
+
+UI_REFRESH_SECONDS = REGISTRY.histogram(
+    'ios_debugger_ui_refresh_seconds', "Refresh Pages click to the new page list being shown")
+UI_PAGE_UPDATE_SECONDS = REGISTRY.histogram(
+    'ios_debugger_ui_page_update_seconds', "Applying a page list to the window, by source (refresh, watcher)",
+    ('source',))
+UI_OUTPUT_FLUSH_SECONDS = REGISTRY.histogram(
+    'ios_debugger_ui_output_flush_seconds', "Moving queued server output to the console, per monitor tick")
+UI_START_SECONDS = REGISTRY.histogram(
+    'ios_debugger_ui_start_debugging_seconds', "Time the Tk thread spends starting the debugging server")
+UI_LOOP_LAG_SECONDS = REGISTRY.histogram(
+    'ios_debugger_ui_loop_lag_seconds', "How late Tk timer callbacks run, a measure of a busy window",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+LOOP_LAG_PROBE_MS = 250
+DIAGNOSTICS_REFRESH_MS = 1000
 
 class IOSSafariDebuggerApp:
     def __init__(self, root):
@@ -23,40 +48,57 @@ class IOSSafariDebuggerApp:
         self.root.minsize(700, 500)
         
         # Configuration
-        self.config_file = os.path.join(os.path.expanduser("~"), ".ios_safari_debugger.ini")
-        self.config = configparser.ConfigParser()
+        self.settings = Settings()
         
         # Variables
         self.webkit_path = tk.StringVar()
-        self.pages_list = []
-        self.page_ids = []  # Store actual page IDs
-        self.debugging_process = None
-        self.monitoring_thread = None
+        self.pages = PageIndex()  # Inspectable pages, keyed by treeview item ID
+        self.page_search = PageSearchIndex()  # Filter box index over self.pages
+        self.page_devices = []  # Devices from the last refresh, in device list order
+        self.shown_pages = set()  # Keys of the page rows currently in the treeview
+        self.filter_text = tk.StringVar()
+        self.session_name = tk.StringVar()  # Saved session picked in the session box
+        self.filter_scheduled = False
+        self.supervisor = None  # ServerSupervisor for the running debugging server
+        self.trace_stop = None  # Set to end the running performance trace early
         self.stop_monitoring = False
-        self.repository_url = "https://github.com/google/ios-webkit-debug-proxy"  # Default repository URL
+        self.refresh_in_progress = False
+        self.console_flush_scheduled = False
+        self.refresh_started = None
+        self.diagnostics_window = None
         
         # Load saved configuration
         self.load_config()
         
+        # Console backlog, bounded in memory and kept on disk unless turned off
+        log_file = (self.settings.console_log_file or CONSOLE_LOG_FILE) if self.settings.console_log_enabled else None
+        try:
+            self.console = ConsoleBuffer(self.settings.console_max_lines, log_file)
+        except OSError:
+            self.console = ConsoleBuffer(self.settings.console_max_lines)
+        
+        # Server control and page discovery for every device behind the debugging proxy
+        self.engine = DebuggerEngine(self.settings)
+        self.device_manager = self.engine.device_manager
+        self.page_watcher = self.engine.watcher(
+            lambda result: self.root.after(0, lambda: self._apply_page_results(result, from_watcher=True))
+        )
+        
         # Create UI
         self.create_ui()
         
+        # Metrics endpoint, environment checks and event loop probe, once the window is up
+        self.root.after_idle(self._start_metrics)
+        self.root.after_idle(self._run_preflight)
+        self.root.after(LOOP_LAG_PROBE_MS, self._probe_loop_lag, time.perf_counter())
+        
     def load_config(self):
-        if os.path.exists(self.config_file):
-            self.config.read(self.config_file)
-            if 'Settings' in self.config:
-                if 'webkit_path' in self.config['Settings']:
-                    self.webkit_path.set(self.config['Settings']['webkit_path'])
-                if 'repository_url' in self.config['Settings']:
-                    self.repository_url = self.config['Settings']['repository_url']
-        else:
-            self.config['Settings'] = {}
+        self.settings.load()
+        self.webkit_path.set(self.settings.webkit_path)
     
     def save_config(self):
-        self.config['Settings']['webkit_path'] = self.webkit_path.get()
-        self.config['Settings']['repository_url'] = self.repository_url
-        with open(self.config_file, 'w') as f:
-            self.config.write(f)
+        self.settings.webkit_path = self.webkit_path.get()
+        self.settings.save()
     
     def create_ui(self):
         # Main frame
@@ -92,20 +134,33 @@ class IOSSafariDebuggerApp:
         self.refresh_button = ttk.Button(buttons_frame, text="Refresh Pages", command=self.refresh_pages, state=tk.DISABLED)
         self.refresh_button.pack(side=tk.LEFT, padx=5)
         
+        ttk.Button(buttons_frame, text="Diagnostics", command=self.show_diagnostics).pack(side=tk.RIGHT, padx=5)
+        
         # Pages Section
         pages_frame = ttk.LabelFrame(main_frame, text="Inspectable Pages", padding="10")
         pages_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
-        # Create Treeview for pages
+        # Filter box; only matching pages are put in the treeview
+        filter_frame = ttk.Frame(pages_frame)
+        filter_frame.grid(column=0, row=0, columnspan=2, sticky='ew', pady=(0, 5))
+        ttk.Label(filter_frame, text="Filter:").pack(side=tk.LEFT)
+        ttk.Entry(filter_frame, textvariable=self.filter_text).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.filter_label = ttk.Label(filter_frame, text="")
+        self.filter_label.pack(side=tk.LEFT)
+        self.filter_text.trace_add('write', lambda *args: self._schedule_filter())
+        
+        # Create Treeview for pages, grouped under one node per device
         columns = ('page_id', 'title', 'url')
-        self.pages_tree = ttk.Treeview(pages_frame, columns=columns, show='headings')
+        self.pages_tree = ttk.Treeview(pages_frame, columns=columns, show='tree headings')
         
         # Define headings
+        self.pages_tree.heading('#0', text='Device')
         self.pages_tree.heading('page_id', text='ID')
         self.pages_tree.heading('title', text='Title')
         self.pages_tree.heading('url', text='URL')
         
         # Column widths
+        self.pages_tree.column('#0', width=160)
         self.pages_tree.column('page_id', width=50)
         self.pages_tree.column('title', width=150)
         self.pages_tree.column('url', width=400)
@@ -116,17 +171,36 @@ class IOSSafariDebuggerApp:
         self.pages_tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
         
         # Grid layout for treeview and scrollbars
-        self.pages_tree.grid(column=0, row=0, sticky='nsew')
-        vsb.grid(column=1, row=0, sticky='ns')
-        hsb.grid(column=0, row=1, sticky='ew')
+        self.pages_tree.grid(column=0, row=1, sticky='nsew')
+        vsb.grid(column=1, row=1, sticky='ns')
+        hsb.grid(column=0, row=2, sticky='ew')
         
         # Configure grid weights
         pages_frame.grid_columnconfigure(0, weight=1)
-        pages_frame.grid_rowconfigure(0, weight=1)
-        
-        # Open button
-        open_button = ttk.Button(pages_frame, text="Open Debugger", command=self.open_debugger)
-        open_button.grid(column=0, row=2, sticky='e', padx=5, pady=5)
+        pages_frame.grid_rowconfigure(1, weight=1)
+        
+        # Saved sessions: named sets of pages reopened whenever they reappear
+        session_frame = ttk.Frame(pages_frame)
+        session_frame.grid(column=0, row=3, sticky='w', pady=5)
+        ttk.Label(session_frame, text="Session:").pack(side=tk.LEFT)
+        self.session_box = ttk.Combobox(session_frame, textvariable=self.session_name, width=18,
+                                        postcommand=self._load_session_names)
+        self.session_box.pack(side=tk.LEFT, padx=5)
+        ttk.Button(session_frame, text="Save", command=self.save_session).pack(side=tk.LEFT)
+        self.attach_button = ttk.Button(session_frame, text="Attach", command=self.toggle_session)
+        self.attach_button.pack(side=tk.LEFT, padx=5)
+        self.session_name.trace_add('write', lambda *args: self._update_attach_button())
+        
+        # Page actions
+        actions_frame = ttk.Frame(pages_frame)
+        actions_frame.grid(column=0, row=3, sticky='e', pady=5)
+        self.record_button = ttk.Button(actions_frame, text="Record Page", command=self.toggle_recording)
+        self.record_button.pack(side=tk.LEFT, padx=5)
+        self.trace_button = ttk.Button(actions_frame, text="Record Trace", command=self.toggle_trace)
+        self.trace_button.pack(side=tk.LEFT, padx=5)
+        open_button = ttk.Button(actions_frame, text="Open Selected", command=self.open_debugger)
+        open_button.pack(side=tk.LEFT, padx=5)
+        self.pages_tree.bind('<<TreeviewSelect>>', lambda event: self._update_record_button())
         
         # Console output
         console_frame = ttk.LabelFrame(main_frame, text="Console Output", padding="10")
@@ -141,8 +215,8 @@ class IOSSafariDebuggerApp:
         self.console_text.config(yscrollcommand=console_scroll.set)
         self.console_text.config(state=tk.DISABLED)
         
-        # Add event binding for double click on page
-        self.pages_tree.bind("<Double-1>", lambda e: self.open_debugger())
+        # Add event binding for double click on page; a device row only expands or collapses
+        self.pages_tree.bind("<Double-1>", lambda e: self.open_debugger(expand_devices=False))
     
     def auto_setup_webkit(self):
         """Automatically clone the repository and set up WebKit folder"""
@@ -177,94 +251,11 @@ class IOSSafariDebuggerApp:
             self.log_message(message)
         
         def setup_thread():
-            temp_dir = None
             try:
-                update_log("Cloning repository...")
-                # Make a temp directory for cloning
-                temp_dir = tempfile.mkdtemp()
-                
-                # Clone the specified repository
-                clone_cmd = ["git", "clone", "https://github.com/HimbeersaftLP/ios-safari-remote-debug-kit", temp_dir]
-                update_log("Using git to clone repository...")
-                process = subprocess.Popen(
-                    clone_cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    universal_newlines=True
-                )
-                while True:
-                    output = process.stdout.readline()
-                    if output == '' and process.poll() is not None:
-                        break
-                    if output:
-                        update_log(output.strip())
-                
-                if process.returncode != 0:
-                    raise Exception("Git clone failed")
-                
-                # After cloning, generate WebKit files
-                update_log("Generating WebKit files...")
-                
-                # Path to the cloned repository's src directory
-                cloned_src_dir = os.path.join(temp_dir, "src")
-                
-                # Determine which script to run
-                generate_cmd = None
-                if platform.system() == "Windows":
-                    generate_script = os.path.join(cloned_src_dir, "generate.ps1")
-                    if not os.path.exists(generate_script):
-                        raise Exception(f"Generate script not found: {generate_script}")
-                    generate_cmd = ["powershell", "-ExecutionPolicy", "Bypass", "-File", "generate.ps1"]
-                else:  # Linux/macOS
-                    generate_script = os.path.join(cloned_src_dir, "generate.sh")
-                    if not os.path.exists(generate_script):
-                        raise Exception(f"Generate script not found: {generate_script}")
-                    generate_cmd = ["bash", "generate.sh"]
-                
-                # Run generate script from the cloned src directory
-                process = subprocess.Popen(
-                    generate_cmd,
-                    cwd=cloned_src_dir,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    universal_newlines=True
-                )
-                
-                while True:
-                    output = process.stdout.readline()
-                    if output == '' and process.poll() is not None:
-                        break
-                    if output:
-                        update_log(output.strip())
-                
-                if process.returncode != 0:
-                    raise Exception("Generate script failed")
-                
-                # Create target/src directory
-                target_src_dir = os.path.join(target_dir, "src")
-                os.makedirs(target_src_dir, exist_ok=True)
-                
-                # Copy ALL contents from cloned_src_dir to target_src_dir
-                update_log("Copying repository files to target/src...")
-                for item in os.listdir(cloned_src_dir):
-                    src_item = os.path.join(cloned_src_dir, item)
-                    dest_item = os.path.join(target_src_dir, item)
-                    
-                    if os.path.exists(dest_item):
-                        if os.path.isdir(dest_item):
-                            shutil.rmtree(dest_item)
-                        else:
-                            os.remove(dest_item)
-                    
-                    if os.path.isdir(src_item):
-                        shutil.copytree(src_item, dest_item)
-                    else:
-                        shutil.copy2(src_item, dest_item)
-                        if item.endswith(".sh"):
-                            os.chmod(dest_item, 0o755)
+                target_src_dir = WebKitSetup(target_dir, update_log).run()
                 
                 # Set configuration to point to the src directory (not WebKit subfolder)
-                self.webkit_path.set(target_src_dir)  # Changed here
+                self.webkit_path.set(target_src_dir)
                 self.save_config()
                 update_log("Setup completed successfully! Using src directory as root.")
             
@@ -272,29 +263,12 @@ class IOSSafariDebuggerApp:
                 update_log(f"Error during setup: {str(e)}")
                 messagebox.showerror("Setup Error", f"Failed to set up WebKit: {str(e)}")
             finally:
-                if temp_dir and os.path.exists(temp_dir):
-                    try:
-                        shutil.rmtree(temp_dir)
-                    except:
-                        pass
-                
                 self.root.after(0, progress_window.destroy)
         
         setup_thread = threading.Thread(target=setup_thread)
         setup_thread.daemon = True
         setup_thread.start()
     
-    def _check_command_exists(self, command):
-        """Check if a command exists in the system path"""
-        try:
-            if platform.system() == "Windows":
-                subprocess.check_call(["where", command], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            else:
-                subprocess.check_call(["which", command], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            return True
-        except:
-            return False
-    
     def browse_webkit_path(self):
         path = filedialog.askdirectory(title="Select WebKit Folder")
         if path:
@@ -302,8 +276,25 @@ class IOSSafariDebuggerApp:
             self.save_config()
     
     def log_message(self, message):
+        """Queue a message for the console; inserts are batched into one per idle cycle"""
+        self.console.append(message)
+        if not self.console_flush_scheduled:
+            self.console_flush_scheduled = True
+            self.root.after_idle(self._flush_console)
+    
+    def _flush_console(self):
+        self.console_flush_scheduled = False
+        lines = self.console.take_pending()
+        if not lines:
+            return
+        
         self.console_text.config(state=tk.NORMAL)
-        self.console_text.insert(tk.END, f"{message}\n")
+        self.console_text.insert(tk.END, "\n".join(lines) + "\n")
+        # Trim the oldest lines so the widget never holds more than the ring buffer
+        line_count = int(self.console_text.index('end-1c').split('.')[0]) - 1
+        excess = line_count - self.console.max_lines
+        if excess > 0:
+            self.console_text.delete('1.0', f'{excess + 1}.0')
         self.console_text.see(tk.END)
         self.console_text.config(state=tk.DISABLED)
     
@@ -316,177 +307,600 @@ class IOSSafariDebuggerApp:
         
         self.save_config()
         
-        # Determine which script to run based on platform
-        script_path = None
-        if platform.system() == "Windows":
-            script_path = os.path.join(webkit_path, "start.ps1")
-            cmd = ["powershell", "-ExecutionPolicy", "Bypass", "-File", script_path]
-        else:  # Assume Linux/macOS
-            script_path = os.path.join(webkit_path, "start.sh")
-            cmd = ["bash", script_path]
-        
-        if not os.path.exists(script_path):
-            messagebox.showerror("Error", f"Script not found: {script_path}")
+        # Tools, ports and the WebKit folder are checked before anything is spawned; probing
+        # tool versions can take seconds, so it runs off the Tk thread and Start continues after
+        self.start_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Checking tools and ports...")
+        
+        def run():
+            try:
+                report = self.engine.preflight(webkit_path)
+            except Exception as e:
+                error = str(e)
+                self.root.after(0, lambda: self._start_failed(f"Preflight checks failed to run: {error}"))
+                return
+            self.root.after(0, lambda: self._start_after_preflight(webkit_path, report))
+        
+        threading.Thread(target=run, name="preflight", daemon=True).start()
+    
+    def _start_failed(self, message):
+        self.log_message(message)
+        self.status_label.config(text="Not running")
+        self.start_button.config(state=tk.NORMAL)
+    
+    @UI_START_SECONDS.time()
+    def _start_after_preflight(self, webkit_path, report):
+        """Second half of start_debugging, on the Tk thread once the preflight report is in"""
+        for check in report.warnings:
+            self.log_message(f"Preflight warning: {check.detail}")
+        if not report.ok:
+            for check in report.errors:
+                self.log_message(f"Preflight error: {check.detail}")
+            self._start_failed("Debugging server not started")
+            messagebox.showerror("Preflight Failed", "\n".join(check.detail for check in report.errors))
             return
         
         try:
-            self.log_message(f"Starting debugging server with: {' '.join(cmd)}")
-            self.log_message("Please ensure your iOS device is unlocked and connected.")
-            
-            # Start the process
-            self.debugging_process = subprocess.Popen(
-                cmd, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.STDOUT,
-                universal_newlines=True,
-                cwd=webkit_path
+            # Start the process under a supervisor that probes readiness and restarts it on crash
+            self.supervisor = self.engine.start_server(
+                lambda supervisor, kind, info: self.root.after(
+                    0, lambda: self._on_server_event(supervisor, kind, info)
+                ),
+                webkit_path,
+                report
             )
+            self.log_message(f"Starting debugging server with: {' '.join(self.supervisor.cmd)}")
+            if self.engine.frontend is not None:
+                self.log_message(f"Serving inspector frontend from {self.engine.frontend.root}")
+            self.log_message("Please ensure your iOS device is unlocked and connected.")
             
             # Update UI
-            self.status_label.config(text="Server is running")
+            self.status_label.config(text="Server is starting...")
             self.start_button.config(state=tk.DISABLED)
             self.stop_button.config(state=tk.NORMAL)
             self.refresh_button.config(state=tk.NORMAL)
             
-            # Start monitoring thread
+            # Start flushing server output to the console
             self.stop_monitoring = False
-            self.monitoring_thread = threading.Thread(target=self.monitor_process)
-            self.monitoring_thread.daemon = True
-            self.monitoring_thread.start()
-            
-            # Wait a bit for the server to start
-            self.root.after(3000, self.refresh_pages)
+            self.root.after(OUTPUT_FLUSH_INTERVAL_MS, self.monitor_process)
             
         except Exception as e:
-            self.log_message(f"Error starting debugging server: {str(e)}")
+            self._start_failed(f"Error starting debugging server: {str(e)}")
             messagebox.showerror("Error", f"Failed to start debugging server: {str(e)}")
     
+    def _on_server_event(self, supervisor, kind, info):
+        """Reflect ServerSupervisor events in the UI (runs on the Tk thread)"""
+        if supervisor is not self.supervisor:
+            return
+        restarts = info.get('restarts', supervisor.restart_count)
+        
+        if kind == 'ready':
+            self.status_label.config(
+                text=f"Server is running (ready in {info['time_to_ready']:.1f} s, restarts: {restarts})"
+            )
+            self.log_message(f"Debugging server ready in {info['time_to_ready']:.2f} s")
+            # Watch for pages as soon as the server answers
+            self.page_watcher.start()
+        elif kind == 'not_ready':
+            self.status_label.config(text="Server is running (not responding)")
+            self.log_message(f"Debugging server did not open its ports within {info['timeout']:.0f} s")
+            self.page_watcher.start()
+        elif kind == 'exited':
+            self.status_label.config(text=f"Server crashed, restarting in {info['delay']:.1f} s...")
+            self.log_message(
+                f"Debugging server exited with code {info['code']} after {info['uptime']:.1f} s, "
+                f"restarting in {info['delay']:.1f} s"
+            )
+        elif kind == 'started' and restarts:
+            self.status_label.config(text=f"Server is restarting (restart {restarts})...")
+        elif kind == 'failed':
+            self._flush_process_output()
+            if 'error' in info:
+                self.log_message(f"Could not restart debugging server: {info['error']}")
+            else:
+                self.log_message(f"Debugging server has stopped (gave up after {restarts} restarts)")
+            self.supervisor = None
+            self.engine.supervisor = None
+            self.reset_ui()
+    
+    def _flush_process_output(self):
+        if self.supervisor is None:
+            return
+        lines, dropped = self.supervisor.output.drain()
+        if dropped:
+            self.log_message(f"... {dropped} lines of server output dropped ...")
+        if lines:
+            self.log_message("\n".join(line.strip() for line in lines))
+    
     def monitor_process(self):
-        while self.debugging_process and not self.stop_monitoring:
-            output = self.debugging_process.stdout.readline()
-            if output:
-                # Schedule UI update from the main thread
-                self.root.after(0, lambda msg=output: self.log_message(msg.strip()))
-            
-            # Check if process has terminated
-            if self.debugging_process.poll() is not None:
-                if not self.stop_monitoring:  # Only log if not manually stopped
-                    self.root.after(0, lambda: self.log_message("Debugging server has stopped"))
-                    self.root.after(0, self.reset_ui)
-                break
-            
-            time.sleep(0.1)
+        """Flush queued server output to the console once per frame (runs on the Tk thread)"""
+        if not self.supervisor or self.stop_monitoring:
+            return
+        with UI_OUTPUT_FLUSH_SECONDS.time():
+            self._flush_process_output()
+        self.root.after(OUTPUT_FLUSH_INTERVAL_MS, self.monitor_process)
     
     def reset_ui(self):
+        self.page_watcher.stop()
         self.status_label.config(text="Not running")
         self.start_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
         self.refresh_button.config(state=tk.DISABLED)
         self.pages_tree.delete(*self.pages_tree.get_children())
+        self.pages = PageIndex()
+        self.page_search = PageSearchIndex()
+        self.page_devices = []
+        self.shown_pages = set()
+        self._update_filter_label()
     
     def stop_debugging(self):
-        if self.debugging_process:
+        if self.supervisor:
             self.stop_monitoring = True
+            self.page_watcher.stop()
             self.log_message("Stopping debugging server...")
             
-            # Kill the process
-            if platform.system() == "Windows":
-                subprocess.run(["taskkill", "/F", "/T", "/PID", str(self.debugging_process.pid)])
-            else:
-                self.debugging_process.terminate()
-                try:
-                    self.debugging_process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    self.debugging_process.kill()
+            # Kill the process (and its process group)
+            self.engine.stop_server()
             
-            self.debugging_process = None
+            self.supervisor = None
             self.reset_ui()
     
-    def extract_page_ids_from_html(self, html_content):
-        """Extract page IDs from the HTML content of localhost:9222/"""
-        page_ids = []
-        
+    def refresh_pages(self):
+        """Start a background fetch of the page list; results are applied on the main thread"""
+        if self.refresh_in_progress:
+            return
+        self.refresh_in_progress = True
+        self.refresh_started = time.perf_counter()
+        self.device_manager.fetch_async(
+            lambda result: self.root.after(0, lambda: self._apply_page_results(result))
+        )
+    
+    def _apply_page_results(self, result, from_watcher=False):
+        started = time.perf_counter()
+        if not from_watcher:
+            self.refresh_in_progress = False
+        elif not self.supervisor:
+            # Late notification after the server was stopped
+            return
         try:
-            soup = BeautifulSoup(html_content, 'html.parser')
-            list_items = soup.find_all('li')
+            if result.connection_failed:
+                self._update_pages_tree([])
+                self.log_message("Could not connect to debugging server. Make sure it's running.")
+                return
             
-            for item in list_items:
-                # Extract the value attribute which contains the page ID
-                if 'value' in item.attrs:
-                    page_ids.append(item['value'])
+            for device, device_result in result.device_results:
+                if device_result.html_page_ids is not None:
+                    self.log_message(f"{device.label}: found page IDs: {', '.join(device_result.html_page_ids)}")
+                elif device_result.html_error:
+                    self.log_message(f"{device.label}: error getting HTML listing: {device_result.html_error}")
+                
+                if device_result.pages is not None:
+                    continue
+                if device_result.connection_failed:
+                    self.log_message(f"{device.label}: could not connect on port {device.port}")
+                else:
+                    self.log_message(f"{device.label}: failed to get JSON data, {device_result.json_error}")
             
-            self.log_message(f"Found page IDs: {', '.join(page_ids)}")
-            return page_ids
+            self._update_pages_tree(result.entries(), [device for device, _ in result.device_results])
+            self.log_message(f"Found {len(self.pages)} inspectable pages on {len(result.device_results)} device(s)")
+            self._sync_sessions(result)
+        
         except Exception as e:
-            self.log_message(f"Error parsing HTML: {str(e)}")
-            return []
+            self.log_message(f"Error refreshing pages: {str(e)}")
+        finally:
+            finished = time.perf_counter()
+            UI_PAGE_UPDATE_SECONDS.observe(finished - started, source='watcher' if from_watcher else 'refresh')
+            if not from_watcher and self.refresh_started is not None:
+                UI_REFRESH_SECONDS.observe(finished - self.refresh_started)
+                self.refresh_started = None
     
-    def refresh_pages(self):
+    def _device_node(self, device):
+        return f"device:{device.device_id}"
+    
+    def _update_pages_tree(self, entries, devices=()):
+        """Apply a new page listing to the index, the filter and the treeview"""
+        added, removed, changed = self.pages.update(entries)
+        devices = list(devices)
+        renamed = [device.label for device in devices] != [device.label for device in self.page_devices]
+        self.page_devices = devices
+        # A renamed device changes the device text of all its pages without changing the pages
+        self.page_search.apply(self.pages, None if renamed else added, removed, changed)
+        self._render_pages(changed)
+    
+    def _schedule_filter(self):
+        # Coalesce keystrokes that arrive within one event loop pass
+        if not self.filter_scheduled:
+            self.filter_scheduled = True
+            self.root.after_idle(self._apply_filter)
+    
+    def _apply_filter(self):
+        self.filter_scheduled = False
+        self._render_pages()
+    
+    def _update_filter_label(self):
+        if self.filter_text.get().strip():
+            self.filter_label.config(text=f"{len(self.shown_pages)} of {len(self.pages)} pages")
+        else:
+            self.filter_label.config(text="")
+    
+    def _render_pages(self, changed=()):
+        """Materialize only the pages matching the filter, touching just the rows that differ"""
+        tree = self.pages_tree
+        matches = self.page_search.search(self.filter_text.get())
+        
+        # Group the visible pages by device, keeping device list order; with a
+        # filter, devices without matching pages are left out
+        groups = {}
+        if matches is None:
+            for device in self.page_devices:
+                groups[self._device_node(device)] = (device, [])
+        for entry in self.pages:
+            if matches is not None and entry.key not in matches:
+                continue
+            node = self._device_node(entry.device)
+            if node not in groups:
+                groups[node] = (entry.device, [])
+            groups[node][1].append(entry.key)
+        
+        shown = {key for _, keys in groups.values() for key in keys}
+        hidden = [key for key in self.shown_pages if key not in shown]
+        if hidden:
+            tree.delete(*hidden)
+        for key in changed:
+            if key in self.shown_pages and key in shown:
+                entry = self.pages.get(key)
+                tree.item(key, values=(entry.page_id, entry.title, entry.url))
+        added = shown - self.shown_pages
+        self.shown_pages = shown
+        
+        existing_nodes = tree.get_children('')
+        for node, (device, keys) in groups.items():
+            if tree.exists(node):
+                tree.item(node, text=device.label, values=('', '', device.ws_host))
+            else:
+                tree.insert('', tk.END, iid=node, text=device.label, values=('', '', device.ws_host), open=True)
+        
+        for node, (device, keys) in groups.items():
+            kept = [key for key in keys if key not in added]
+            reorder = list(tree.get_children(node)) != kept
+            # Walking in listing order keeps every insert/move index valid
+            for index, key in enumerate(keys):
+                if key in added:
+                    entry = self.pages.get(key)
+                    tree.insert(node, index, iid=key, values=(entry.page_id, entry.title, entry.url))
+                elif reorder:
+                    tree.move(key, node, index)
+        
+        stale = [node for node in existing_nodes if node not in groups]
+        if stale:
+            tree.delete(*stale)
+        if list(tree.get_children('')) != list(groups):
+            for index, node in enumerate(groups):
+                tree.move(node, '', index)
+        self._update_filter_label()
+    
+    def _start_metrics(self):
         try:
-            # Clear current list
-            self.pages_tree.delete(*self.pages_tree.get_children())
-            self.pages_list = []
-            self.page_ids = []
-            
-            # First try to get HTML content from localhost:9222
+            self.engine.start_metrics()
+        except OSError as e:
+            self.log_message(f"Could not serve metrics on port {self.settings.metrics_port}: {str(e)}")
+    
+    def _run_preflight(self):
+        """Check the environment in the background so problems show up before Start is clicked"""
+        webkit_path = self.webkit_path.get()
+        
+        def run():
             try:
-                html_response = requests.get("http://localhost:9222/")
-                if html_response.status_code == 200:
-                    self.page_ids = self.extract_page_ids_from_html(html_response.text)
-                else:
-                    self.log_message(f"Failed to get HTML listing, status: {html_response.status_code}")
+                report = self.engine.preflight(webkit_path)
             except Exception as e:
-                self.log_message(f"Error getting HTML listing: {str(e)}")
-            
-            # Fetch JSON data for page details
-            response = requests.get("http://localhost:9222/json")
-            if response.status_code == 200:
-                self.pages_list = response.json()
-                
-                # Add pages to treeview
-                for i, page in enumerate(self.pages_list):
-                    # Use the extracted page ID if available, otherwise default to index+1
-                    page_id = self.page_ids[i] if i < len(self.page_ids) else str(i+1)
-                    title = page.get('title', 'Untitled')
-                    url = page.get('url', '')
-                    
-                    self.pages_tree.insert('', tk.END, values=(page_id, title, url))
-                
-                self.log_message(f"Found {len(self.pages_list)} inspectable pages")
+                error = str(e)
+                self.root.after(0, lambda: self.log_message(f"Preflight checks failed to run: {error}"))
+                return
+            self.root.after(0, lambda: self._show_preflight(report))
+        
+        threading.Thread(target=run, name="preflight", daemon=True).start()
+    
+    def _show_preflight(self, report):
+        problems = report.errors + report.warnings
+        for check in problems:
+            self.log_message(f"Preflight {check.status}: {check.detail}")
+        if not problems:
+            self.log_message(report.describe()[0])
+    
+    def _probe_loop_lag(self, scheduled):
+        UI_LOOP_LAG_SECONDS.observe(max(time.perf_counter() - scheduled - LOOP_LAG_PROBE_MS / 1000.0, 0.0))
+        self.root.after(LOOP_LAG_PROBE_MS, self._probe_loop_lag, time.perf_counter())
+    
+    def show_diagnostics(self):
+        """Live view of the metrics registry, with the sampling profiler toggle"""
+        if self.diagnostics_window is not None:
+            self.diagnostics_window.lift()
+            return
+        window = tk.Toplevel(self.root)
+        window.title("Diagnostics")
+        window.geometry("640x420")
+        self.diagnostics_window = window
+        
+        if self.engine.metrics is not None:
+            endpoint = f"Prometheus metrics: {self.engine.metrics.url}  (profile: /debug/profile?seconds=N)"
+        else:
+            endpoint = "Metrics endpoint is not running"
+        ttk.Label(window, text=endpoint).pack(fill=tk.X, padx=10, pady=(10, 5))
+        
+        tree = ttk.Treeview(window, columns=('labels', 'value', 'p50', 'p95'), show='tree headings')
+        tree.heading('#0', text='Metric')
+        tree.heading('labels', text='Labels')
+        tree.heading('value', text='Value / count')
+        tree.heading('p50', text='p50 (ms)')
+        tree.heading('p95', text='p95 (ms)')
+        tree.column('#0', width=260)
+        tree.column('labels', width=120)
+        tree.column('value', width=90, anchor=tk.E)
+        tree.column('p50', width=70, anchor=tk.E)
+        tree.column('p95', width=70, anchor=tk.E)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10)
+        
+        buttons = ttk.Frame(window)
+        buttons.pack(fill=tk.X, padx=10, pady=10)
+        profiler_button = ttk.Button(buttons)
+        profiler_button.pack(side=tk.LEFT)
+        
+        def copy_metrics():
+            self.root.clipboard_clear()
+            self.root.clipboard_append(REGISTRY.render())
+        
+        ttk.Button(buttons, text="Copy Metrics", command=copy_metrics).pack(side=tk.LEFT, padx=5)
+        
+        def toggle_profiler():
+            if self.engine.profiler is None:
+                self.engine.start_profiler()
+                self.log_message("Sampling profiler started")
             else:
-                self.log_message(f"Failed to get JSON data, server returned: {response.status_code}")
+                path, profiler = self.engine.stop_profiler()
+                self.log_message(f"Profile of {profiler.samples} samples saved in {path} (collapsed stacks)")
+                for function, samples in profiler.top(5):
+                    self.log_message(f"  {samples:6d}  {function}")
+            update_profiler_button()
+        
+        def update_profiler_button():
+            running = self.engine.profiler is not None
+            profiler_button.config(text="Stop Profiler and Save" if running else "Start Profiler",
+                                   command=toggle_profiler)
+        
+        def refresh():
+            if self.diagnostics_window is not window:
+                return
+            tree.delete(*tree.get_children())
+            for name, metric in sorted(REGISTRY.metrics.items()):
+                series = [({}, None)] if getattr(metric, 'function', None) else metric.series()
+                for labels, _ in series:
+                    label_text = ", ".join(f"{key}={value}" for key, value in labels.items())
+                    if isinstance(metric, Histogram):
+                        count = metric.count(**labels)
+                        p50 = metric.quantile(0.5, **labels)
+                        p95 = metric.quantile(0.95, **labels)
+                        values = (label_text, count, f"{p50 * 1000:.1f}", f"{p95 * 1000:.1f}")
+                    else:
+                        values = (label_text, f"{metric.value(**labels):g}", '', '')
+                    tree.insert('', tk.END, text=name.replace('ios_debugger_', ''), values=values)
+            window.after(DIAGNOSTICS_REFRESH_MS, refresh)
         
-        except requests.exceptions.ConnectionError:
-            self.log_message("Could not connect to debugging server. Make sure it's running.")
-        except Exception as e:
-            self.log_message(f"Error refreshing pages: {str(e)}")
+        def close():
+            self.diagnostics_window = None
+            window.destroy()
+        
+        window.protocol("WM_DELETE_WINDOW", close)
+        update_profiler_button()
+        refresh()
     
-    def open_debugger(self):
+    def shutdown(self):
+        """Release background workers and files before the window closes"""
+        self.page_watcher.stop()
+        if self.trace_stop is not None:
+            self.trace_stop.set()
+        self.engine.close()
+        self.console.close()
+    
+    def _selected_entry(self):
         selection = self.pages_tree.selection()
-        if not selection:
-            messagebox.showinfo("Selection Required", "Please select a page to debug")
+        return self.pages.get(selection[0]) if selection else None
+    
+    def _update_record_button(self):
+        entry = self._selected_entry()
+        recording = entry is not None and entry.key in self.engine.recorders
+        self.record_button.config(text="Stop Recording" if recording else "Record Page")
+    
+    def toggle_recording(self):
+        """Start or stop recording the selected page's console and network events"""
+        entry = self._selected_entry()
+        if entry is None or not entry.page_id:
+            messagebox.showinfo("Selection Required", "Please select a page to record")
+            return
+        if entry.key in self.engine.recorders:
+            self.engine.stop_recording(entry.key)
+            self._update_record_button()
             return
         
-        # Get the selected item's index
-        selected_idx = self.pages_tree.index(selection[0])
+        def start():
+            try:
+                recorder = self.engine.start_recording(
+                    entry,
+                    lambda recorder: self.root.after(0, lambda: self._on_recording_finished(entry, recorder))
+                )
+            except Exception as e:
+                error = str(e)
+                self.root.after(0, lambda: self.log_message(f"Could not record {entry.title}: {error}"))
+                return
+            self.root.after(0, lambda: self._on_recording_started(entry, recorder))
         
-        if selected_idx < len(self.pages_list):
-            # Get the page ID from the tree view
-            page_id = self.pages_tree.item(selection[0])['values'][0]
-            
-            if page_id:
-                debugger_url = f"http://localhost:8080/Main.html?ws=localhost:9222/devtools/page/{page_id}"
-                title = self.pages_tree.item(selection[0])['values'][1]
-                
-                self.log_message(f"Opening debugger for: {title}")
-                self.log_message(f"Debugger URL: {debugger_url}")
-                
-                # Open in default browser
-                webbrowser.open(debugger_url)
+        # Connecting to the page can take a moment; keep the window responsive
+        threading.Thread(target=start, daemon=True).start()
+    
+    def _on_recording_started(self, entry, recorder):
+        self.log_message(f"Recording console and network events of {entry.title} to {recorder.path}")
+        self._update_record_button()
+    
+    def _on_recording_finished(self, entry, recorder):
+        counts = ", ".join(f"{count} {domain}" for domain, count in sorted(recorder.counts.items())) or "no events"
+        self.log_message(f"Recording of {entry.title} ended ({counts}), saved in {recorder.path}")
+        if recorder.error:
+            self.log_message(f"Page connection closed: {recorder.error}")
+        self._update_record_button()
+    
+    def toggle_trace(self):
+        """Record a performance trace of the selected page, or end the running one early"""
+        if self.trace_stop is not None:
+            self.trace_stop.set()
+            return
+        entry = self._selected_entry()
+        if entry is None or not entry.page_id:
+            messagebox.showinfo("Selection Required", "Please select a page to trace")
+            return
+        stop_event = threading.Event()
+        self.trace_stop = stop_event
+        self.trace_button.config(text="Stop Trace")
+        self.log_message(f"Recording a {self.settings.trace_seconds:g} s performance trace of {entry.title}")
+        
+        def capture():
+            try:
+                path, summary = self.engine.capture_trace(entry, stop_event=stop_event)
+            except Exception as e:
+                error = str(e)
+                self.root.after(0, lambda: self._on_trace_finished(entry, None, None, error))
+                return
+            self.root.after(0, lambda: self._on_trace_finished(entry, path, summary, None))
+        
+        threading.Thread(target=capture, daemon=True).start()
+    
+    def _on_trace_finished(self, entry, path, summary, error):
+        from debugger_trace import describe_summary
+        self.trace_stop = None
+        self.trace_button.config(text="Record Trace")
+        if error is not None:
+            self.log_message(f"Could not trace {entry.title}: {error}")
+            return
+        for line in describe_summary(summary):
+            self.log_message(f"Trace: {line}")
+        self.log_message(f"Trace of {entry.title} saved in {path} (open it in https://ui.perfetto.dev)")
+    
+    def _selected_entries(self, expand_devices=True):
+        """Selected pages in selection order; a selected device row stands for its listed pages"""
+        entries = {}
+        for item in self.pages_tree.selection():
+            if item.startswith("device:"):
+                keys = self.pages_tree.get_children(item) if expand_devices else ()
             else:
-                messagebox.showerror("Error", "Selected page has no valid ID")
-        else:
+                keys = (item,)
+            for key in keys:
+                entry = self.pages.get(key)
+                if entry is not None:
+                    entries.setdefault(key, entry)
+        return list(entries.values())
+    
+    def _start_relay(self):
+        # Share one device connection between every frontend opened on a page
+        try:
+            self.engine.start_relay()
+        except OSError as e:
+            self.log_message(f"Could not start WebSocket relay on port {self.settings.relay_port}: {str(e)}")
+    
+    def open_debugger(self, expand_devices=True):
+        """Open the inspectors of every selected page in one browser launch"""
+        selection = self.pages_tree.selection()
+        if not selection:
+            messagebox.showinfo("Selection Required", "Please select a page to debug")
+            return
+        
+        entries = self._selected_entries(expand_devices)
+        if not entries:
+            if all(item.startswith("device:") for item in selection):
+                if expand_devices:
+                    messagebox.showinfo("No Pages", "The selected device has no inspectable pages")
+                return
             messagebox.showerror("Error", "Invalid selection")
+            return
+        if not any(entry.page_id for entry in entries):
+            messagebox.showerror("Error", "Selected page has no valid ID")
+            return
+        
+        self._start_relay()
+        for entry in entries:
+            if entry.page_id:
+                self.log_message(f"Opening debugger for: {entry.title}")
+                self.log_message(f"Debugger URL: {self.engine.debugger_url(entry)}")
+        try:
+            opened, invocations = self.engine.open_pages(entries)
+        except OSError as e:
+            self.log_message(f"Could not launch the browser: {str(e)}")
+            messagebox.showerror("Error", f"Could not launch the browser: {str(e)}")
+            return
+        if len(opened) > 1:
+            self.log_message(f"Opened {len(opened)} inspectors with {invocations} browser launch(es)")
+    
+    def _load_session_names(self):
+        self.session_box.config(values=sorted(self.engine.saved_sessions()))
+    
+    def _update_attach_button(self):
+        attached = self.session_name.get().strip() in self.engine.attached_sessions
+        self.attach_button.config(text="Detach" if attached else "Attach")
+    
+    def save_session(self):
+        """Save the selected pages as a named session of (device, URL pattern) targets"""
+        from debugger_batch import target_for
+        entries = [entry for entry in self._selected_entries() if entry.page_id]
+        if not entries:
+            messagebox.showinfo("Selection Required", "Please select the pages to save in the session")
+            return
+        name = self.session_name.get().strip() or simpledialog.askstring(
+            "Save Session", "Session name:", parent=self.root
+        )
+        if not name:
+            return
+        try:
+            targets = self.engine.save_session(name, [target_for(entry) for entry in entries])
+        except (ValueError, OSError) as e:
+            messagebox.showerror("Error", f"Could not save session: {str(e)}")
+            return
+        self.session_name.set(name.strip())
+        self.log_message(f"Saved session {name.strip()} with {len(targets)} page(s):")
+        for target in targets:
+            self.log_message(f"  {target.device}  {target.url}")
+    
+    def toggle_session(self):
+        """Attach the named session (opening its pages now and whenever they reappear), or detach it"""
+        name = self.session_name.get().strip()
+        if not name:
+            messagebox.showinfo("Session Required", "Please pick or type a saved session name")
+            return
+        if name in self.engine.attached_sessions:
+            self.engine.detach_session(name)
+            self.log_message(f"Session {name} detached")
+            self._update_attach_button()
+            return
+        
+        self._start_relay()
+        try:
+            session, opened, invocations = self.engine.attach_session(name, list(self.pages))
+        except (ValueError, OSError) as e:
+            messagebox.showerror("Error", f"Could not attach session: {str(e)}")
+            return
+        self.log_message(
+            f"Session {name} attached: opened {len(opened)} of its pages with {invocations} browser launch(es); "
+            f"matching pages are reopened when they reappear"
+        )
+        self._update_attach_button()
+    
+    def _sync_sessions(self, result):
+        if not self.engine.attached_sessions:
+            return
+        try:
+            reopened = self.engine.sync_sessions(result)
+        except OSError as e:
+            self.log_message(f"Could not reopen session pages: {str(e)}")
+            return
+        for session, entries in reopened:
+            titles = ", ".join(entry.title for entry in entries)
+            self.log_message(f"Session {session.name}: reattached {len(entries)} page(s): {titles}")
 
 def main():
     root = tk.Tk()
@@ -494,15 +908,20 @@ def main():
     
     # Handle application close
     def on_closing():
-        if app.debugging_process:
+        if app.supervisor:
             if messagebox.askyesno("Quit", "Debugging server is still running. Stop it and exit?"):
                 app.stop_debugging()
+                app.shutdown()
                 root.destroy()
         else:
+            app.shutdown()
             root.destroy()
     
     root.protocol("WM_DELETE_WINDOW", on_closing)
     
+    # Load the HTTP stack once the window is up rather than before it
+    root.after_idle(warm_up)
+    
     # Apply a theme if available
     try:
         style = ttk.Style()
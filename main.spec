@@ -1,4 +1,39 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
+
+# Set IOS_DEBUGGER_ONEDIR=1 to build a folder instead of a single EXE; it starts
+# faster because nothing has to be unpacked to a temp directory on each launch.
+ONEDIR = os.environ.get('IOS_DEBUGGER_ONEDIR') == '1'
+
+# Never imported at runtime: bs4 was replaced by html.parser, requests only needs
+# charset_normalizer, and urllib3's optional backends are not used.
+EXCLUDES = [
+    'bs4',
+    'soupsieve',
+    'lxml',
+    'html5lib',
+    'chardet',
+    'cchardet',
+    'brotli',
+    'brotlicffi',
+    'zstandard',
+    'h2',
+    'socks',
+    'cryptography',
+    'OpenSSL',
+    'urllib3.contrib.emscripten',
+    'urllib3.contrib.pyopenssl',
+    'urllib3.contrib.socks',
+    'urllib3.http2',
+    'unittest',
+    'doctest',
+    'pydoc',
+    'pdb',
+    'lib2to3',
+    'xmlrpc',
+    'idlelib',
+    'tkinter.test',
+]
 
 
 a = Analysis(
@@ -10,29 +45,58 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=EXCLUDES,
     noarchive=False,
-    optimize=0,
+    optimize=2,
 )
 pyz = PYZ(a.pure)
 
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.datas,
-    [],
-    name='main',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
-    console=True,
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-)
+if ONEDIR:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        [],
+        exclude_binaries=True,
+        name='main',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=False,
+        console=True,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=False,
+        upx=False,
+        upx_exclude=[],
+        name='main',
+    )
+else:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.datas,
+        [],
+        name='main',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        # UPX-compressed DLLs must be decompressed on every launch
+        upx=False,
+        upx_exclude=[],
+        runtime_tmpdir=None,
+        console=True,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
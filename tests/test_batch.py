@@ -0,0 +1,107 @@
+import json
+
+from debugger_batch import (
+    BrowserLauncher,
+    DebugSession,
+    SessionTarget,
+    load_saved_sessions,
+    save_saved_sessions,
+    target_for,
+    target_matches,
+)
+from debugger_core import Device, PageEntry
+
+PHONE = Device('00008110-000A', 'iPhone', '127.0.0.1', 9222, '17.4')
+PAD = Device('00008027-000B', 'iPad', '127.0.0.1', 9223)
+
+
+def page(page_id, url, device=PHONE):
+    return PageEntry(f"{device.device_id}:page:{page_id}", str(page_id), 'Title', url, {}, device)
+
+
+def test_plain_url_matches_whatever_the_query_and_fragment():
+    target = SessionTarget('', 'https://shop.example.com/checkout')
+    assert target_matches(target, page(1, 'https://shop.example.com/checkout'))
+    assert target_matches(target, page(1, 'https://shop.example.com/checkout?step=2#pay'))
+    assert target_matches(target, page(1, 'HTTPS://SHOP.example.com/Checkout'))
+    assert not target_matches(target, page(1, 'https://shop.example.com/checkout/done'))
+
+
+def test_only_star_is_a_wildcard():
+    assert target_matches(SessionTarget('', '*/checkout*'), page(1, 'https://shop.example.com/checkout/done'))
+    assert not target_matches(SessionTarget('', '*/checkout*'), page(1, 'https://shop.example.com/cart'))
+    # ? and [ ] are literal URL characters, not glob syntax
+    assert target_matches(SessionTarget('', '*?tab=[1]*'), page(1, 'https://example.com/?tab=[1]&x=2'))
+    assert not target_matches(SessionTarget('', '*?tab=[1]*'), page(1, 'https://example.com/?tab=1'))
+    assert not target_matches(SessionTarget('', 'https://example.com/a?c'), page(1, 'https://example.com/abc'))
+    # A pattern without a query also matches pages that have one
+    assert target_matches(SessionTarget('', '*/path/1'), page(1, 'https://example.com/path/1?v=3'))
+    assert not target_matches(SessionTarget('', '*/path/1'), page(1, 'https://example.com/path/12'))
+
+
+def test_device_matches_id_name_or_label():
+    url = 'https://example.com/'
+    assert target_matches(SessionTarget('', url), page(1, url, PAD))
+    assert target_matches(SessionTarget('*', url), page(1, url, PAD))
+    assert target_matches(SessionTarget('00008027-000b', url), page(1, url, PAD))
+    assert target_matches(SessionTarget('ipad', url), page(1, url, PAD))
+    assert target_matches(SessionTarget('iPhone (iOS 17.4)', url), page(1, url, PHONE))
+    assert target_matches(SessionTarget('00008110-*', url), page(1, url, PHONE))
+    assert not target_matches(SessionTarget('iphone', url), page(1, url, PAD))
+    assert not target_matches(SessionTarget('iph', url), page(1, url, PHONE))
+
+
+def test_target_for_finds_the_page_again_after_a_reload():
+    target = target_for(page(3, 'https://example.com/app?session=1'))
+    assert target == SessionTarget(PHONE.device_id, 'https://example.com/app')
+    assert target_matches(target, page(7, 'https://example.com/app?session=2'))
+
+
+class RecordingLauncher(BrowserLauncher):
+    def __init__(self):
+        super().__init__(command=None)
+        self.launches = []
+    
+    def launch(self, urls):
+        self.launches.append(list(urls))
+        return 1
+
+
+def test_attached_session_reopens_pages_that_come_back_under_a_new_id():
+    launcher = RecordingLauncher()
+    session = DebugSession(launcher, lambda entry: entry.page_id, 'shop', [('', '*/checkout*')])
+    first = [page(1, 'https://example.com/checkout'), page(2, 'https://example.com/home')]
+    opened, invocations = session.open(session.reattach(first, {PHONE.device_id}), reason='attached')
+    assert [entry.page_id for entry in opened] == ['1'] and invocations == 1
+    assert session.reattach(first, {PHONE.device_id}) == []
+    
+    # Reloaded under a new page ID: the old one is forgotten and the new one is pending
+    reloaded = [page(5, 'https://example.com/checkout?step=2'), page(2, 'https://example.com/home')]
+    assert [entry.page_id for entry in session.reattach(reloaded, {PHONE.device_id})] == ['5']
+    
+    # A device whose listing failed keeps its pages
+    session.mark_opened(reloaded[:1])
+    assert session.reattach([], set()) == []
+    assert session.opened
+
+
+def test_launcher_chunks_long_command_lines():
+    launcher = BrowserLauncher(['browser'])
+    urls = [f"http://localhost:8080/Main.html?ws=localhost:9222/devtools/page/{i}" + 'x' * 900 for i in range(20)]
+    chunks = list(launcher.chunks(urls))
+    assert len(chunks) > 1
+    assert [url for chunk in chunks for url in chunk] == urls
+
+
+def test_saved_sessions_round_trip_and_bad_files(tmp_path):
+    path = str(tmp_path / 'sessions' / 'debug_sessions.json')
+    assert load_saved_sessions(path) == {}
+    save_saved_sessions(path, {'shop': [SessionTarget('iPhone', '*/checkout*')]})
+    assert load_saved_sessions(path) == {'shop': [SessionTarget('iPhone', '*/checkout*')]}
+    
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump([{'device': 'iPhone'}], f)
+    assert load_saved_sessions(path) == {}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'good': [{'url': '*'}], 'bad': ['not a target']}, f)
+    assert load_saved_sessions(path) == {'good': [SessionTarget('', '*')]}
@@ -0,0 +1,22 @@
+from debugger_core import ConsoleBuffer
+
+
+def test_pending_keeps_the_last_max_lines_until_taken():
+    console = ConsoleBuffer(max_lines=3)
+    console.append("one")
+    console.append("two\nthree\nfour")
+    assert console.take_pending() == ['two', 'three', 'four']
+    assert console.take_pending() == []
+
+
+def test_every_line_reaches_the_rotated_log_files(tmp_path):
+    log_file = tmp_path / 'logs' / 'console.log'
+    console = ConsoleBuffer(max_lines=2, log_file=str(log_file), log_max_bytes=400, log_backups=5)
+    for n in range(20):
+        console.append(f"line {n}")
+    console.close()
+    
+    files = sorted(log_file.parent.iterdir(), key=lambda path: path.name, reverse=True)
+    assert len(files) > 1
+    written = [line.split(' ', 2)[2] for path in files for line in path.read_text(encoding='utf-8').splitlines()]
+    assert written == [f"line {n}" for n in range(20)]
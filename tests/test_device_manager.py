@@ -0,0 +1,37 @@
+import threading
+
+from debugger_core import DeviceManager
+from fake_proxy import FakeProxy
+
+
+def test_fetch_lists_pages_of_every_device():
+    with FakeProxy(devices=2, pages=3) as proxy:
+        manager = DeviceManager('127.0.0.1', proxy.list_port)
+        try:
+            result = manager.fetch()
+        finally:
+            manager.close()
+    assert result.device_list_error is None
+    assert [len(device_result.pages) for _, device_result in result.device_results] == [3, 3]
+
+
+def test_fetch_async_reuses_one_refresh_thread_and_its_session():
+    with FakeProxy(devices=1, pages=2) as proxy:
+        manager = DeviceManager('127.0.0.1', proxy.list_port)
+        threads = []
+        sessions = []
+        done = threading.Semaphore(0)
+        
+        def on_result(result):
+            threads.append(threading.current_thread())
+            sessions.append(manager._list_fetcher._session())
+            done.release()
+        try:
+            for _ in range(5):
+                manager.fetch_async(on_result)
+            for _ in range(5):
+                assert done.acquire(timeout=10)
+        finally:
+            manager.close()
+    assert len(set(threads)) == 1
+    assert len(set(map(id, sessions))) == 1
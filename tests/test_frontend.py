@@ -0,0 +1,48 @@
+from debugger_core import DebuggerEngine, Settings, script_proxy_args
+from debugger_http import FRONTEND_INDEX, FRONTEND_SUBDIR
+
+
+def make_kit(root, script):
+    frontend = root.joinpath(*FRONTEND_SUBDIR)
+    frontend.mkdir(parents=True)
+    (frontend / FRONTEND_INDEX).write_text('<html></html>', encoding='utf-8')
+    proxy = root / 'bin' / 'ios_webkit_debug_proxy'
+    proxy.parent.mkdir()
+    proxy.write_text('#!/bin/sh\n', encoding='utf-8')
+    proxy.chmod(0o755)
+    (root / 'start.sh').write_text(script, encoding='utf-8')
+    return str(frontend), str(proxy)
+
+
+def test_script_proxy_args(tmp_path):
+    script = tmp_path / 'start.sh'
+    cases = [
+        ('#!/bin/bash\nios_webkit_debug_proxy -c null:9221,:9222-9322 -F &\npython3 -m http.server 8080\n',
+         ['-c', 'null:9221,:9222-9322', '-F']),
+        ('exec ./bin/ios_webkit_debug_proxy --debug  # verbose\n', ['--debug']),
+        ('ios_webkit_debug_proxy\n', []),
+        ('ios_webkit_debug_proxy -c "$DEVICES"\n', None),
+        ('ios_webkit_debug_proxy -F | tee proxy.log\n', None),
+        ('ios_webkit_debug_proxy\nios_webkit_debug_proxy -F\n', None),
+        ('echo no proxy here\n', None),
+    ]
+    for text, expected in cases:
+        script.write_text(text, encoding='utf-8')
+        assert script_proxy_args(str(script)) == expected, text
+    assert script_proxy_args(str(tmp_path / 'missing.sh')) is None
+
+
+def test_builtin_frontend_is_used_by_default_with_the_scripts_arguments(tmp_path, monkeypatch):
+    # Only the proxy bundled in the kit, not one that happens to be installed
+    monkeypatch.setenv('PATH', str(tmp_path / 'empty'))
+    frontend, proxy = make_kit(tmp_path, 'ios_webkit_debug_proxy -c null:9221,:9222-9322 &\npython3 -m http.server\n')
+    engine = DebuggerEngine(Settings(str(tmp_path / 'settings.ini')))
+    assert engine.frontend_command(str(tmp_path)) == (frontend, [proxy, '-c', 'null:9221,:9222-9322'])
+    
+    # Arguments it can't read safely: the start script runs instead
+    (tmp_path / 'start.sh').write_text('ios_webkit_debug_proxy $ARGS\n', encoding='utf-8')
+    assert engine.frontend_command(str(tmp_path)) is None
+    engine.settings.builtin_frontend = False
+    (tmp_path / 'start.sh').write_text('ios_webkit_debug_proxy\n', encoding='utf-8')
+    assert engine.frontend_command(str(tmp_path)) is None
+    engine.close()
@@ -0,0 +1,48 @@
+from debugger_core import Device, PageEntry, PageIndex
+
+PHONE = Device('00008110-000A', 'iPhone', '127.0.0.1', 9222, '17.4')
+
+
+def page(page_id, url='https://example.com/', title='Title'):
+    return PageEntry(f"{PHONE.device_id}:page:{page_id}", str(page_id), title, url, {}, PHONE)
+
+
+def test_first_update_adds_every_page_in_order():
+    index = PageIndex()
+    added, removed, changed = index.update([page(2), page(1)])
+    assert added == [page(2).key, page(1).key]
+    assert (removed, changed) == ([], [])
+    assert index.keys() == added
+    assert len(index) == 2
+
+
+def test_update_reports_added_removed_and_changed_pages():
+    index = PageIndex()
+    index.update([page(1), page(2), page(3)])
+    added, removed, changed = index.update([
+        page(1),
+        page(2, title='Checkout'),
+        page(4),
+    ])
+    assert added == [page(4).key]
+    assert removed == [page(3).key]
+    assert changed == [page(2).key]
+    assert index.get(page(2).key).title == 'Checkout'
+    assert index.get(page(3).key) is None
+
+
+def test_only_page_id_title_and_url_count_as_a_change():
+    index = PageIndex()
+    index.update([page(1)])
+    assert index.update([page(1, url='https://example.com/next')]) == ([], [], [page(1).key])
+    # The raw /json dict is not compared
+    moved = page(1, url='https://example.com/next')._replace(page={'faviconUrl': 'x'})
+    assert index.update([moved]) == ([], [], [])
+
+
+def test_unchanged_listing_reports_nothing():
+    index = PageIndex()
+    index.update([page(1), page(2)])
+    assert index.update([page(1), page(2)]) == ([], [], [])
+    assert index.update([]) == ([], [page(1).key, page(2).key], [])
+    assert len(index) == 0
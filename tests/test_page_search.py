@@ -0,0 +1,82 @@
+from debugger_core import Device, PageIndex, PageSearchIndex, build_page_entries, parse_page_query
+
+PHONE = Device('phone0001', 'iPhone', '127.0.0.1', 9222, '17.4')
+PAD = Device('pad0002', 'iPad', '127.0.0.1', 9223, '16.7')
+
+
+def pages(*rows):
+    return [{'title': title, 'url': url, 'webSocketDebuggerUrl': f"127.0.0.1:9222/devtools/page/{page_id}"}
+            for page_id, title, url in rows]
+
+
+def indexed(entries):
+    index = PageIndex()
+    search = PageSearchIndex()
+    search.apply(index, *index.update(entries))
+    return index, search
+
+
+def keys_of(index, search, query):
+    matches = search.search(query)
+    return None if matches is None else sorted(index.get(key).page_id for key in matches)
+
+
+def test_parse_page_query_fields_and_anchors():
+    assert parse_page_query('  ') == []
+    assert parse_page_query('Title:^Check cart') == [(0, True, 'check'), (None, False, 'cart')]
+    # An unknown field name is part of the text
+    assert parse_page_query('port:80') == [(None, False, 'port:80')]
+
+
+def test_search_matches_every_term_across_fields():
+    entries = build_page_entries(pages(
+        (1, 'Checkout', 'https://shop.example.com/checkout?step=2'),
+        (2, 'Cart', 'https://shop.example.com/cart'),
+        (3, 'Docs', 'https://docs.example.org/'),
+    ), device=PHONE) + build_page_entries(pages((4, 'Checkout', 'https://shop.example.com/checkout')), device=PAD)
+    index, search = indexed(entries)
+    
+    assert search.search('') is None
+    assert keys_of(index, search, 'shop') == ['1', '2', '4']
+    assert keys_of(index, search, 'checkout ipad') == ['4']
+    assert keys_of(index, search, 'host:docs') == ['3']
+    assert keys_of(index, search, 'title:example') == []
+    # Short terms skip the trigram index but still match
+    assert keys_of(index, search, 'do') == ['3']
+
+
+def test_anchored_terms_match_at_word_starts_only():
+    index, search = indexed(build_page_entries(pages(
+        (1, 'Order history', 'https://example.com/orders'),
+        (2, 'Reorder', 'https://example.com/reorder'),
+    ), device=PHONE))
+    assert keys_of(index, search, 'order') == ['1', '2']
+    assert keys_of(index, search, '^order') == ['1']
+
+
+def test_narrowed_query_reuses_previous_matches_until_the_index_changes():
+    index, search = indexed(build_page_entries(pages(
+        (1, 'Checkout', 'https://example.com/checkout'),
+        (2, 'Check status', 'https://example.com/status'),
+    ), device=PHONE))
+    assert keys_of(index, search, 'check') == ['1', '2']
+    assert keys_of(index, search, 'checko') == ['1']
+    
+    # A page retitled into the match set must show up even though the query only narrows
+    entries = build_page_entries(pages(
+        (1, 'Checkout', 'https://example.com/checkout'),
+        (2, 'Checkout status', 'https://example.com/status'),
+    ), device=PHONE)
+    search.apply(index, *index.update(entries))
+    assert keys_of(index, search, 'checkou') == ['1', '2']
+
+
+def test_removed_pages_leave_the_index():
+    index, search = indexed(build_page_entries(pages(
+        (1, 'Alpha', 'https://example.com/a'),
+        (2, 'Beta', 'https://example.com/b'),
+    ), device=PHONE))
+    search.apply(index, *index.update(build_page_entries(pages((2, 'Beta', 'https://example.com/b')), device=PHONE)))
+    assert len(search) == 1
+    assert keys_of(index, search, 'alpha') == []
+    assert 'alp' not in search.postings
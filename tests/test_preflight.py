@@ -0,0 +1,81 @@
+import os
+import platform
+
+import pytest
+
+from debugger_core import Settings
+from debugger_preflight import cache_key, run_preflight
+
+pytestmark = pytest.mark.skipif(platform.system() == "Windows", reason="fake tools are shell scripts")
+
+TOOLS = ('ios_webkit_debug_proxy', 'git', 'bash')
+
+
+def make_tools(folder, version='1.0'):
+    os.makedirs(folder, exist_ok=True)
+    for name in TOOLS:
+        path = os.path.join(folder, name)
+        with open(path, 'w') as f:
+            f.write(f"#!/bin/sh\necho '{name} {version}'\n")
+        os.chmod(path, 0o755)
+
+
+def preflight(tmp_path):
+    settings = Settings(str(tmp_path / 'settings.ini')).load()
+    return run_preflight(settings, webkit_path='', ports=())
+
+
+@pytest.fixture
+def tools(tmp_path, monkeypatch):
+    folder = str(tmp_path / 'bin')
+    make_tools(folder)
+    monkeypatch.setenv('PATH', folder)
+    return folder
+
+
+def tool_detail(report, name):
+    return next(check.detail for check in report.checks if check.name == f"tool:{name}")
+
+
+def test_second_run_reads_versions_from_the_cache(tmp_path, tools):
+    first = preflight(tmp_path)
+    assert not first.cached
+    assert tool_detail(first, 'git') == f"{os.path.join(tools, 'git')} (git 1.0)"
+    second = preflight(tmp_path)
+    assert second.cached
+    assert tool_detail(second, 'git') == tool_detail(first, 'git')
+
+
+def test_changing_path_invalidates_the_cache(tmp_path, tools, monkeypatch):
+    preflight(tmp_path)
+    other = str(tmp_path / 'other')
+    make_tools(other, '2.0')
+    monkeypatch.setenv('PATH', os.pathsep.join([other, tools]))
+    report = preflight(tmp_path)
+    assert not report.cached
+    assert tool_detail(report, 'git') == f"{os.path.join(other, 'git')} (git 2.0)"
+
+
+def test_a_path_folder_changing_invalidates_the_cache(tmp_path, tools):
+    preflight(tmp_path)
+    key = cache_key('')
+    stat = os.stat(tools)
+    os.utime(tools, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    assert cache_key('') != key
+    assert not preflight(tmp_path).cached
+    assert preflight(tmp_path).cached
+
+
+def test_an_upgraded_tool_is_probed_again(tmp_path, tools):
+    preflight(tmp_path)
+    git = os.path.join(tools, 'git')
+    stat = os.stat(tools)
+    with open(git, 'w') as f:
+        f.write("#!/bin/sh\necho 'git 1.1'\n")
+    git_stat = os.stat(git)
+    os.utime(git, ns=(git_stat.st_atime_ns, git_stat.st_mtime_ns + 1000000000))
+    # Rewriting a file in place leaves its folder's mtime alone, so only the tool's own mtime tells
+    os.utime(tools, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    report = preflight(tmp_path)
+    assert not report.cached
+    assert tool_detail(report, 'git') == f"{git} (git 1.1)"
@@ -0,0 +1,121 @@
+import json
+import os
+
+from debugger_core import DebuggerEngine, Settings
+from debugger_recorder import INDEX_FILE, SessionReader, SessionWriter, event_level
+from fake_proxy import FakeProxy
+
+
+def record(t, method='Console.messageAdded', level='log', text=''):
+    return {'t': t, 'method': method, 'level': level, 'params': {'message': {'text': text}}}
+
+
+def write_session(path, records, **options):
+    writer = SessionWriter(str(path), meta={'started': records[0]['t']}, **options)
+    for item in records:
+        writer.write(item)
+    writer.close()
+    return SessionReader(str(path))
+
+
+def test_event_level():
+    assert event_level('Console.messageAdded', {'message': {'level': 'error'}}) == 'error'
+    assert event_level('Console.messageAdded', {'message': {'level': 'bogus'}}) == 'log'
+    assert event_level('Network.responseReceived', {'response': {'status': 404}}) == 'warning'
+    assert event_level('Network.responseReceived', {'response': {'status': 200}}) == 'info'
+    assert event_level('Network.loadingFailed', {}) == 'error'
+
+
+def test_blocks_are_indexed_with_time_range_and_counts(tmp_path):
+    records = [record(1000.0 + i, level='error' if i % 10 == 0 else 'log', text=f"event {i}") for i in range(100)]
+    reader = write_session(tmp_path, records, block_bytes=1000)
+    
+    assert len(reader.index) > 1
+    assert reader.events == 100
+    assert sum(block['count'] for block in reader.index) == 100
+    first_seqs = [block['first_seq'] for block in reader.index]
+    assert first_seqs == sorted(first_seqs) and first_seqs[0] == 0
+    for before, after in zip(reader.index, reader.index[1:]):
+        assert before['end'] <= after['start']
+    assert reader.summary()['levels'] == {'error': 10, 'log': 90}
+    assert [r['t'] for r in reader.events_matching()] == [r['t'] for r in records]
+
+
+def test_filters_only_decompress_matching_blocks(tmp_path):
+    records = [record(2000.0 + i, text=f"event {i}") for i in range(60)]
+    records[45] = record(2045.0, method='Network.loadingFailed', level='error', text='refused')
+    reader = write_session(tmp_path, records, block_bytes=800)
+    
+    read = []
+    original = reader._read_block
+    reader._read_block = lambda block: read.append(block['offset']) or original(block)
+    assert [r['t'] for r in reader.events_matching(levels={'error'})] == [2045.0]
+    assert len(read) == 1
+    
+    read.clear()
+    assert [r['t'] for r in reader.events_matching(start=2010.0, end=2012.0)] == [2010.0, 2011.0, 2012.0]
+    assert len(read) < len(reader.index)
+    assert [r['t'] for r in reader.events_matching(domains={'Network'})] == [2045.0]
+    assert [r['t'] for r in reader.events_matching(text='EVENT 5')] == [2005.0] + [2050.0 + i for i in range(10)]
+
+
+def test_segments_roll_over_and_blocks_stay_readable(tmp_path):
+    records = [record(3000.0 + i, text=os.urandom(200).hex()) for i in range(200)]
+    reader = write_session(tmp_path, records, block_bytes=2000, segment_bytes=4000)
+    assert len({block['segment'] for block in reader.index}) > 1
+    assert sum(1 for _ in reader.events_matching()) == 200
+
+
+def test_partly_written_index_line_is_ignored(tmp_path):
+    reader = write_session(tmp_path, [record(4000.0 + i) for i in range(5)])
+    with open(os.path.join(str(tmp_path), INDEX_FILE), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(reader.index[0])[:20])
+    assert SessionReader(str(tmp_path)).events == 5
+
+
+def test_text_search_finds_escaped_and_non_ascii_text(tmp_path):
+    texts = ['Größe 42', 'say "hello"', 'C:\\temp\\app.log', 'line\u2028break', 'plain']
+    reader = write_session(tmp_path, [record(5000.0 + i, text=text) for i, text in enumerate(texts)])
+    
+    def found(text):
+        return [r['params']['message']['text'] for r in reader.events_matching(text=text)]
+    assert found('größe') == ['Größe 42']
+    assert found('"hello"') == ['say "hello"']
+    assert found('c:\\temp') == ['C:\\temp\\app.log']
+    assert found('\u2028') == ['line\u2028break']
+    # Key names are not text; values such as the method are
+    assert found('level') == []
+    assert found('params') == []
+    assert len(found('messageadded')) == len(texts)
+
+
+def test_text_search_reads_sessions_written_with_escapes(tmp_path):
+    reader = write_session(tmp_path, [record(6000.0, text='Größe "x"')])
+    # Sessions recorded before ensure_ascii=False hold \u escapes
+    escaped = json.dumps(record(6000.0, text='Größe "x"'), separators=(',', ':')) + '\n'
+    reader._read_block = lambda _: escaped
+    assert [r['t'] for r in reader.events_matching(text='größe "x"')] == [6000.0]
+
+
+def test_recordings_and_traces_share_their_page_metadata(tmp_path):
+    with FakeProxy(devices=1, pages=1, event_rate=50) as proxy:
+        settings = Settings(str(tmp_path / 'settings.ini'))
+        settings.device_list_port = proxy.list_port
+        settings.proxy_host = '127.0.0.1'
+        settings.relay_enabled = False
+        settings.sessions_dir = str(tmp_path / 'sessions')
+        settings.traces_dir = str(tmp_path / 'traces')
+        engine = DebuggerEngine(settings)
+        try:
+            entry = engine.fetch_pages().entries()[0]
+            recorder = engine.start_recording(entry)
+            path, _ = engine.capture_trace(entry, duration=0.3)
+            engine.stop_recording()
+        finally:
+            engine.close()
+    with open(path, encoding='utf-8') as f:
+        trace_meta = json.load(f)['metadata']
+    session_meta = SessionReader(recorder.path).meta
+    for key in ('device_id', 'device', 'page_id', 'title', 'url'):
+        assert session_meta[key] == trace_meta[key]
+    assert session_meta['url'] == entry.url
@@ -0,0 +1,199 @@
+import json
+import queue
+import threading
+import time
+
+from debugger_ws import PageChannel, QueuedSender, WebSocketClosed, WebSocketRelay, connect
+from fake_proxy import FakeProxy
+
+
+class FakeSocket:
+    """Stands in for both ends of a PageChannel: sends are recorded, recv() takes what was fed"""
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+        self._incoming = queue.Queue()
+    
+    def send(self, message):
+        if self.closed:
+            raise WebSocketClosed()
+        self.sent.append(message)
+    
+    def recv(self):
+        message = self._incoming.get()
+        if message is None:
+            raise WebSocketClosed()
+        return message
+    
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._incoming.put(None)
+
+
+def make_channel():
+    upstream = FakeSocket()
+    return PageChannel('test', upstream, lambda channel: None), upstream
+
+
+def sent_json(sock):
+    return [json.loads(raw) for raw in sock.sent]
+
+
+def test_request_ids_are_unique_upstream_and_restored_for_their_frontend():
+    channel, upstream = make_channel()
+    a, b = FakeSocket(), FakeSocket()
+    channel.send_from(a, json.dumps({'id': 1, 'method': 'Runtime.enable'}))
+    channel.send_from(b, json.dumps({'id': 1, 'method': 'Runtime.enable'}))
+    first, second = [message['id'] for message in sent_json(upstream)]
+    assert first != second
+    
+    assert channel._route(json.dumps({'id': second, 'result': {}})) == (b, json.dumps({'id': 1, 'result': {}}))
+    assert channel._route(json.dumps({'id': first, 'result': {}})) == (a, json.dumps({'id': 1, 'result': {}}))
+    channel.close()
+
+
+def test_unknown_response_is_dropped_and_events_go_to_everyone():
+    channel, upstream = make_channel()
+    raw = json.dumps({'id': 99, 'result': {}})
+    assert channel._route(raw) == (False, raw)
+    event = json.dumps({'method': 'Console.messageAdded', 'params': {'message': {'text': 'hi'}}})
+    assert channel._route(event) == (None, event)
+    assert channel._route('not json') == (None, 'not json')
+    channel.close()
+
+
+def test_inner_target_ids_are_rewritten_and_restored():
+    channel, upstream = make_channel()
+    a, b = FakeSocket(), FakeSocket()
+    for client in (a, b):
+        channel.send_from(client, json.dumps({
+            'id': 4, 'method': 'Target.sendMessageToTarget',
+            'params': {'targetId': 'page-1', 'message': json.dumps({'id': 7, 'method': 'Page.reload'})},
+        }))
+    inner_ids = [json.loads(message['params']['message'])['id'] for message in sent_json(upstream)]
+    assert inner_ids[0] != inner_ids[1]
+    
+    reply = {'method': 'Target.dispatchMessageFromTarget',
+             'params': {'targetId': 'page-1', 'message': json.dumps({'id': inner_ids[1], 'result': {}})}}
+    client, raw = channel._route(json.dumps(reply))
+    assert client is b
+    message = json.loads(raw)
+    assert message['method'] == 'Target.dispatchMessageFromTarget'
+    assert json.loads(message['params']['message']) == {'id': 7, 'result': {}}
+    
+    # Answered once; a repeat no longer has an owner
+    assert channel._route(json.dumps(reply))[0] is False
+    channel.close()
+
+
+def test_binary_frames_pass_through_untouched():
+    channel, upstream = make_channel()
+    channel.send_from(FakeSocket(), b'\x00\x01')
+    assert upstream.sent == [b'\x00\x01']
+    assert channel._route(b'\x02') == (None, b'\x02')
+    channel.close()
+
+
+def test_target_announcements_are_replayed_to_late_frontends():
+    channel, upstream = make_channel()
+    created = json.dumps({'method': 'Target.targetCreated', 'params': {'targetInfo': {'targetId': 'page-1-1'}}})
+    channel._route(created)
+    late = FakeSocket()
+    assert channel.add(late)
+    assert late.sent == [created]
+    
+    channel._route(json.dumps({'method': 'Target.targetDestroyed', 'params': {'targetId': 'page-1-1'}}))
+    later = FakeSocket()
+    channel.add(later)
+    assert later.sent == []
+    channel.close()
+
+
+class StuckSocket:
+    """A frontend connection whose peer stopped reading: send blocks until the socket is shut down"""
+    def __init__(self):
+        self.sent = []
+        self.shut = threading.Event()
+        self.sock = self
+    
+    def send(self, message):
+        self.shut.wait()
+        raise WebSocketClosed("shut down")
+    
+    def shutdown(self, how):
+        self.shut.set()
+    
+    def close(self):
+        self.shut.set()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_a_frontend_that_stops_reading_is_dropped_without_holding_up_the_others():
+    channel, upstream = make_channel()
+    stuck = QueuedSender(StuckSocket(), max_queued=5)
+    healthy = FakeSocket()
+    channel.add(stuck)
+    channel.add(QueuedSender(healthy))
+    for n in range(50):
+        upstream._incoming.put(json.dumps({'method': 'Console.messageAdded', 'params': {'n': n}}))
+    wait_for(lambda: len(healthy.sent) == 50)
+    assert stuck.closed and stuck.ws.shut.is_set()
+    with channel._lock:
+        assert stuck in channel.clients  # Removed by its own handler once its recv fails
+    channel.close()
+
+
+def recv_json(ws, predicate):
+    while True:
+        message = json.loads(ws.recv())
+        if predicate(message):
+            return message
+
+
+def test_two_frontends_share_one_page_through_the_relay():
+    with FakeProxy(devices=1, pages=1, event_rate=0) as proxy:
+        device = proxy.devices[0]
+        relay = WebSocketRelay('127.0.0.1', '127.0.0.1', 0, connect_timeout=2.0, allowed_ports=lambda: {device.port})
+        relay.start()
+        try:
+            url = f"ws://127.0.0.1:{relay.port}/{device.port}/devtools/page/{device.pages[0][0]}"
+            frontends = [connect(url, timeout=5.0) for _ in range(2)]
+            for ws in frontends:
+                ws.send(json.dumps({
+                    'id': 1, 'method': 'Target.sendMessageToTarget',
+                    'params': {'targetId': 'page-1-1', 'message': json.dumps({'id': 1, 'method': 'Console.enable'})},
+                }))
+            for ws in frontends:
+                assert recv_json(ws, lambda message: 'id' in message) == {'id': 1, 'result': {}}
+                reply = recv_json(ws, lambda message: message.get('method') == 'Target.dispatchMessageFromTarget')
+                assert json.loads(reply['params']['message']) == {'id': 1, 'result': {}}
+            assert len(relay.channels) == 1
+            for ws in frontends:
+                ws.close()
+        finally:
+            relay.stop()
+
+
+def test_relay_refuses_ports_that_are_not_device_ports():
+    with FakeProxy(devices=1, pages=1, event_rate=0) as proxy:
+        device = proxy.devices[0]
+        relay = WebSocketRelay('127.0.0.1', '127.0.0.1', 0, connect_timeout=2.0, allowed_ports=lambda: {device.port})
+        relay.start()
+        try:
+            ws = connect(f"ws://127.0.0.1:{relay.port}/{proxy.list_port}/devtools/page/1", timeout=5.0)
+            try:
+                ws.recv()
+            except WebSocketClosed:
+                pass
+            else:
+                raise AssertionError("relay forwarded a frontend to the device list port")
+            assert relay.channels == {}
+        finally:
+            relay.stop()
@@ -0,0 +1,20 @@
+from debugger_core import Settings
+
+
+def test_save_writes_only_values_that_were_set(tmp_path):
+    path = str(tmp_path / 'settings.ini')
+    settings = Settings(path).load()
+    settings.webkit_path = '/kits/webkit'
+    settings.save()
+    text = open(path, encoding='utf-8').read()
+    assert 'webkit_path = /kits/webkit' in text
+    assert 'relay_port' not in text
+
+
+def test_explicit_values_survive_even_when_they_were_an_old_default(tmp_path):
+    path = tmp_path / 'settings.ini'
+    path.write_text('[Settings]\nrelay_port = 9230\nmetrics_port = 9231\n', encoding='utf-8')
+    settings = Settings(str(path)).load()
+    assert (settings.relay_port, settings.metrics_port) == (9230, 9231)
+    settings.save()
+    assert (Settings(str(path)).load().relay_port, Settings(str(path)).load().metrics_port) == (9230, 9231)
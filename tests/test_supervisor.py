@@ -0,0 +1,121 @@
+import socket
+import sys
+import threading
+import time
+
+from debugger_core import ServerSupervisor
+
+# Listens on the port given as argv[1] after argv[2] seconds, then stays up
+LISTEN_LATER = (
+    "import socket, sys, time\n"
+    "time.sleep(float(sys.argv[2]))\n"
+    "s = socket.socket()\n"
+    "s.bind(('127.0.0.1', int(sys.argv[1])))\n"
+    "s.listen(1)\n"
+    "time.sleep(60)\n"
+)
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class Events:
+    def __init__(self):
+        self.events = []
+        self.finished = threading.Event()
+        self.ready = threading.Event()
+    
+    def __call__(self, kind, info):
+        self.events.append((kind, info))
+        if kind == 'ready':
+            self.ready.set()
+        if kind in ('failed', 'stopped'):
+            self.finished.set()
+    
+    def kinds(self):
+        return [kind for kind, _ in self.events]
+    
+    def infos(self, kind):
+        return [info for event_kind, info in self.events if event_kind == kind]
+
+
+def test_crashing_server_backs_off_then_fails():
+    events = Events()
+    supervisor = ServerSupervisor(
+        [sys.executable, '-c', 'raise SystemExit(3)'], None, events,
+        host='127.0.0.1', ready_ports=((free_port(),),), ready_timeout=5,
+        max_restarts=3, backoff_initial=0.05, backoff_max=0.1, stable_after=60,
+    )
+    supervisor.start()
+    assert events.finished.wait(10)
+    assert events.kinds() == ['started', 'exited'] * 3 + ['started', 'failed']
+    assert [info['delay'] for info in events.infos('exited')] == [0.05, 0.1, 0.1]
+    assert {info['code'] for info in events.infos('exited')} == {3}
+    assert events.infos('failed') == [{'code': 3, 'restarts': 3}]
+    assert supervisor.restart_count == 3
+    assert not supervisor.ready
+
+
+def test_server_that_stays_up_resets_the_failure_count():
+    events = Events()
+    supervisor = ServerSupervisor(
+        [sys.executable, '-c', 'import time; time.sleep(0.2)'], None, events,
+        host='127.0.0.1', ready_ports=((free_port(),),), ready_timeout=5,
+        max_restarts=1, backoff_initial=0.05, backoff_max=0.05, stable_after=0.1,
+    )
+    supervisor.start()
+    try:
+        # With max_restarts=1 an unstable server would fail after its first restart
+        deadline = time.monotonic() + 10
+        while supervisor.restart_count < 3 and time.monotonic() < deadline:
+            if events.finished.wait(0.05):
+                break
+        assert supervisor.restart_count >= 3
+        assert 'failed' not in events.kinds()
+    finally:
+        supervisor.stop()
+    assert events.finished.wait(10)
+
+
+def test_ready_once_every_port_group_answers():
+    events = Events()
+    port = free_port()
+    supervisor = ServerSupervisor(
+        [sys.executable, '-c', LISTEN_LATER, str(port), '0.3'], None, events,
+        host='127.0.0.1', ready_ports=((free_port(), port),), ready_timeout=10,
+    )
+    supervisor.start()
+    try:
+        assert events.ready.wait(10)
+        assert supervisor.ready
+        time_to_ready = events.infos('ready')[0]['time_to_ready']
+        assert 0.3 <= time_to_ready < 5
+        assert supervisor.last_time_to_ready == time_to_ready
+    finally:
+        supervisor.stop()
+    assert events.finished.wait(10)
+    assert events.kinds() == ['started', 'ready', 'stopped']
+    assert supervisor.process.poll() is not None
+
+
+def test_not_ready_when_the_ports_never_answer():
+    events = Events()
+    supervisor = ServerSupervisor(
+        [sys.executable, '-c', 'import time; time.sleep(60)'], None, events,
+        host='127.0.0.1', ready_ports=((free_port(),),), ready_timeout=0.3,
+    )
+    supervisor.start()
+    try:
+        deadline = time.monotonic() + 10
+        while 'not_ready' not in events.kinds() and time.monotonic() < deadline:
+            events.finished.wait(0.05)
+        assert events.infos('not_ready') == [{'timeout': 0.3}]
+        assert not supervisor.ready
+    finally:
+        supervisor.stop()
+    assert events.finished.wait(10)
@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from debugger_core import WebKitSetup
+
+
+def make_setup(tmp_path):
+    messages = []
+    setup = WebKitSetup(str(tmp_path / 'WebKit'), messages.append, cache_dir=str(tmp_path / 'cache'))
+    os.makedirs(os.path.join(setup.repo_dir, '.git'))
+    write(setup.src_dir, 'start.sh', '#!/bin/bash\n')
+    write(setup.src_dir, 'Inspector/Main.html', '<html></html>')
+    write(setup.src_dir, 'Inspector/Main.js', 'main();')
+    return setup, messages
+
+
+def write(root, rel_path, text):
+    path = os.path.join(root, *rel_path.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def read(root, rel_path):
+    with open(os.path.join(root, *rel_path.split('/')), encoding='utf-8') as f:
+        return f.read()
+
+
+def test_first_sync_installs_every_file(tmp_path):
+    setup, messages = make_setup(tmp_path)
+    target = setup.sync()
+    assert read(target, 'Inspector/Main.js') == 'main();'
+    assert read(target, 'start.sh') == '#!/bin/bash\n'
+    assert messages[-1].endswith("0 removed, 0 unchanged")
+
+
+def test_second_sync_skips_files_that_did_not_change(tmp_path):
+    setup, messages = make_setup(tmp_path)
+    target = setup.sync()
+    before = os.stat(os.path.join(target, 'Inspector', 'Main.js'))
+    setup.sync()
+    assert messages[-1] == "Synced files: 0 copied, 0 linked, 0 removed, 3 unchanged"
+    after = os.stat(os.path.join(target, 'Inspector', 'Main.js'))
+    assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+
+
+def test_changed_and_locally_edited_files_are_replaced(tmp_path):
+    setup, messages = make_setup(tmp_path)
+    target = setup.sync()
+    os.remove(os.path.join(setup.src_dir, 'Inspector', 'Main.js'))
+    write(setup.src_dir, 'Inspector/Main.js', 'main(2);')
+    os.remove(os.path.join(target, 'start.sh'))
+    write(target, 'start.sh', 'edited\n')
+    setup.sync()
+    assert read(target, 'Inspector/Main.js') == 'main(2);'
+    assert read(target, 'start.sh') == '#!/bin/bash\n'
+    assert messages[-1].endswith("0 removed, 1 unchanged")
+
+
+def test_files_dropped_from_the_kit_are_removed_but_user_files_are_kept(tmp_path):
+    setup, messages = make_setup(tmp_path)
+    target = setup.sync()
+    write(target, 'Inspector/notes.txt', 'mine')
+    os.remove(os.path.join(setup.src_dir, 'Inspector', 'Main.html'))
+    setup.sync()
+    assert not os.path.exists(os.path.join(target, 'Inspector', 'Main.html'))
+    assert read(target, 'Inspector/notes.txt') == 'mine'
+    assert "1 removed" in messages[-1]
+    # The user's file is never recorded, so it survives later syncs too
+    setup.sync()
+    assert read(target, 'Inspector/notes.txt') == 'mine'
+
+
+def test_folder_holding_user_files_is_not_replaced(tmp_path):
+    setup, _ = make_setup(tmp_path)
+    target = setup.sync()
+    write(target, 'Inspector/notes.txt', 'mine')
+    os.remove(os.path.join(setup.src_dir, 'Inspector', 'Main.html'))
+    os.remove(os.path.join(setup.src_dir, 'Inspector', 'Main.js'))
+    os.rmdir(os.path.join(setup.src_dir, 'Inspector'))
+    write(setup.src_dir, 'Inspector', 'now a file')
+    with pytest.raises(Exception, match="Cannot replace folder"):
+        setup.sync()
+    assert read(target, 'Inspector/notes.txt') == 'mine'